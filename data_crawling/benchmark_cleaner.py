@@ -0,0 +1,87 @@
+"""
+Micro-benchmark of the single-pass DomCleaner against the per-selector sweep.
+
+The previous clean_html called ``soup.select`` once for every unwanted
+selector. This script times that approach and DomCleaner on saved HTML pages
+(parsing is excluded from the timings) and checks that both leave exactly the
+same tree behind. Pages saved under fixtures/ are used when no path is given.
+
+Usage:
+    python benchmark_cleaner.py
+    python benchmark_cleaner.py page1.html saved_pages/ --repeat 5
+"""
+import argparse
+import statistics
+import sys
+import time
+from typing import Callable, List
+
+from bs4 import BeautifulSoup
+
+from benchmark_parsers import FIXTURE_DIR, collect_fixtures, load_crawler
+from dom_cleaner import DomCleaner
+from html_parsing import parse_html
+
+
+def clean_with_select_sweep(soup: BeautifulSoup, selectors: List[str]) -> BeautifulSoup:
+    """Previous implementation: one soup.select traversal per selector."""
+    for selector in selectors:
+        for element in soup.select(selector):
+            element.decompose()
+    return soup
+
+
+def time_cleaner(clean: Callable[[BeautifulSoup], BeautifulSoup], markup: str, backend: str, repeat: int):
+    """Returns the median cleaning time and the cleaned HTML of one page."""
+    times = []
+    html = ""
+    for _ in range(repeat):
+        soup = parse_html(markup, backend)
+        start = time.perf_counter()
+        soup = clean(soup)
+        times.append(time.perf_counter() - start)
+        html = str(soup)
+    return statistics.median(times), html
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark clean_html implementations on saved pages")
+    parser.add_argument("fixtures", nargs="*", default=[str(FIXTURE_DIR)],
+                        help="Saved HTML files or directories containing them (default: fixtures/)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per page (median is reported)")
+    parser.add_argument("--parser", default=None, help="HTML parser backend used to build the trees")
+    args = parser.parse_args()
+
+    fixtures = collect_fixtures(args.fixtures)
+    if not fixtures:
+        print("No HTML fixtures found.")
+        return 1
+
+    selectors = load_crawler().DEFAULT_CONFIG["unwanted_selectors"]
+    cleaner = DomCleaner(selectors)
+
+    sweep_total, single_total = 0.0, 0.0
+    mismatches = []
+    for fixture in fixtures:
+        markup = fixture.read_text(encoding="utf-8", errors="replace")
+        sweep_time, sweep_html = time_cleaner(
+            lambda soup: clean_with_select_sweep(soup, selectors), markup, args.parser, args.repeat)
+        single_time, single_html = time_cleaner(cleaner.clean, markup, args.parser, args.repeat)
+        sweep_total += sweep_time
+        single_total += single_time
+        if sweep_html != single_html:
+            mismatches.append(fixture.name)
+
+    print(f"{len(fixtures)} pages, {len(selectors)} selectors, median of {args.repeat} runs")
+    print(f"select() sweep : {sweep_total / len(fixtures) * 1000:8.2f} ms/page")
+    print(f"DomCleaner     : {single_total / len(fixtures) * 1000:8.2f} ms/page "
+          f"({sweep_total / single_total:.1f}x faster)")
+    if mismatches:
+        print(f"Output DIFFERS on {len(mismatches)} pages: {', '.join(mismatches[:5])}")
+        return 2
+    print("Cleaned trees are identical.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Benchmarks the HTML parser backends on saved HTML pages.
+
+For every backend in html_parsing and every fixture page, measures the time
+to parse the page and the time to run multi-crawler's clean_html +
+extract_content on the result, and checks that the produced content.txt text
+is identical to the html.parser output. The strained backend keeps only the
+content areas of the page, so its output is compared with html.parser
+restricted by the same strainer instead. Image size probes are skipped so
+that only CPU time is measured and no request is sent.
+
+Pages saved under fixtures/ are used when no path is given.
+
+Usage:
+    python benchmark_parsers.py
+    python benchmark_parsers.py page1.html saved_pages/ --repeat 5
+"""
+import argparse
+import importlib.util
+import logging
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from html_parsing import available_backends, parse_html, parse_strained
+
+REFERENCE_BACKEND = "html.parser"
+FIXTURE_DIR = Path(__file__).with_name("fixtures")
+
+
+def load_crawler():
+    """Imports multi-crawler.py (not importable by name because of the hyphen)."""
+    path = Path(__file__).with_name("multi-crawler.py")
+    spec = importlib.util.spec_from_file_location("multi_crawler", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    # Keep every image candidate without probing it over the network
+    module.check_image_sizes = lambda img_urls, config: {img_url: True for img_url in img_urls}
+    logging.getLogger().setLevel(logging.WARNING)
+    return module
+
+
+def collect_fixtures(paths: List[str]) -> List[Path]:
+    """Expands files and directories into a sorted list of .html/.htm files."""
+    fixtures = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            fixtures.extend(p for p in path.rglob("*") if p.suffix.lower() in (".html", ".htm"))
+        elif path.is_file():
+            fixtures.append(path)
+    return sorted(fixtures)
+
+
+def extract_text(crawler, soup) -> str:
+    """Runs clean_html + extract_content and returns the content.txt text."""
+    soup = crawler.clean_html(soup)
+    content_list, _ = crawler.extract_content(soup, "https://hus.vnu.edu.vn/", crawler.DEFAULT_CONFIG)
+    return "".join(content_list)
+
+
+def run_backend(crawler, backend: str, markup: str, repeat: int) -> Dict:
+    """Parses and extracts one page ``repeat`` times with a backend."""
+    parse_times, extract_times = [], []
+    content = ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        soup = parse_html(markup, backend)
+        parsed = time.perf_counter()
+        content = extract_text(crawler, soup)
+        extract_times.append(time.perf_counter() - parsed)
+        parse_times.append(parsed - start)
+    return {
+        "parse": statistics.median(parse_times),
+        "extract": statistics.median(extract_times),
+        "content": content,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTML parser backends on saved pages")
+    parser.add_argument("fixtures", nargs="*", default=[str(FIXTURE_DIR)],
+                        help="Saved HTML files or directories containing them (default: fixtures/)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per page and backend (median is reported)")
+    args = parser.parse_args()
+
+    fixtures = collect_fixtures(args.fixtures)
+    if not fixtures:
+        print("No HTML fixtures found.")
+        return 1
+
+    crawler = load_crawler()
+    backends = available_backends()
+    totals = {backend: {"parse": 0.0, "extract": 0.0, "mismatches": []} for backend in backends}
+
+    for fixture in fixtures:
+        markup = fixture.read_text(encoding="utf-8", errors="replace")
+        results = {backend: run_backend(crawler, backend, markup, args.repeat) for backend in backends}
+        reference = results[REFERENCE_BACKEND]["content"]
+        strained_reference = extract_text(crawler, parse_strained(markup, REFERENCE_BACKEND))
+        for backend, result in results.items():
+            totals[backend]["parse"] += result["parse"]
+            totals[backend]["extract"] += result["extract"]
+            if result["content"] != (strained_reference if backend == "strained" else reference):
+                totals[backend]["mismatches"].append(fixture.name)
+
+    reference_total = totals[REFERENCE_BACKEND]["parse"] + totals[REFERENCE_BACKEND]["extract"]
+    print(f"{len(fixtures)} pages, median of {args.repeat} runs, times per page in ms")
+    print(f"{'backend':<12} {'parse':>9} {'extract':>9} {'total':>9} {'speedup':>8}  content.txt")
+    for backend in backends:
+        parse_ms = totals[backend]["parse"] / len(fixtures) * 1000
+        extract_ms = totals[backend]["extract"] / len(fixtures) * 1000
+        total = totals[backend]["parse"] + totals[backend]["extract"]
+        mismatches = totals[backend]["mismatches"]
+        status = "identical" if not mismatches else f"DIFFERS on {len(mismatches)}: {', '.join(mismatches[:5])}"
+        if backend == "strained":
+            status += " (content areas only)"
+        print(f"{backend:<12} {parse_ms:>9.2f} {extract_ms:>9.2f} {parse_ms + extract_ms:>9.2f} "
+              f"{reference_total / total:>7.2f}x  {status}")
+
+    return 0 if not any(totals[backend]["mismatches"] for backend in backends) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,369 @@
+"""
+Content-addressed store for crawled images and PDFs.
+
+Every downloaded file is stored once under its SHA-256, in sharded
+directories (``ab/cd/abcd....ext``), no matter how many pages reference it.
+A small JSON index maps each source URL to its blob together with the ETag /
+Last-Modified validators of the last response, so a URL seen before is
+re-validated with a conditional request instead of being downloaded again,
+and a URL seen earlier in the same run is not requested at all.
+
+Large files can be downloaded resumably (``put_resumable``): the partial
+body lives in ``partial/<sha256 of the URL>.part`` with the validators of
+its response next to it, and the next attempt continues it with a
+``Range`` + ``If-Range`` request.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import requests
+
+from downloader import file_sha256, save_resumable, save_stream, sniff_content_type
+
+logger = logging.getLogger("blob_store")
+
+
+class BlobStore:
+    """Thread-safe SHA-256 keyed file store with a URL → blob index."""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.index_file = self.root / "index.json"
+        self._lock = threading.Lock()
+        self._url_locks: Dict[str, threading.Lock] = {}
+        self._entries: Dict[str, Dict] = {}
+        # URLs already downloaded or re-validated during this run
+        self._fresh = set()
+        self.downloads = 0
+        self.adopted = 0
+        self.not_modified = 0
+        self.duplicates = 0
+        self.bytes_saved = 0
+        self.bytes_resumed = 0
+        self._load()
+
+    def _load(self) -> None:
+        if not self.index_file.exists():
+            return
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+            logger.info(f"Loaded blob index with {len(self._entries)} URLs from {self.index_file}")
+        except (IOError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable blob index {self.index_file}: {e}")
+
+    def blob_path(self, entry: Dict) -> str:
+        """Returns the on-disk path of an index entry's blob."""
+        return str(self.root / entry["blob"])
+
+    def lookup(self, url: str) -> Optional[Dict]:
+        """
+        Looks up the blob of a URL.
+
+        Args:
+            url: Source URL
+
+        Returns:
+            Index entry (sha256, blob, size, content_type, etag, last_modified) or
+            None if the URL is unknown or its blob is missing
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+        if entry and os.path.exists(self.blob_path(entry)):
+            return entry
+        return None
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """Returns If-None-Match / If-Modified-Since headers for a URL with a stored blob."""
+        entry = self.lookup(url)
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def mark_not_modified(self, url: str) -> Optional[Dict]:
+        """Records that a URL answered 304 and returns its existing entry."""
+        with self._lock:
+            self._fresh.add(url)
+            self.not_modified += 1
+        return self.lookup(url)
+
+    def verify(self, entry: Dict, path: str, magic: Optional[bytes] = None) -> bool:
+        """
+        Checks that a file is a complete, intact copy of an indexed blob.
+
+        Args:
+            entry: Index entry the file should match
+            path: File to check
+            magic: Bytes the file must start with (e.g. b"%PDF")
+
+        Returns:
+            True if size, magic bytes and SHA-256 all match
+        """
+        try:
+            if os.path.getsize(path) != entry["size"]:
+                return False
+            if magic is not None:
+                with open(path, "rb") as f:
+                    if f.read(len(magic)) != magic:
+                        return False
+            return file_sha256(path) == entry["sha256"]
+        except OSError:
+            return False
+
+    def partial_path(self, url: str) -> Path:
+        """Returns the stable path of the partial download of a URL."""
+        return self.root / "partial" / f"{hashlib.sha256(url.encode('utf-8')).hexdigest()}.part"
+
+    def _partial_validators(self, url: str) -> Dict:
+        meta_path = Path(f"{self.partial_path(url)}.json")
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def range_headers(self, url: str) -> Dict[str, str]:
+        """
+        Returns Range / If-Range headers to continue a partial download of a URL.
+
+        A partial file is only resumed when its response had an ETag or
+        Last-Modified, so that If-Range makes the server send the whole file
+        again if it changed in between.
+        """
+        part_path = self.partial_path(url)
+        size = part_path.stat().st_size if part_path.exists() else 0
+        validators = self._partial_validators(url) if size else {}
+        validator = validators.get("etag") or validators.get("last_modified")
+        if not validator:
+            return {}
+        return {"Range": f"bytes={size}-", "If-Range": validator}
+
+    def discard_partial(self, url: str) -> None:
+        """Removes the partial download of a URL, if any."""
+        part_path = self.partial_path(url)
+        for path in (part_path, Path(f"{part_path}.json")):
+            if path.exists():
+                os.remove(path)
+
+    def put_resumable(self, url: str, response: requests.Response, ext: str, max_bytes: Optional[int] = None,
+                      magic: Optional[bytes] = None,
+                      throttle: Optional[Callable[[int], None]] = None) -> Dict:
+        """
+        Streams a (possibly partial, 206) response into the URL's .part file and
+        stores the file once it is complete and verified.
+
+        Args:
+            url: Source URL
+            response: Response opened with stream=True, to a request made with range_headers(url)
+            ext: File extension of the blob (without dot)
+            max_bytes: Maximum accepted size
+            magic: Bytes the complete file must start with
+            throttle: Called with the size of every chunk read
+
+        Returns:
+            The new index entry
+
+        Raises:
+            IncompleteDownloadError: If the body ended early; call again to resume
+        """
+        part_path = self.partial_path(url)
+        part_path.parent.mkdir(parents=True, exist_ok=True)
+        meta_path = Path(f"{part_path}.json")
+        if response.status_code == 206:
+            validators = self._partial_validators(url)
+        else:
+            # A fresh body: remember its validators for If-Range on a later resume
+            validators = {"etag": response.headers.get("ETag"),
+                          "last_modified": response.headers.get("Last-Modified")}
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump(validators, f)
+
+        result = save_resumable(response, str(part_path), max_bytes=max_bytes, magic=magic, throttle=throttle)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        with self._lock:
+            self.bytes_resumed += result["resumed_from"]
+        return self._store(url, result, ext, validators.get("etag"), validators.get("last_modified"))
+
+    def put_stream(self, url: str, response: requests.Response, ext: str,
+                   max_bytes: Optional[int] = None, throttle: Optional[Callable[[int], None]] = None) -> Dict:
+        """
+        Streams a response into the store and indexes it under its URL.
+
+        Args:
+            url: Source URL
+            response: Successful response opened with stream=True
+            ext: File extension of the blob (without dot)
+            max_bytes: Maximum accepted size
+            throttle: Called with the size of every chunk read (download byte-rate cap)
+
+        Returns:
+            The new index entry
+        """
+        tmp_dir = self.root / "tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        result = save_stream(response, str(tmp_dir / uuid.uuid4().hex), max_bytes=max_bytes,
+                             throttle=throttle)
+        return self._store(url, result, ext, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+
+    def adopt(self, url: str, path: str, ext: str, magic: Optional[bytes] = None,
+              max_bytes: Optional[int] = None) -> Optional[Dict]:
+        """
+        Indexes a file downloaded before the store existed under its URL, instead
+        of downloading it again. The file itself is left in place.
+
+        Args:
+            url: Source URL
+            path: Existing file
+            ext: File extension of the blob (without dot)
+            magic: Bytes the file must start with (e.g. b"%PDF")
+            max_bytes: Maximum accepted size
+
+        Returns:
+            The new index entry, or None if the file is empty, too large or does not start with magic
+        """
+        try:
+            size = os.path.getsize(path)
+            if not size or (max_bytes is not None and size > max_bytes):
+                return None
+            with open(path, "rb") as f:
+                head = f.read(512)
+            if magic is not None and not head.startswith(magic):
+                return None
+
+            tmp_dir = self.root / "tmp"
+            tmp_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = str(tmp_dir / uuid.uuid4().hex)
+            try:
+                os.link(path, tmp_path)
+            except OSError:
+                shutil.copyfile(path, tmp_path)
+            result = {"path": tmp_path, "size": size, "sha256": file_sha256(tmp_path),
+                      "sniffed_type": sniff_content_type(head)}
+        except OSError as e:
+            logger.warning(f"Cannot adopt {path}: {e}")
+            return None
+        return self._store(url, result, ext, None, None, downloaded=False)
+
+    def _store(self, url: str, result: Dict, ext: str, etag: Optional[str], last_modified: Optional[str],
+               downloaded: bool = True) -> Dict:
+        """Moves a finished download (or adopted file) into its content-addressed place and indexes it."""
+        sha256 = result["sha256"]
+        blob = f"{sha256[:2]}/{sha256[2:4]}/{sha256}.{ext}"
+        final_path = self.root / blob
+        duplicate = final_path.exists()
+        if duplicate:
+            # Same content already stored (e.g. one logo under several URLs)
+            os.remove(result["path"])
+        else:
+            final_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(result["path"], final_path)
+
+        entry = {
+            "sha256": sha256,
+            "blob": blob,
+            "size": result["size"],
+            "content_type": result["sniffed_type"],
+            "etag": etag,
+            "last_modified": last_modified,
+        }
+        with self._lock:
+            self._entries[url] = entry
+            self._fresh.add(url)
+            if downloaded:
+                self.downloads += 1
+            else:
+                self.adopted += 1
+            if duplicate:
+                self.duplicates += 1
+                self.bytes_saved += result["size"]
+        return entry
+
+    def url_lock(self, url: str) -> threading.Lock:
+        """Returns the lock serializing downloads of one URL across threads."""
+        with self._lock:
+            return self._url_locks.setdefault(url, threading.Lock())
+
+    def fetch(self, url: str, open_response: Callable[[Dict[str, str]], requests.Response],
+              extension_for: Callable[[requests.Response], str], max_bytes: Optional[int] = None) -> Dict:
+        """
+        Returns the blob of a URL, downloading it only if needed.
+
+        A URL already fetched in this run is returned directly. A URL with a
+        stored blob is re-validated with a conditional request; only a changed
+        or unknown URL is downloaded.
+
+        Args:
+            url: Source URL
+            open_response: Sends the request with the given extra headers (stream=True)
+            extension_for: Picks the blob extension from the response
+            max_bytes: Maximum accepted size
+
+        Returns:
+            Index entry of the URL
+
+        Raises:
+            requests.exceptions.RequestException: If the request fails
+        """
+        with self.url_lock(url):
+            entry = self.lookup(url)
+            if entry and url in self._fresh:
+                return entry
+
+            conditional_headers = self.conditional_headers(url)
+            response = open_response(conditional_headers)
+            if response.status_code == 304 and conditional_headers:
+                response.close()
+                return self.mark_not_modified(url)
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError:
+                response.close()
+                raise
+            return self.put_stream(url, response, extension_for(response), max_bytes)
+
+    def link(self, entry: Dict, dest_path: str) -> None:
+        """
+        Makes a blob visible under a human-readable path without storing it twice.
+
+        A hard link is used where the filesystem allows it, otherwise the blob is
+        copied. A file already at dest_path is replaced atomically, so it is never
+        missing if linking fails.
+
+        Args:
+            entry: Index entry of the blob
+            dest_path: Path to expose the blob at
+        """
+        tmp_path = f"{dest_path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            os.link(self.blob_path(entry), tmp_path)
+        except OSError:
+            shutil.copyfile(self.blob_path(entry), tmp_path)
+        os.replace(tmp_path, dest_path)
+
+    def save(self) -> None:
+        """Writes the URL index atomically and logs what the store saved this run."""
+        with self._lock:
+            snapshot = dict(self._entries)
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{self.index_file}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_file)
+            logger.info(f"Blob store: {self.downloads} downloads, {self.adopted} existing files adopted, "
+                        f"{self.not_modified} not modified, "
+                        f"{self.duplicates} duplicates ({self.bytes_saved / 1024:.0f} KB not stored again, "
+                        f"{self.bytes_resumed / 1024:.0f} KB resumed instead of re-downloaded)")
+        except IOError as e:
+            logger.error(f"Failed to save blob index {self.index_file}: {e}")
@@ -0,0 +1,264 @@
+"""
+Learned per-site filter of template (boilerplate) blocks.
+
+The selector list of clean_html removes the template parts someone wrote a
+rule for; the rest of the DNN skin (menu entries rendered as paragraphs,
+contact lines, "share" rows, the same promotional image) still ends up in
+every content.txt. The learner finds it from the pages themselves: a block
+is identified by its kind, DOM path (tag and class names, see
+content_extractor.dom_label) and text, and a block found on more than
+``threshold`` of a site's sampled pages is template. Text that merely repeats
+in another place (a quote in an article) has another DOM path and is kept.
+
+The filter stores one 64-bit hash per template block and site, so checking a
+block during extraction is a single set lookup, and the file stays small
+(a few thousand hashes for the whole HUS site). Table markers are never
+filtered: they only group the rows that follow.
+
+Usage:
+    python boilerplate.py --crawl-dir crawled_data --sample 200
+    python boilerplate.py --urls-file urls.txt --threshold 0.6 -o crawled_data/boilerplate.json
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import sys
+import threading
+from collections import Counter
+from typing import Dict, FrozenSet, Iterable, List, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.packages.urllib3.exceptions import InsecureRequestWarning
+
+import http_client
+from content_extractor import ContentBlock, format_block, iter_content_blocks
+from corpus_shards import CorpusReader
+from html_parsing import BACKENDS, content_root, parse_html
+
+logger = logging.getLogger("boilerplate")
+
+FILTER_VERSION = 1
+
+
+def site_of(url: str) -> str:
+    """Returns the site (host) a page belongs to."""
+    return urlparse(url).netloc.lower()
+
+
+def block_key(block: ContentBlock) -> int:
+    """Returns the 64-bit hash identifying a block across pages: kind, DOM path and text."""
+    data = f"{block.kind}\0{block.dom_path}\0{block.text}".encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+class BoilerplateLearner:
+    """Counts on how many sampled pages of each site every block occurs."""
+
+    def __init__(self, threshold: float = 0.6, min_pages: int = 10):
+        """
+        Args:
+            threshold: Share of a site's pages above which a block is template
+            min_pages: Sites with fewer sampled pages get no filter (too few to tell)
+        """
+        self.threshold = threshold
+        self.min_pages = min_pages
+        self._pages: Counter = Counter()
+        self._counts: Dict[str, Counter] = {}
+
+    def observe(self, url: str, blocks: Iterable[ContentBlock]) -> None:
+        """Records the blocks of one page; blocks must carry their dom_path."""
+        site = site_of(url)
+        self._pages[site] += 1
+        self._counts.setdefault(site, Counter()).update(
+            {block_key(block) for block in blocks if block.kind != "table"})
+
+    def build(self) -> Dict[str, Dict]:
+        """
+        Returns the filter of every site with enough pages.
+
+        Returns:
+            site → {"pages": sampled pages, "keys": sorted template block hashes}
+        """
+        sites = {}
+        for site, pages in self._pages.items():
+            if pages < self.min_pages:
+                logger.warning(f"Only {pages} sampled pages of {site}; no filter learned")
+                continue
+            keys = sorted(key for key, count in self._counts[site].items() if count > self.threshold * pages)
+            sites[site] = {"pages": pages, "keys": keys}
+            logger.info(f"{site}: {len(keys)} template blocks learned from {pages} pages")
+        return sites
+
+
+class BoilerplateFilter:
+    """Per-site set of template block hashes, loaded from JSON, with thread-safe removal counters."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.threshold: Optional[float] = None
+        self._sites: Dict[str, FrozenSet[int]] = {}
+        self._lock = threading.Lock()
+        self.pages = 0
+        self.blocks_removed = 0
+        self.bytes_removed = 0
+        if path:
+            self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (IOError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable boilerplate filter {self.path}: {e}")
+            return
+        self.threshold = data.get("threshold")
+        self._sites = {site: frozenset(int(key, 16) for key in entry["keys"])
+                       for site, entry in data.get("sites", {}).items()}
+        logger.info(f"Loaded boilerplate filter of {len(self._sites)} sites from {self.path}")
+
+    @staticmethod
+    def save(path: str, sites: Dict[str, Dict], threshold: float) -> None:
+        """Writes learned site filters (see BoilerplateLearner.build) atomically, replacing those sites only."""
+        data = {"version": FILTER_VERSION, "threshold": threshold, "sites": {}}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data["sites"] = json.load(f).get("sites", {})
+            except (IOError, ValueError) as e:
+                logger.warning(f"Replacing unreadable boilerplate filter {path}: {e}")
+        for site, entry in sites.items():
+            data["sites"][site] = {"pages": entry["pages"], "keys": [f"{key:016x}" for key in entry["keys"]]}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmp_path, path)
+
+    def keys_for(self, url: str) -> Optional[FrozenSet[int]]:
+        """Returns the template block hashes of a page's site, or None if the site has no filter."""
+        return self._sites.get(site_of(url))
+
+    def record(self, blocks: List[ContentBlock]) -> None:
+        """Counts the blocks removed from one page and the content.txt bytes they would have taken."""
+        removed_bytes = sum(len(format_block(block).encode("utf-8")) for block in blocks)
+        with self._lock:
+            self.pages += 1
+            self.blocks_removed += len(blocks)
+            self.bytes_removed += removed_bytes
+
+    def summary(self) -> str:
+        return (f"Boilerplate filter: removed {self.blocks_removed} blocks "
+                f"({self.bytes_removed / 1024:.0f} KB of content.txt) from {self.pages} pages")
+
+    def __len__(self) -> int:
+        return len(self._sites)
+
+
+def crawled_urls(crawl_dir: str) -> List[str]:
+    """Returns the URLs of the pages in a crawl output directory (page directories or shards)."""
+    shard_dir = os.path.join(crawl_dir, "shards")
+    if os.path.isdir(shard_dir):
+        with CorpusReader(shard_dir) as reader:
+            return reader.urls()
+    urls = []
+    for name in sorted(os.listdir(crawl_dir)):
+        metadata_file = os.path.join(crawl_dir, name, "metadata.json")
+        if not os.path.isfile(metadata_file):
+            continue
+        try:
+            with open(metadata_file, "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+        except (IOError, ValueError):
+            continue
+        # Near-duplicates would count their canonical page's blocks twice
+        if "duplicate_of" not in metadata:
+            urls.append(metadata["url"])
+    return urls
+
+
+def sample_per_site(urls: List[str], sample: int, seed: int = 0) -> List[str]:
+    """Picks up to ``sample`` random URLs of every site."""
+    by_site: Dict[str, List[str]] = {}
+    for url in dict.fromkeys(urls):
+        by_site.setdefault(site_of(url), []).append(url)
+    rng = random.Random(seed)
+    picked = []
+    for site_urls in by_site.values():
+        picked.extend(rng.sample(site_urls, min(sample, len(site_urls))))
+    return picked
+
+
+def learn(urls: List[str], threshold: float, min_pages: int, parser: Optional[str] = None,
+          timeout: int = 30) -> Dict[str, Dict]:
+    """
+    Fetches pages and learns the template blocks of their sites.
+
+    Blocks are taken before clean_html's selectors are applied; paths do not
+    depend on skipped subtrees, so hashes of blocks the crawler never sees are
+    merely unused.
+
+    Returns:
+        Site filters, see BoilerplateLearner.build
+    """
+    learner = BoilerplateLearner(threshold, min_pages)
+    session = http_client.get_session()
+    for number, url in enumerate(urls, 1):
+        try:
+            response = session.get(url, verify=False, timeout=timeout)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Skipping {url}: {e}")
+            continue
+        body = content_root(parse_html(response.text, parser))
+        if body is None:
+            continue
+        learner.observe(url, iter_content_blocks(body, url, dom_paths=True))
+        if number % 50 == 0:
+            logger.info(f"Sampled {number}/{len(urls)} pages")
+    return learner.build()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Learn per-site boilerplate blocks from a sample of pages.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--crawl-dir", help="Crawl output directory whose pages are sampled")
+    source.add_argument("--urls-file", help="File with one URL per line")
+    parser.add_argument("-o", "--output", default=None,
+                        help="Filter file (default: <crawl dir>/boilerplate.json, else crawled_data/boilerplate.json)")
+    parser.add_argument("--sample", type=int, default=200, help="Pages sampled per site (default: 200)")
+    parser.add_argument("--threshold", type=float, default=0.6,
+                        help="Share of sampled pages above which a block is template (default: 0.6)")
+    parser.add_argument("--min-pages", type=int, default=10,
+                        help="Minimum sampled pages for a site to get a filter (default: 10)")
+    parser.add_argument("--parser", choices=BACKENDS, default=None,
+                        help="HTML parser backend; use the crawler's, DOM paths depend on it")
+    args = parser.parse_args()
+
+    if args.crawl_dir:
+        urls = crawled_urls(args.crawl_dir)
+    else:
+        with open(args.urls_file, "r", encoding="utf-8") as f:
+            urls = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    output = args.output or os.path.join(args.crawl_dir or "crawled_data", "boilerplate.json")
+
+    requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+    sites = learn(sample_per_site(urls, args.sample), args.threshold, args.min_pages, args.parser)
+    if not sites:
+        logger.error("No site had enough pages to learn a filter")
+        return 1
+    BoilerplateFilter.save(output, sites, args.threshold)
+    logger.info(f"Saved boilerplate filter of {len(sites)} sites to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    sys.exit(main())
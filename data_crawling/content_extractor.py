@@ -0,0 +1,272 @@
+"""
+Linear-time streaming extraction of content blocks from a parsed page.
+
+``iter_content_blocks`` walks the tree once, depth first, and yields typed
+``ContentBlock`` records (headings, paragraphs, tables and their rows,
+images) in document order. Table and heading context is kept on stacks while
+walking, so nothing is looked up again: no ``find_parent`` per paragraph, no
+``find_all`` per table and no ``get_text`` re-walking a subtree. Element text
+is collected from the text nodes as they are visited.
+
+Subtrees for which the ``skip`` predicate returns True (e.g.
+``DomCleaner.matches``) are never entered, which lets cleaning and extraction
+share the same pass. With ``dom_paths`` every block also records the tag and
+class path of its element (``body/div.skin/p``), which identifies template
+blocks across the pages of a site (see boilerplate.py).
+
+``format_block`` renders a block in the ``content.txt`` format used by
+multi-crawler; ``parse_content`` reads that format back into blocks.
+"""
+from typing import Callable, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import urljoin
+
+from bs4 import CData, NavigableString, Tag
+
+HEADING_LEVELS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+_TEXT_TYPES = (NavigableString, CData)
+
+
+class ContentBlock(NamedTuple):
+    """One unit of page content."""
+
+    kind: str  # "heading", "paragraph", "table", "table_row" or "image"
+    text: str = ""  # heading/paragraph text, tab-joined row cells, or image URL
+    level: int = 0  # heading level (1-6)
+    cells: Tuple[str, ...] = ()  # table_row cell texts
+    table: int = 0  # 1-based number of the table a table/table_row block belongs to
+    heading_path: Tuple[str, ...] = ()  # texts of the enclosing headings, outermost first
+    dom_path: str = ""  # tag.class path of the block's element below the root, with dom_paths only
+
+
+def dom_label(element: Tag) -> str:
+    """Returns the path label of an element: its tag name and sorted classes (ids vary between pages)."""
+    classes = element.get("class")
+    if not classes:
+        return element.name
+    if isinstance(classes, str):
+        classes = classes.split()
+    return ".".join([element.name] + sorted(classes))
+
+
+def iter_content_blocks(root: Tag, base_url: str, skip: Optional[Callable[[Tag], bool]] = None,
+                        dom_paths: bool = False) -> Iterator[ContentBlock]:
+    """
+    Streams the content blocks of a page, visiting every node once.
+
+    Blocks found inside a table (images, headings) are emitted after the
+    table's rows, when the outermost table closes, and images inside a
+    heading or paragraph after its text. Paragraphs inside tables are not
+    emitted because their text is part of the cell; likewise a table nested
+    in a cell is not a table of its own, its text is part of the outer cell.
+
+    Args:
+        root: Element to extract from (usually ``soup.body``)
+        base_url: Base URL for resolving relative image links
+        skip: Predicate for elements whose whole subtree must be ignored
+        dom_paths: Fill in the dom_path of every block
+
+    Yields:
+        ContentBlock records in document order
+    """
+    headings: List[Tuple[int, str]] = []  # (level, text) of the current heading path
+    captures: List[List[str]] = []  # text buffers of the open heading/paragraph/cell elements
+    rows: List[List[str]] = []  # cell texts of the open table rows
+    tables: List[int] = []  # number of the open table (tables nested in a cell are not counted)
+    tables_seen = 0
+    nested = 0  # open tables inside a table cell
+    deferred: List[ContentBlock] = []  # blocks waiting for the outermost table to close
+    # Blocks waiting for the open headings/paragraphs to close, with the number of tables open around each
+    held: List[Tuple[int, List[ContentBlock]]] = []
+    labels: List[str] = []  # dom_label of the open elements below the root (dom_paths only)
+
+    def heading_path() -> Tuple[str, ...]:
+        return tuple(text for _, text in headings)
+
+    def dom_path() -> str:
+        return "/".join(labels)
+
+    def emit(block: ContentBlock) -> Iterator[ContentBlock]:
+        if held and held[-1][0] == len(tables):
+            held[-1][1].append(block)
+        elif tables and block.kind != "table_row":
+            deferred.append(block)
+        elif held:
+            held[-1][1].append(block)
+        else:
+            yield block
+
+    def close(element: Tag, captured: bool) -> Iterator[ContentBlock]:
+        nonlocal nested
+        name = element.name
+        # Same as get_text(strip=True): stripped strings joined without a separator
+        text = "".join(captures.pop()) if captured else ""
+
+        if name in HEADING_LEVELS:
+            _, inner = held.pop()
+            if text:
+                level = HEADING_LEVELS[name]
+                yield from emit(ContentBlock("heading", text, level=level, heading_path=heading_path(),
+                                             dom_path=dom_path()))
+                while headings and headings[-1][0] >= level:
+                    headings.pop()
+                headings.append((level, text))
+            for block in inner:
+                yield from emit(block)
+        elif name == "p":
+            if captured:
+                _, inner = held.pop()
+                if text:
+                    yield from emit(ContentBlock("paragraph", text, heading_path=heading_path(),
+                                                 dom_path=dom_path()))
+                for block in inner:
+                    yield from emit(block)
+        elif name in ("td", "th"):
+            if captured:
+                rows[-1].append(text)
+        elif name == "tr":
+            if not nested:
+                cells = rows.pop()
+                if any(cells) and tables:
+                    yield from emit(ContentBlock("table_row", "\t".join(cells), cells=tuple(cells),
+                                                 table=tables[-1], heading_path=heading_path(), dom_path=dom_path()))
+        elif name == "table":
+            if nested:
+                nested -= 1
+            else:
+                tables.pop()
+                if not tables:
+                    blocks = list(deferred)
+                    deferred.clear()
+                    for block in blocks:
+                        yield from emit(block)
+
+    # Each frame is (element, iterator over its children, whether it captures text)
+    stack: List[Tuple[Tag, Iterator, bool]] = [(root, iter(root.contents), False)]
+    while stack:
+        element, children, captured = stack[-1]
+        descended = False
+
+        for node in children:
+            if isinstance(node, Tag):
+                if skip is not None and skip(node):
+                    continue
+                name = node.name
+                capture = False
+                if dom_paths:
+                    labels.append(dom_label(node))
+
+                if name in HEADING_LEVELS:
+                    capture = True
+                elif name == "p":
+                    capture = not tables
+                elif name == "table":
+                    if tables:
+                        # Its text goes to the enclosing cell
+                        nested += 1
+                    else:
+                        tables_seen += 1
+                        yield from emit(ContentBlock("table", table=tables_seen, heading_path=heading_path(),
+                                                     dom_path=dom_path()))
+                        tables.append(tables_seen)
+                elif name == "tr":
+                    if not nested:
+                        rows.append([])
+                elif name in ("td", "th"):
+                    capture = bool(rows) and not nested
+                elif name == "img":
+                    src = node.get("src")
+                    if src:
+                        if not src.startswith(("http://", "https://")):
+                            src = urljoin(base_url, src)
+                        yield from emit(ContentBlock("image", src, heading_path=heading_path(), dom_path=dom_path()))
+
+                if capture:
+                    captures.append([])
+                    if name in HEADING_LEVELS or name == "p":
+                        held.append((len(tables), []))
+                if node.contents:
+                    stack.append((node, iter(node.contents), capture))
+                    descended = True
+                    break
+                # Element without children: close it right away
+                yield from close(node, capture)
+                if dom_paths:
+                    labels.pop()
+            elif captures and type(node) in _TEXT_TYPES:
+                text = node.strip()
+                if text:
+                    for buffer in captures:
+                        buffer.append(text)
+
+        if descended:
+            continue
+        stack.pop()
+        if stack:
+            yield from close(element, captured)
+            if dom_paths:
+                labels.pop()
+
+    # Unbalanced trees cannot happen with a parsed soup, but never lose deferred blocks
+    yield from deferred
+
+
+def format_block(block: ContentBlock) -> str:
+    """
+    Renders a content block in the content.txt format.
+
+    Args:
+        block: Content block
+
+    Returns:
+        Text to append to content.txt
+    """
+    if block.kind == "heading":
+        return f"Tiêu đề: {block.text}\n"
+    if block.kind == "paragraph":
+        return f"{block.text}\n"
+    if block.kind == "table":
+        return "\n"
+    if block.kind == "table_row":
+        return f"{block.text}\n"
+    if block.kind == "image":
+        return f"🖼️ Ảnh: {block.text}\n"
+    raise ValueError(f"Unknown content block kind: {block.kind}")
+
+
+def parse_content(text: str) -> List[ContentBlock]:
+    """
+    Reads content.txt text back into content blocks (the inverse of format_block).
+
+    Heading levels, heading paths and table numbers are not stored in
+    content.txt: headings come back as level 2 and tables are numbered in
+    order of appearance.
+
+    Args:
+        text: Content of a content.txt file
+
+    Returns:
+        Content blocks in file order
+    """
+    blocks: List[ContentBlock] = []
+    table = 0
+    in_table = False
+    lines = text.split("\n")
+    if lines[-1] == "":
+        lines.pop()  # the newline that ends the last block
+    for line in lines:
+        if line.startswith("Tiêu đề: "):
+            blocks.append(ContentBlock("heading", line[len("Tiêu đề: "):], level=2))
+            in_table = False
+        elif line.startswith("🖼️ Ảnh: "):
+            blocks.append(ContentBlock("image", line[len("🖼️ Ảnh: "):]))
+        elif not line:
+            table += 1
+            blocks.append(ContentBlock("table", table=table))
+            in_table = True
+        elif in_table and "\t" in line:
+            cells = tuple(line.split("\t"))
+            blocks.append(ContentBlock("table_row", line, cells=cells, table=table))
+        else:
+            blocks.append(ContentBlock("paragraph", line))
+            in_table = False
+    return blocks
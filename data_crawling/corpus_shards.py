@@ -0,0 +1,433 @@
+"""
+Rolling corpus shards: many crawled pages per file instead of a directory per page.
+
+With tens of thousands of pages, the ``<page>/content.txt`` +
+``<page>/metadata.json`` layout costs downstream jobs two file opens and a
+``json.load`` per page. ``ShardWriter`` appends pages to rolling shard files
+instead, and starts a new shard once the current one reaches
+``max_shard_bytes``:
+
+- ``shard-00000.jsonl``: one JSON record per line (url, title, crawl_date,
+  content blocks, image references). When the shard is closed, a footer is
+  appended: an index line ``{"index": {url: [offset, length]}}`` and a
+  fixed-size trailer line holding the offset of that index line. Every line
+  is still valid JSON.
+- ``shard-00000.arrow`` (only if pyarrow is installed): the same records in
+  the Arrow IPC file format, with the URL → row index in the schema metadata.
+
+``CorpusReader`` reads only the footers, then memory-maps a shard and decodes
+the single record asked for, without scanning the rest. A shard that was
+never closed (e.g. a killed crawl) has no footer; its index is rebuilt by
+scanning it once. When a URL appears in several shards, the newest record
+wins.
+
+Usage:
+    python corpus_shards.py convert crawled_data/ -o crawled_data/shards
+    python corpus_shards.py get crawled_data/shards https://hus.vnu.edu.vn/...
+    python corpus_shards.py stats crawled_data/shards
+"""
+import argparse
+import json
+import logging
+import mmap
+import os
+import re
+import sys
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from content_extractor import ContentBlock, format_block, parse_content
+
+try:
+    import pyarrow as pa
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+logger = logging.getLogger("corpus_shards")
+
+SHARD_PATTERN = re.compile(r"^shard-(\d{5})\.jsonl$")
+# Fixed-width trailer, so a reader finds it by reading the last TRAILER_SIZE bytes
+TRAILER_FORMAT = '{{"index_offset": "{:016d}"}}\n'
+TRAILER_SIZE = len(TRAILER_FORMAT.format(0).encode("utf-8"))
+ARROW_INDEX_KEY = b"hus.url_index"
+
+
+def block_to_dict(block: ContentBlock) -> Dict:
+    """Serializes a content block, leaving out empty fields (cells are the tab-split text)."""
+    record = {"kind": block.kind, "text": block.text}
+    if block.level:
+        record["level"] = block.level
+    if block.table:
+        record["table"] = block.table
+    if block.heading_path:
+        record["heading_path"] = list(block.heading_path)
+    return record
+
+
+def block_from_dict(record: Dict) -> ContentBlock:
+    """Rebuilds a content block serialized by block_to_dict."""
+    text = record.get("text", "")
+    return ContentBlock(
+        record["kind"],
+        text,
+        level=record.get("level") or 0,
+        cells=tuple(text.split("\t")) if record["kind"] == "table_row" else (),
+        table=record.get("table") or 0,
+        heading_path=tuple(record.get("heading_path") or ()),
+    )
+
+
+def page_record(url: str, title: str, crawl_date: str, blocks: List[ContentBlock],
+                image_files: List[str]) -> Dict:
+    """Builds the shard record of a page."""
+    return {
+        "url": url,
+        "title": title,
+        "crawl_date": crawl_date,
+        "blocks": [block_to_dict(block) for block in blocks],
+        "images": list(image_files),
+    }
+
+
+def record_content(record: Dict) -> str:
+    """Renders a shard record's blocks as content.txt text."""
+    return "".join(format_block(block_from_dict(block)) for block in record["blocks"])
+
+
+def _arrow_schema(index: Dict[str, int]) -> "pa.Schema":
+    block = pa.struct([
+        ("kind", pa.string()),
+        ("text", pa.string()),
+        ("level", pa.int8()),
+        ("table", pa.int32()),
+        ("heading_path", pa.list_(pa.string())),
+    ])
+    return pa.schema(
+        [
+            ("url", pa.string()),
+            ("title", pa.string()),
+            ("crawl_date", pa.string()),
+            ("blocks", pa.list_(block)),
+            ("images", pa.list_(pa.string())),
+        ],
+        metadata={ARROW_INDEX_KEY: json.dumps(index).encode("utf-8")},
+    )
+
+
+def _write_arrow(path: str, records: List[Dict]) -> None:
+    index = {record["url"]: row for row, record in enumerate(records)}
+    columns = {
+        "url": [record["url"] for record in records],
+        "title": [record["title"] for record in records],
+        "crawl_date": [record["crawl_date"] for record in records],
+        "blocks": [
+            [{"kind": block["kind"], "text": block["text"], "level": block.get("level", 0),
+              "table": block.get("table", 0), "heading_path": block.get("heading_path", [])}
+             for block in record["blocks"]]
+            for record in records
+        ],
+        "images": [record["images"] for record in records],
+    }
+    schema = _arrow_schema(index)
+    table = pa.Table.from_pydict(columns, schema=schema)
+    tmp_path = f"{path}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+class ShardWriter:
+    """Thread-safe appender of page records to rolling JSONL (and Arrow) shards."""
+
+    def __init__(self, directory: str, max_shard_bytes: int = 64 * 1024 * 1024, arrow: bool = True):
+        """
+        Args:
+            directory: Shard directory
+            max_shard_bytes: Size after which the current shard is closed and a new one started
+            arrow: Also write an Arrow IPC copy of every shard (needs pyarrow)
+        """
+        self.directory = directory
+        self.max_shard_bytes = max_shard_bytes
+        self.arrow = arrow and HAS_PYARROW
+        if arrow and not HAS_PYARROW:
+            logger.warning("pyarrow is not installed; writing JSONL shards only")
+        os.makedirs(directory, exist_ok=True)
+
+        # Shards of previous runs are never reopened: the writer continues with the next number
+        numbers = [int(m.group(1)) for m in map(SHARD_PATTERN.match, os.listdir(directory)) if m]
+        self._next_number = max(numbers) + 1 if numbers else 0
+        self._lock = threading.Lock()
+        self._file = None
+        self._path = None
+        self._index: Dict[str, Tuple[int, int]] = {}
+        self._records: List[Dict] = []
+        # Pages stored by earlier runs (from the shard footers) and by this one
+        with CorpusReader(directory) as reader:
+            self._urls = set(reader.index)
+        self.pages = 0
+        self.shards = 0
+
+    def _open(self) -> None:
+        self._path = os.path.join(self.directory, f"shard-{self._next_number:05d}.jsonl")
+        self._next_number += 1
+        self._file = open(self._path, "wb")
+        self._index = {}
+        self._records = []
+
+    def append(self, record: Dict) -> None:
+        """Appends a page record (see page_record) to the current shard."""
+        line = json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+        with self._lock:
+            if self._file is None:
+                self._open()
+            offset = self._file.tell()
+            self._file.write(line)
+            self._index[record["url"]] = (offset, len(line))
+            self._urls.add(record["url"])
+            if self.arrow:
+                self._records.append(record)
+            self.pages += 1
+            if self._file.tell() >= self.max_shard_bytes:
+                self._close_shard()
+
+    def __contains__(self, url: str) -> bool:
+        """Returns True if a record of the page is stored in the shard directory."""
+        with self._lock:
+            return url in self._urls
+
+    def _close_shard(self) -> None:
+        index_offset = self._file.tell()
+        self._file.write(json.dumps({"index": self._index}, ensure_ascii=False).encode("utf-8") + b"\n")
+        self._file.write(TRAILER_FORMAT.format(index_offset).encode("utf-8"))
+        self._file.close()
+        if self.arrow:
+            # Records overwritten later in the same shard keep only their last version
+            latest = {record["url"]: record for record in self._records}
+            _write_arrow(self._path[:-len(".jsonl")] + ".arrow", list(latest.values()))
+        logger.info(f"Closed shard {self._path} ({len(self._index)} pages, {index_offset} bytes)")
+        self.shards += 1
+        self._file = None
+
+    def close(self) -> None:
+        """Writes the footer of the current shard. Must be called at the end of a crawl."""
+        with self._lock:
+            if self._file is not None:
+                self._close_shard()
+
+
+def read_footer(data) -> Optional[Dict[str, Tuple[int, int]]]:
+    """
+    Reads the URL index from the footer of a closed JSONL shard.
+
+    Args:
+        data: Shard contents (bytes or mmap)
+
+    Returns:
+        URL → (offset, length), or None if the shard has no footer
+    """
+    if len(data) < TRAILER_SIZE:
+        return None
+    try:
+        trailer = json.loads(bytes(data[-TRAILER_SIZE:]))
+        index_offset = int(trailer["index_offset"])
+        index_line = json.loads(bytes(data[index_offset:len(data) - TRAILER_SIZE]))
+    except (ValueError, KeyError, TypeError):
+        return None
+    return {url: (offset, length) for url, (offset, length) in index_line["index"].items()}
+
+
+def scan_index(data) -> Dict[str, Tuple[int, int]]:
+    """Builds the URL index of an unclosed shard by reading it line by line."""
+    index = {}
+    offset = 0
+    while offset < len(data):
+        end = data.find(b"\n", offset)
+        if end == -1:
+            break  # partial last line of a crawl killed mid-write
+        try:
+            record = json.loads(bytes(data[offset:end]))
+            if "url" in record:
+                index[record["url"]] = (offset, end + 1 - offset)
+        except ValueError:
+            pass
+        offset = end + 1
+    return index
+
+
+class CorpusReader:
+    """Random access to the pages of a shard directory by URL."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._maps: Dict[str, mmap.mmap] = {}
+        self._files = []
+        # URL → (shard path, offset, length), newer shards override older ones
+        self.index: Dict[str, Tuple[str, int, int]] = {}
+        for name in sorted(os.listdir(directory)):
+            if not SHARD_PATTERN.match(name):
+                continue
+            path = os.path.join(directory, name)
+            data = self._map(path)
+            if data is None:
+                continue
+            shard_index = read_footer(data)
+            if shard_index is None:
+                logger.warning(f"Shard {path} has no footer (unfinished crawl?); scanning it")
+                shard_index = scan_index(data)
+            for url, (offset, length) in shard_index.items():
+                self.index[url] = (path, offset, length)
+
+    def _map(self, path: str) -> Optional[mmap.mmap]:
+        if os.path.getsize(path) == 0:
+            return None
+        f = open(path, "rb")
+        self._files.append(f)
+        self._maps[path] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._maps[path]
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, url: str) -> bool:
+        return url in self.index
+
+    def urls(self) -> List[str]:
+        return list(self.index)
+
+    def get(self, url: str) -> Optional[Dict]:
+        """Returns the record of a page, or None if it is not in the corpus."""
+        location = self.index.get(url)
+        if location is None:
+            return None
+        path, offset, length = location
+        return json.loads(self._maps[path][offset:offset + length])
+
+    def __iter__(self) -> Iterator[Dict]:
+        for url in self.index:
+            yield self.get(url)
+
+    def close(self) -> None:
+        for data in self._maps.values():
+            data.close()
+        for f in self._files:
+            f.close()
+        self._maps.clear()
+        self._files.clear()
+
+    def __enter__(self) -> "CorpusReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def read_arrow_page(path: str, url: str) -> Optional[Dict]:
+    """
+    Reads one page from an Arrow shard without copying the rest of it.
+
+    Args:
+        path: ``shard-NNNNN.arrow`` file
+        url: Page URL
+
+    Returns:
+        Page record, or None if the URL is not in the shard
+    """
+    with pa.memory_map(path) as source:
+        reader = pa.ipc.open_file(source)
+        index = json.loads(reader.schema.metadata[ARROW_INDEX_KEY])
+        row = index.get(url)
+        if row is None:
+            return None
+        table = reader.read_all()
+        return table.slice(row, 1).to_pylist()[0]
+
+
+def iter_page_dirs(crawl_dir: str) -> Iterator[Dict]:
+    """
+    Reads the page directories of a crawled_data/ tree as shard records.
+
+    Args:
+        crawl_dir: Output directory of multi-crawler (or pdf_text)
+
+    Yields:
+        Page records, in directory name order
+    """
+    for name in sorted(os.listdir(crawl_dir)):
+        metadata_file = os.path.join(crawl_dir, name, "metadata.json")
+        if not os.path.isfile(metadata_file):
+            continue
+        try:
+            with open(metadata_file, "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+            with open(os.path.join(crawl_dir, name, "content.txt"), "r", encoding="utf-8") as f:
+                blocks = parse_content(f.read())
+        except (IOError, ValueError) as e:
+            logger.warning(f"Skipping unreadable page directory {name}: {e}")
+            continue
+        yield page_record(metadata["url"], metadata.get("title", ""), metadata.get("crawl_date", ""),
+                          blocks, metadata.get("image_files", []))
+
+
+def convert_crawl_dir(crawl_dir: str, shard_dir: str, max_shard_bytes: int = 64 * 1024 * 1024,
+                      arrow: bool = True) -> int:
+    """
+    Converts an existing crawled_data/ tree of page directories into shards.
+
+    Returns:
+        Number of converted pages
+    """
+    writer = ShardWriter(shard_dir, max_shard_bytes, arrow)
+    try:
+        for record in iter_page_dirs(crawl_dir):
+            writer.append(record)
+    finally:
+        writer.close()
+    logger.info(f"Converted {writer.pages} pages from {crawl_dir} into {writer.shards} shards in {shard_dir}")
+    return writer.pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rolling JSONL/Arrow corpus shards.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert = commands.add_parser("convert", help="Convert a crawled_data/ tree of page directories into shards")
+    convert.add_argument("crawl_dir", help="Directory with one sub-directory per page")
+    convert.add_argument("-o", "--output", default=None, help="Shard directory (default: <crawl_dir>/shards)")
+    convert.add_argument("--shard-mb", type=int, default=64, help="Shard size in MB (default: 64)")
+    convert.add_argument("--no-arrow", action="store_true", help="Write JSONL shards only")
+
+    get = commands.add_parser("get", help="Print the content of one page")
+    get.add_argument("shard_dir")
+    get.add_argument("url")
+    get.add_argument("--json", action="store_true", help="Print the raw record instead of content.txt text")
+
+    stats = commands.add_parser("stats", help="Print the number of pages and shards")
+    stats.add_argument("shard_dir")
+
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        convert_crawl_dir(args.crawl_dir, args.output or os.path.join(args.crawl_dir, "shards"),
+                          args.shard_mb * 1024 * 1024, not args.no_arrow)
+    elif args.command == "get":
+        with CorpusReader(args.shard_dir) as reader:
+            record = reader.get(args.url)
+            if record is None:
+                print(f"Not found: {args.url}", file=sys.stderr)
+                return 1
+            if args.json:
+                print(json.dumps(record, ensure_ascii=False, indent=2))
+            else:
+                print(f"{record['title']} ({record['crawl_date']})")
+                print(record_content(record), end="")
+    elif args.command == "stats":
+        with CorpusReader(args.shard_dir) as reader:
+            shard_files = {path for path, _, _ in reader.index.values()}
+            print(f"{len(reader)} pages in {len(shard_files)} shards")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    sys.exit(main())
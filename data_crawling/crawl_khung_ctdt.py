@@ -1,13 +1,23 @@
+import json
 import os
 import requests
-from bs4 import BeautifulSoup
 import time
 import urllib.parse
 import argparse
-from concurrent.futures import ThreadPoolExecutor
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from queue import Queue
 import logging
 import re
 
+import http_client
+import html_parsing
+from blob_store import BlobStore
+from downloader import IncompleteDownloadError, read_head
+from frontier import Frontier
+from pdf_text import extract_documents, load_listing
+from rate_limiter import ByteRateLimiter
+
 # Thiết lập logging
 logging.basicConfig(
     level=logging.INFO,
@@ -164,45 +174,52 @@ logger = logging.getLogger(__name__)
 #     logger.info(f"Hoàn thành trang {url}! Đã tải {success_count}/{len(all_pdf_links)} file PDF vào {output_folder}")
 #     return success_count
 
-def download_pdfs_from_div_pattern(url, output_folder, div_pattern="dnn_ctr\\d+_ModuleContent", delay=1):
+# Số lần tải tiếp (Range) một PDF bị ngắt giữa chừng trong cùng một lần chạy
+RESUME_ATTEMPTS = 3
+PDF_MAGIC = b"%PDF"
+
+# Thiết lập headers để tránh bị chặn
+REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+}
+
+
+def find_pdf_links(url, output_folder, div_pattern="dnn_ctr\\d+_ModuleContent", raise_errors=False):
     """
-    Tải xuống tất cả các file PDF từ thẻ div với ID khớp với mẫu regex
+    Giai đoạn 1: tải trang và lập danh sách các file PDF cần tải
 
     Args:
         url: URL của trang web
         output_folder: Thư mục để lưu PDF
         div_pattern: Mẫu regex cho ID của div chứa các link PDF
-        delay: Thời gian chờ giữa các lần tải (giây)
+        raise_errors: Ném lại lỗi khi không tải được trang (để frontier thử lại sau)
 
     Returns:
-        Số lượng file PDF đã tải xuống thành công
+        Danh sách các tác vụ tải (dict gồm url, name, page_url, output_path)
     """
     # Tạo thư mục đầu ra nếu chưa tồn tại
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
         logger.info(f"Đã tạo thư mục: {output_folder}")
 
-    # Thiết lập headers để tránh bị chặn
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.5',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-    }
-
     # Tải trang web
     logger.info(f"Đang tải trang web: {url}")
     try:
         # Thêm allow_redirects=True để xử lý chuyển hướng
-        response = requests.get(url, headers=headers, timeout=15, verify=False, allow_redirects=True)
+        response = http_client.get_session().get(url, headers=REQUEST_HEADERS, timeout=15, verify=False, allow_redirects=True)
         response.raise_for_status()  # Kiểm tra lỗi HTTP
     except requests.exceptions.RequestException as e:
         logger.error(f"Lỗi khi tải trang web {url}: {e}")
-        return 0
+        if raise_errors:
+            raise
+        return []
 
     # Parse HTML
-    soup = BeautifulSoup(response.text, 'html.parser')
+    soup = html_parsing.parse_html(response.text)
 
     # Debug: Lưu HTML để kiểm tra
     with open("debug_page.html", "w", encoding="utf-8") as f:
@@ -299,7 +316,7 @@ def download_pdfs_from_div_pattern(url, output_folder, div_pattern="dnn_ctr\\d+_
 
     if not all_pdf_links:
         logger.warning(f"Không tìm thấy liên kết PDF nào trong trang web: {url}")
-        return 0
+        return []
 
     logger.info(f"Tổng cộng: {len(all_pdf_links)} file PDF tìm thấy tại {url}")
 
@@ -317,12 +334,9 @@ def download_pdfs_from_div_pattern(url, output_folder, div_pattern="dnn_ctr\\d+_
                     os.makedirs(div_folder)
                 div_folders[div_id] = div_folder
 
-    # Đếm số lượng file đã tải thành công
-    success_count = 0
-
-    # Tải xuống từng file PDF
-    for i, (pdf_url, pdf_name, div_id) in enumerate(all_pdf_links, 1):
-        # Tạo tên file an toàn
+    # Tạo tên file an toàn cho từng PDF
+    tasks = []
+    for pdf_url, pdf_name, div_id in all_pdf_links:
         safe_name = "".join([c if c.isalnum() or c in [' ', '.', '_', '-'] else '_' for c in pdf_name])
         safe_name = safe_name.strip()
 
@@ -333,80 +347,362 @@ def download_pdfs_from_div_pattern(url, output_folder, div_pattern="dnn_ctr\\d+_
         # Xác định thư mục đầu ra (thư mục chính hoặc thư mục con của div)
         target_folder = div_folders.get(div_id, output_folder) if create_subfolders else output_folder
 
-        # Đường dẫn đầy đủ để lưu file
-        output_path = os.path.join(target_folder, safe_name)
+        tasks.append({
+            "url": pdf_url,
+            "name": pdf_name,
+            "page_url": url,
+            # Đường dẫn đầy đủ để lưu file
+            "output_path": os.path.join(target_folder, safe_name),
+        })
+    return tasks
 
-        # Kiểm tra xem file đã tồn tại chưa
-        if os.path.exists(output_path):
-            logger.info(f"[{i}/{len(all_pdf_links)}] File đã tồn tại: {safe_name}")
-            success_count += 1
-            continue
 
-        # Tải file PDF
-        try:
-            logger.info(f"[{i}/{len(all_pdf_links)}] Đang tải: {pdf_url}")
-            pdf_response = requests.get(pdf_url, headers=headers, timeout=30, verify=False, allow_redirects=True)
+def download_pdf(task, blob_store, max_size_mb=200, listing=None, byte_limiter=None, label=""):
+    """
+    Giai đoạn 2: tải một file PDF vào kho blob và tạo file mang tên dễ đọc
+
+    Args:
+        task: Tác vụ tải do find_pdf_links tạo ra
+        blob_store: Kho blob dùng chung
+        max_size_mb: Kích thước tối đa của một file PDF (MB)
+        listing: Danh sách để ghi thông tin các PDF đã tải (url, tên, blob)
+        byte_limiter: ByteRateLimiter giới hạn tổng băng thông tải (tùy chọn)
+        label: Tiền tố cho các dòng log, vd "[3/40]"
+
+    Returns:
+        Mục của PDF trong kho blob, hoặc None nếu không tải được
+    """
+    pdf_url = task["url"]
+    output_path = task["output_path"]
+    safe_name = os.path.basename(output_path)
+    prefix = f"{label} " if label else ""
+
+    # File đã có chỉ được coi là xong khi khớp với blob đã lưu (kích thước, %PDF, SHA-256);
+    # file bị cắt ngang từ lần chạy trước sẽ được tải lại
+    entry = blob_store.lookup(pdf_url)
+    if os.path.exists(output_path):
+        if entry is None:
+            # PDF tải trước khi có kho blob: đưa vào kho thay vì tải lại từ đầu
+            entry = blob_store.adopt(pdf_url, output_path, "pdf", PDF_MAGIC, max_size_mb * 1024 * 1024)
+            if entry:
+                logger.info(f"{prefix}Đã đưa file có sẵn vào kho blob: {safe_name}")
+        if entry and blob_store.verify(entry, output_path, PDF_MAGIC):
+            logger.info(f"{prefix}File đã tồn tại: {safe_name}")
+            if listing is not None:
+                listing.append(pdf_listing_entry(pdf_url, task["name"], task["page_url"], output_path, blob_store,
+                                                 entry))
+            return entry
+        # File cũ được giữ lại đến khi bản mới tải xong và thay thế nó (blob_store.link)
+        logger.warning(f"{prefix}File không đầy đủ hoặc bị hỏng, tải lại: {safe_name}")
+        if entry and not blob_store.verify(entry, blob_store.blob_path(entry), PDF_MAGIC):
+            # Blob là hard link của chính file hỏng: xóa để không nhận 304 rồi dùng lại nó
+            os.remove(blob_store.blob_path(entry))
+
+    throttle = byte_limiter.consume if byte_limiter is not None else None
+    with blob_store.url_lock(pdf_url):
+        for attempt in range(1, RESUME_ATTEMPTS + 1):
+            # Gửi ETag/Last-Modified đã lưu để bỏ qua PDF không thay đổi (304), và Range để
+            # tải tiếp phần còn thiếu của file .part từ lần trước
+            range_headers = blob_store.range_headers(pdf_url)
+            request_headers = {**REQUEST_HEADERS, **blob_store.conditional_headers(pdf_url), **range_headers}
+            if range_headers:
+                logger.info(f"{prefix}Tải tiếp từ byte {range_headers['Range'][6:-1]}: {pdf_url}")
+            else:
+                logger.info(f"{prefix}Đang tải: {pdf_url}")
+            pdf_response = http_client.get_session().get(pdf_url, headers=request_headers, timeout=30, verify=False,
+                                                         allow_redirects=True, stream=True)
 
             # Kiểm tra Content-Type
             content_type = pdf_response.headers.get('Content-Type', '').lower()
 
+            entry = None
+            if pdf_response.status_code == 416:
+                # Phần đã tải không còn khớp với file trên máy chủ: tải lại từ đầu
+                pdf_response.close()
+                blob_store.discard_partial(pdf_url)
+                continue
+            if pdf_response.status_code == 304:
+                pdf_response.close()
+                blob_store.discard_partial(pdf_url)
+                entry = blob_store.mark_not_modified(pdf_url)
+                logger.info(f"{prefix}Không thay đổi (304): {safe_name}")
             # Kiểm tra nếu là PDF hoặc application/octet-stream hoặc URL có đuôi .pdf
-            if 'application/pdf' in content_type or 'application/octet-stream' in content_type or pdf_url.lower().endswith(
-                    '.pdf'):
-                # Lưu file
-                with open(output_path, 'wb') as f:
-                    f.write(pdf_response.content)
-
-                logger.info(f"[{i}/{len(all_pdf_links)}] Đã tải xuống: {safe_name}")
-                success_count += 1
+            elif pdf_response.status_code in (200, 206) and (
+                    'application/pdf' in content_type or 'application/octet-stream' in content_type
+                    or pdf_url.lower().endswith('.pdf')):
+                # Ghi vào file .part theo từng khối, kiểm tra độ dài, %PDF và tính SHA-256
+                try:
+                    entry = blob_store.put_resumable(pdf_url, pdf_response, "pdf",
+                                                     max_bytes=max_size_mb * 1024 * 1024, magic=PDF_MAGIC,
+                                                     throttle=throttle)
+                except (IncompleteDownloadError, requests.exceptions.ConnectionError,
+                        requests.exceptions.ChunkedEncodingError) as e:
+                    # Giữ lại file .part, lần thử sau chỉ tải phần còn thiếu
+                    logger.warning(f"{prefix}Tải bị ngắt (lần {attempt}/{RESUME_ATTEMPTS}): {pdf_url}: {e}")
+                    if attempt == RESUME_ATTEMPTS:
+                        raise
+                    continue
+
+                logger.info(f"{prefix}Đã tải xuống: {safe_name} "
+                            f"({entry['size']} bytes, sha256={entry['sha256'][:12]})")
             else:
-                logger.warning(f"[{i}/{len(all_pdf_links)}] Không phải PDF: {pdf_url} (Content-Type: {content_type})")
+                logger.warning(f"{prefix}Không phải PDF: {pdf_url} (HTTP {pdf_response.status_code}, "
+                               f"Content-Type: {content_type})")
 
-                # Lưu nội dung để kiểm tra
-                debug_file = os.path.join(target_folder, f"debug_{i}_{safe_name}.txt")
+                # Lưu nội dung để kiểm tra (chỉ đọc phần đầu của phản hồi)
+                debug_file = os.path.join(os.path.dirname(output_path), f"debug_{safe_name}.txt")
                 with open(debug_file, 'wb') as f:
-                    f.write(pdf_response.content[:1000])  # Lưu phần đầu để kiểm tra
+                    f.write(read_head(pdf_response, 1000))
                 logger.info(f"Đã lưu phần đầu của phản hồi vào {debug_file}")
+            break
+
+    if entry:
+        # Hiển thị blob dưới tên dễ đọc mà không lưu thêm bản sao
+        blob_store.link(entry, output_path)
+        if listing is not None:
+            listing.append(pdf_listing_entry(pdf_url, task["name"], task["page_url"], output_path, blob_store,
+                                             entry))
+    return entry
+
+
+def download_pdfs_from_div_pattern(url, output_folder, div_pattern="dnn_ctr\\d+_ModuleContent",
+                                   max_size_mb=200, blob_store=None, listing=None, raise_errors=False):
+    """
+    Tải xuống tất cả các file PDF từ thẻ div với ID khớp với mẫu regex
+
+    Mỗi PDF chỉ được lưu một lần trong kho blob (theo SHA-256); file mang tên
+    liên kết trong thư mục đầu ra là hard link tới blob đó. Các PDF của trang
+    được tải lần lượt; process_url_list dùng một pool tải chung cho nhiều trang.
+
+    Args:
+        url: URL của trang web
+        output_folder: Thư mục để lưu PDF
+        div_pattern: Mẫu regex cho ID của div chứa các link PDF
+        max_size_mb: Kích thước tối đa của một file PDF (MB)
+        blob_store: Kho blob dùng chung (mặc định: <output_folder>/blobs)
+        listing: Danh sách để ghi thông tin các PDF đã tải (url, tên, blob)
+        raise_errors: Ném lại lỗi khi không tải được trang (để frontier thử lại sau)
+
+    Returns:
+        Số lượng file PDF đã tải xuống thành công
+    """
+    # Dùng kho blob riêng nếu không được truyền vào
+    owns_blob_store = blob_store is None
+    if owns_blob_store:
+        blob_store = BlobStore(os.path.join(output_folder, "blobs"))
 
-            # Đợi một chút để tránh tải quá nhanh
-            time.sleep(delay)
+    tasks = find_pdf_links(url, output_folder, div_pattern, raise_errors)
 
+    # Đếm số lượng file đã tải thành công
+    success_count = 0
+    for i, task in enumerate(tasks, 1):
+        try:
+            if download_pdf(task, blob_store, max_size_mb, listing, label=f"[{i}/{len(tasks)}]"):
+                success_count += 1
         except Exception as e:
-            logger.error(f"[{i}/{len(all_pdf_links)}] Lỗi khi tải {pdf_url}: {e}")
+            logger.error(f"[{i}/{len(tasks)}] Lỗi khi tải {task['url']}: {e}")
 
-    logger.info(f"Hoàn thành trang {url}! Đã tải {success_count}/{len(all_pdf_links)} file PDF vào {output_folder}")
+    if owns_blob_store:
+        blob_store.save()
+
+    logger.info(f"Hoàn thành trang {url}! Đã tải {success_count}/{len(tasks)} file PDF vào {output_folder}")
     return success_count
 
 
-def process_url_list(urls, output_folder, div_pattern="dnn_ctr\\d+_ModuleContent", max_workers=3, delay=1):
+def pdf_listing_entry(pdf_url, title, page_url, file_path, blob_store, entry):
+    """
+    Tạo một mục trong danh sách PDF, trỏ tới blob trong kho
+
+    Args:
+        pdf_url: URL của file PDF
+        title: Tiêu đề (nội dung liên kết)
+        page_url: URL của trang chứa liên kết
+        file_path: Đường dẫn file mang tên dễ đọc
+        blob_store: Kho blob
+        entry: Mục của PDF trong chỉ mục kho blob
+
+    Returns:
+        Dict mô tả PDF
+    """
+    return {
+        "url": pdf_url,
+        "title": title,
+        "page_url": page_url,
+        "file": file_path,
+        "blob": blob_store.blob_path(entry),
+        "sha256": entry["sha256"],
+        "size": entry["size"],
+    }
+
+
+def save_pdf_listing(listing, listing_file):
+    """
+    Ghi danh sách PDF ra file JSON, gộp với danh sách của các lần chạy trước
+
+    Đường dẫn file và blob được ghi tương đối so với thư mục chứa file JSON, để
+    danh sách vẫn dùng được khi chạy từ thư mục khác hoặc khi chuyển cả thư mục đi.
+
+    Args:
+        listing: Danh sách các mục PDF
+        listing_file: Đường dẫn file JSON
+    """
+    listing_dir = os.path.dirname(os.path.abspath(listing_file))
+    listing = [{**item, "file": os.path.relpath(item["file"], listing_dir),
+                "blob": os.path.relpath(item["blob"], listing_dir)} for item in listing]
+
+    entries = {}
+    if os.path.exists(listing_file):
+        try:
+            with open(listing_file, 'r', encoding='utf-8') as f:
+                entries = {item["url"]: item for item in json.load(f)}
+        except (IOError, ValueError) as e:
+            logger.warning(f"Bỏ qua danh sách PDF không đọc được {listing_file}: {e}")
+    entries.update({item["url"]: item for item in listing})
+
+    with open(listing_file, 'w', encoding='utf-8') as f:
+        json.dump(list(entries.values()), f, ensure_ascii=False, indent=2)
+    logger.info(f"Đã lưu danh sách {len(entries)} PDF vào {listing_file}")
+
+
+class DownloadProgress:
+    """Đếm tiến độ của pool tải (dùng chung cho các luồng) và ghi log khi mỗi file hoàn thành"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.done = 0
+        self.failed = 0
+        self.bytes = 0
+        self.start = time.perf_counter()
+
+    def add(self, count):
+        with self.lock:
+            self.queued += count
+
+    def finish(self, task, entry):
+        with self.lock:
+            self.done += 1
+            if entry:
+                self.bytes += entry.get("size", 0)
+            else:
+                self.failed += 1
+            elapsed = time.perf_counter() - self.start
+            logger.info(f"[{self.done}/{self.queued}] {'Xong' if entry else 'Lỗi'}: {os.path.basename(task['output_path'])} "
+                        f"- tổng {self.bytes / 1024 / 1024:.1f} MB, {self.bytes / 1024 / 1024 / elapsed:.2f} MB/s")
+
+
+def process_url_list(urls, output_folder, div_pattern="dnn_ctr\\d+_ModuleContent", max_workers=3,
+                     max_size_mb=200, frontier=None, queue="pdf_pages", download_workers=4,
+                     max_bandwidth_mb=None, queue_size=100):
     """
     Xử lý một danh sách URL để tải xuống các file PDF
 
+    Chạy theo hai giai đoạn nối với nhau bằng một hàng đợi có giới hạn: max_workers
+    luồng tải các trang và tìm liên kết PDF, download_workers luồng dùng chung tải
+    các PDF của mọi trang. Khi hàng đợi đầy, các luồng tìm liên kết phải chờ.
+
     Args:
         urls: Danh sách các URL cần xử lý
         output_folder: Thư mục để lưu PDF
         div_pattern: Mẫu regex cho ID của div chứa các link PDF
-        max_workers: Số luồng đồng thời tối đa
-        delay: Thời gian chờ giữa các lần tải (giây)
+        max_workers: Số luồng tìm liên kết PDF đồng thời tối đa
+        max_size_mb: Kích thước tối đa của một file PDF (MB)
+        frontier: Frontier để lấy URL (khi đó urls bị bỏ qua); mỗi trang được đánh
+            dấu hoàn thành khi mọi PDF của nó đã được xử lý, hoặc lỗi nếu không tải được trang
+        queue: Hàng đợi trong frontier
+        download_workers: Số luồng tải PDF đồng thời
+        max_bandwidth_mb: Tổng tốc độ tải PDF tối đa (MB/s, None: không giới hạn)
+        queue_size: Số tác vụ tải tối đa chờ trong hàng đợi
     """
-    total_pdfs = 0
-
-    # Sử dụng ThreadPoolExecutor để xử lý nhiều URL cùng lúc
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Tạo các futures cho mỗi URL
-        futures = {executor.submit(download_pdfs_from_div_pattern, url, output_folder, div_pattern, delay): url for url
-                   in urls}
+    total_pages = 0
 
-        # Xử lý kết quả khi hoàn thành
-        for future in futures:
-            url = futures[future]
+    def url_batches():
+        if frontier is None:
+            yield urls
+        else:
+            # Mỗi lần lấy một lô bằng số luồng, cho đến khi hết URL sẵn sàng
+            yield from frontier.lease_batches(queue, max_workers)
+
+    # Kho blob và danh sách PDF dùng chung cho tất cả các luồng
+    blob_store = BlobStore(os.path.join(output_folder, "blobs"))
+    listing = []
+
+    task_queue = Queue(maxsize=queue_size)
+    byte_limiter = ByteRateLimiter(max_bandwidth_mb * 1024 * 1024) if max_bandwidth_mb else None
+    progress = DownloadProgress()
+    # Số PDF còn chờ tải của mỗi trang, để đánh dấu trang hoàn thành trong frontier
+    pending = {}
+    pending_lock = threading.Lock()
+
+    def page_done(page_url):
+        if frontier is not None:
+            frontier.complete(queue, page_url)
+
+    def discover(url):
+        tasks = find_pdf_links(url, output_folder, div_pattern, frontier is not None)
+        if not tasks:
+            page_done(url)
+            return 0
+        with pending_lock:
+            pending[url] = pending.get(url, 0) + len(tasks)
+        progress.add(len(tasks))
+        for task in tasks:
+            task_queue.put(task)
+        return len(tasks)
+
+    def download_worker():
+        while True:
+            task = task_queue.get()
+            if task is None:
+                return
+            entry = None
             try:
-                pdfs_count = future.result()
-                total_pdfs += pdfs_count
+                entry = download_pdf(task, blob_store, max_size_mb, listing, byte_limiter)
             except Exception as e:
-                logger.error(f"Lỗi không xác định khi xử lý {url}: {e}")
+                logger.error(f"Lỗi khi tải {task['url']}: {e}")
+            progress.finish(task, entry)
+            with pending_lock:
+                pending[task["page_url"]] -= 1
+                finished = pending[task["page_url"]] == 0
+            if finished:
+                page_done(task["page_url"])
+
+    with ThreadPoolExecutor(max_workers=download_workers) as download_pool:
+        for _ in range(download_workers):
+            download_pool.submit(download_worker)
 
-    logger.info(f"Tổng cộng đã tải xuống {total_pdfs} file PDF từ {len(urls)} trang web")
+        try:
+            # Sử dụng ThreadPoolExecutor để xử lý nhiều URL cùng lúc
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for batch in url_batches():
+                    # Tạo các futures cho mỗi URL
+                    futures = {executor.submit(discover, url): url for url in batch}
+                    total_pages += len(batch)
+
+                    # Xử lý kết quả theo thứ tự hoàn thành
+                    for future in as_completed(futures):
+                        url = futures[future]
+                        try:
+                            pdfs_count = future.result()
+                            logger.info(f"Đã đưa {pdfs_count} file PDF của {url} vào hàng đợi tải")
+                        except Exception as e:
+                            logger.error(f"Lỗi không xác định khi xử lý {url}: {e}")
+                            if frontier is not None:
+                                frontier.fail(queue, url, str(e))
+        finally:
+            # Báo cho các luồng tải dừng lại sau khi hết tác vụ, kể cả khi giai đoạn tìm liên kết
+            # bị lỗi hoặc bị ngắt (Ctrl+C): nếu không, download_pool chờ các luồng tải mãi mãi
+            for _ in range(download_workers):
+                task_queue.put(None)
+
+    elapsed = time.perf_counter() - progress.start
+    logger.info(f"Tổng cộng đã tải xuống {progress.done - progress.failed}/{progress.queued} file PDF "
+                f"({progress.bytes / 1024 / 1024:.1f} MB) từ {total_pages} trang web trong {elapsed:.1f} giây")
+    if frontier is not None:
+        logger.info(f"Trạng thái hàng đợi '{queue}': {frontier.counts(queue)}")
+    blob_store.save()
+    save_pdf_listing(listing, os.path.join(output_folder, "pdf_listing.json"))
+    http_client.log_connection_stats(logger)
 
 
 def read_urls_from_file(file_path):
@@ -435,13 +731,34 @@ def main():
     group.add_argument('-u', '--url', help='URL của trang web cần tải PDF')
     group.add_argument('-f', '--file', help='File chứa danh sách URL (mỗi URL một dòng)')
     group.add_argument('-l', '--urls', nargs='+', help='Danh sách các URL cách nhau bởi khoảng trắng')
+    group.add_argument('-F', '--frontier', help='File SQLite của frontier để lấy URL (vd: data/frontier.sqlite)')
 
     parser.add_argument('-o', '--output', default='downloaded_pdfs', help='Thư mục đầu ra (mặc định: downloaded_pdfs)')
     parser.add_argument('-d', '--div-pattern', default='dnn_ctr\\d+_ModuleContent',
                         help='Mẫu regex cho ID của div (mặc định: dnn_ctr\\d+_ModuleContent)')
-    parser.add_argument('-w', '--workers', type=int, default=3, help='Số luồng đồng thời tối đa (mặc định: 3)')
+    parser.add_argument('-w', '--workers', type=int, default=3,
+                        help='Số luồng tìm liên kết PDF đồng thời tối đa (mặc định: 3)')
+    parser.add_argument('-D', '--download-workers', type=int, default=4,
+                        help='Số luồng tải PDF dùng chung cho mọi trang (mặc định: 4)')
+    parser.add_argument('-b', '--max-bandwidth', type=float, default=None,
+                        help='Tổng tốc độ tải PDF tối đa (MB/s, mặc định: không giới hạn)')
     parser.add_argument('-t', '--delay', type=float, default=1.0,
-                        help='Thời gian chờ giữa các lần tải (giây, mặc định: 1.0)')
+                        help='Thời gian chờ ban đầu giữa hai request tới cùng một máy chủ, sau đó tốc độ '
+                             'tự điều chỉnh (giây, mặc định: 1.0)')
+    parser.add_argument('-r', '--max-rate', type=float, default=5.0,
+                        help='Số request tối đa mỗi giây tới một máy chủ (mặc định: 5)')
+    parser.add_argument('-p', '--parser', choices=html_parsing.BACKENDS, default=None,
+                        help='Bộ phân tích HTML (mặc định: lxml nếu đã cài, nếu không thì html.parser)')
+    parser.add_argument('-m', '--max-size', type=int, default=200,
+                        help='Kích thước tối đa của một file PDF (MB, mặc định: 200)')
+    parser.add_argument('-q', '--queue', default='pdf_pages',
+                        help='Hàng đợi trong frontier (mặc định: pdf_pages)')
+    parser.add_argument('-R', '--requeue', choices=['done', 'failed', 'all'], nargs='?', const='all', default=None,
+                        help='Đưa các trang đã xong và/hoặc bị lỗi của hàng đợi về trạng thái chờ trước khi chạy, '
+                             'vd: để cập nhật lại (mặc định: all)')
+    parser.add_argument('-x', '--extract-text', metavar='OUTPUT_DIR', default=None,
+                        help='Sau khi tải, trích xuất văn bản và bảng của các PDF thành content.txt trong thư mục '
+                             'này (vd: crawled_data; chỉ xử lý PDF mới hoặc đã thay đổi)')
 
     args = parser.parse_args()
 
@@ -454,12 +771,33 @@ def main():
     elif args.urls:
         urls = args.urls
 
-    if not urls:
+    frontier = Frontier(args.frontier) if args.frontier else None
+    if args.requeue:
+        if frontier is None:
+            parser.error('--requeue cần --frontier')
+        states = ['done', 'failed'] if args.requeue == 'all' else [args.requeue]
+        requeued = frontier.requeue(args.queue, states)
+        logger.info(f"Đã đưa {requeued} trang về hàng đợi '{args.queue}'")
+
+    if not urls and frontier is None:
         logger.error("Không có URL nào để xử lý.")
         return
 
+    html_parsing.set_default_backend(args.parser)
+
+    # Dùng chung một session (pool kết nối theo số luồng) cho tất cả các luồng; tốc độ request
+    # tới mỗi máy chủ do một bộ giới hạn chung điều chỉnh, không phụ thuộc số luồng
+    http_client.configure_rate_limiter(initial_rate=1.0 / max(args.delay, 0.01), max_rate=args.max_rate)
+    http_client.configure_session(pool_size=args.workers + args.download_workers)
+
     # Xử lý các URL
-    process_url_list(urls, args.output, args.div_pattern, args.workers, args.delay)
+    process_url_list(urls, args.output, args.div_pattern, args.workers, args.max_size,
+                     frontier, args.queue, args.download_workers, args.max_bandwidth)
+
+    if args.extract_text:
+        # Giai đoạn 3: trích xuất văn bản bằng một pool tiến trình, dùng lại kết quả đã lưu theo SHA-256
+        listing = load_listing(os.path.join(args.output, "pdf_listing.json"))
+        extract_documents(listing, args.extract_text)
 
 
 if __name__ == "__main__":
@@ -1,63 +1,72 @@
-from bs4 import BeautifulSoup
+import argparse
+import heapq
 import requests
 import time
 import os
-import random
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+import http_client
+from frontier import Frontier, canonicalize_url
+from html_parsing import parse_html
+
+# Hàng đợi URL dùng chung với multi-crawler.py và crawl_khung_ctdt.py
+FRONTIER_DB = "data/frontier.sqlite"
+
+# Các div menu chứa liên kết tới các trang con của một chuyên mục
+MENU_IDS = ["jquery-accordion-menu-header", "jquery-accordion-menu"]
+
+# Các trang chuyên mục dùng làm điểm xuất phát khi khám phá toàn bộ trang web
+SECTION_URLS = [
+    "https://hus.vnu.edu.vn/gioi-thieu.html",
+    "https://hus.vnu.edu.vn/dao-tao.html",
+    "https://hus.vnu.edu.vn/khoa-hoc-cong-nghe.html",
+    "https://hus.vnu.edu.vn/hop-tac-va-phat-trien.html",
+    "https://hus.vnu.edu.vn/hoc-sinh-sinh-vien.html",
+    "https://hus.vnu.edu.vn/tai-lieu-bieu-mau.html",
+    "https://hus.vnu.edu.vn/tin-tuc-su-kien.html",
+]
+
+# Div chứa danh sách tin tức và bộ phân trang của nó
+NEWS_MODULE_ID = "dnn_ctr10921_ModuleContent"
+NEXT_PAGE_TEXTS = {"›", "»", ">", "Sau", "Trang sau", "Tiếp", "Next"}
+
+# Liên kết tới file (không phải trang HTML) không được tải khi khám phá
+NON_PAGE_EXTENSIONS = (
+    ".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx", ".zip", ".rar",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".svg", ".mp3", ".mp4", ".avi",
+)
 
 
 def setup_session():
-    # Tạo session với cấu hình retry
-    session = requests.Session()
+    # Dùng session chung (pool kết nối, retry với backoff, nén HTTP) từ http_client
+    return http_client.get_session()
 
-    # Cấu hình retry với backoff để thử lại khi bị lỗi
-    retry_strategy = Retry(
-        total=3,  # Số lần thử lại tối đa
-        status_forcelist=[429, 500, 502, 503, 504],  # Mã lỗi cần thử lại
-        backoff_factor=1,  # Hệ số trì hoãn (1s, 2s, 4s, ...)
-        respect_retry_after_header=True  # Tôn trọng header Retry-After
-    )
 
-    # Áp dụng chiến lược retry cho tất cả các request HTTP/HTTPS
-    adapter = HTTPAdapter(max_retries=retry_strategy)
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
+def find_menu_links(soup):
+    # Tìm thẻ <div> có id là "jquery-accordion-menu-header"
+    menu_div = soup.find("div", {"id": MENU_IDS[0]})
 
-    # Thêm User-Agent để trang web không nghi ngờ là bot
-    session.headers.update({
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/90.0.4430.212 Safari/537.36',
-        'Accept-Language': 'vi-VN,vi;q=0.9,en-US;q=0.8,en;q=0.7',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8'
-    })
+    # Nếu không tìm thấy, thử tìm các container menu khác
+    if not menu_div:
+        menu_div = soup.find("div", {"id": MENU_IDS[1]})
 
-    return session
+    # Lấy tất cả các link trong thẻ <div> này
+    return [a['href'] for a in menu_div.find_all('a', href=True)] if menu_div else []
 
 
-def get_links(url, output_file, session):
+def get_links(url, output_file, session, frontier=None, queue="pages"):
     try:
-        # Trì hoãn ngẫu nhiên từ 2-5 giây trước mỗi request
-        delay = random.uniform(2, 5)
-        print(f"Đợi {delay:.2f} giây trước khi truy cập {url}...")
-        time.sleep(delay)
-
+        # Tốc độ request do bộ giới hạn chung của http_client điều chỉnh
         print(f"Đang truy cập {url}...")
         response = session.get(url, verify=False, timeout=10)
 
         # Kiểm tra trạng thái response
         response.raise_for_status()
 
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        # Tìm thẻ <div> có id là "jquery-accordion-menu-header"
-        menu_div = soup.find("div", {"id": "jquery-accordion-menu-header"})
-
-        # Nếu không tìm thấy, thử tìm các container menu khác
-        if not menu_div:
-            menu_div = soup.find("div", {"id": "jquery-accordion-menu"})
-
-        # Lấy tất cả các link trong thẻ <div> này
-        links = [a['href'] for a in menu_div.find_all('a', href=True)] if menu_div else []
+        # Chỉ cần các div menu (backend "strained" bỏ qua phần còn lại của trang)
+        soup = parse_html(response.text, only="div", only_attrs={"id": MENU_IDS})
+        links = find_menu_links(soup)
 
         # Tạo thư mục đầu ra nếu chưa tồn tại
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
@@ -68,18 +77,23 @@ def get_links(url, output_file, session):
                 print(f"Không tìm thấy liên kết nào trong {url}")
                 f.write(f"# Không tìm thấy liên kết nào trong {url}\n")
             else:
-                count = 0
+                saved_links = []
                 for link in links:
                     if link.startswith('https') or link.startswith('http'):
                         f.write(link + '\n')
-                        count += 1
+                        saved_links.append(link)
                     elif link.startswith('/'):
                         # Xử lý đường dẫn tương đối
                         base_url = '/'.join(url.split('/')[:3])  # Lấy phần domain
                         full_link = base_url + link
                         f.write(full_link + '\n')
-                        count += 1
-                print(f"Đã lưu {count} liên kết từ {url}")
+                        saved_links.append(full_link)
+                print(f"Đã lưu {len(saved_links)} liên kết từ {url}")
+
+                # Đưa các link vào frontier để các crawler lấy việc từ đó
+                if frontier is not None:
+                    added = frontier.add(saved_links, queue, source=url)
+                    print(f"Đã thêm {added} liên kết mới vào hàng đợi '{queue}'")
 
         return True
 
@@ -89,65 +103,267 @@ def get_links(url, output_file, session):
             error_file.write(f"{url}: {str(e)}\n")
         return False
 
-def get_news_links(url, output_file, session):
-    try:
-        # Trì hoãn ngẫu nhiên từ 2-5 giây trước mỗi request
-        delay = random.uniform(2, 5)
-        print(f"Đợi {delay:.2f} giây trước khi truy cập {url}...")
-        time.sleep(delay)
-
-        print(f"Đang truy cập {url}...")
+def parse_news_page(html, url):
+    """Trả về (các link bài viết, URL trang danh sách kế tiếp hoặc None) của một trang danh sách tin."""
+    # Chỉ cần div chứa danh sách tin và phân trang (backend "strained" bỏ qua phần còn lại của trang)
+    soup = parse_html(html, only="div", only_attrs={"id": NEWS_MODULE_ID})
+    module_div = soup.find("div", {"id": NEWS_MODULE_ID})
+    if not module_div:
+        return [], None
+
+    # Lấy tất cả các link bài viết trong thẻ <div> này, theo thứ tự trên trang
+    links = []
+    for div in module_div.find_all("div", class_="item-image"):
+        for a in div.find_all('a', href=True):
+            link = canonicalize_url(a['href'], url)
+            if link and link not in links:
+                links.append(link)
+
+    # Trang kế tiếp: link rel="next" hoặc nút "›"/"Sau" của bộ phân trang
+    next_url = None
+    for a in module_div.find_all('a', href=True):
+        rel = a.get('rel') or []
+        if 'next' in rel or a.get_text(strip=True) in NEXT_PAGE_TEXTS:
+            next_url = canonicalize_url(a['href'], url)
+            break
+    if next_url == canonicalize_url(url):
+        next_url = None
+    return links, next_url
+
+
+def iter_news_links(start_url, session, max_pages=200):
+    """
+    Duyệt lần lượt các trang danh sách tin, trả về từng link bài viết (mới nhất trước).
+
+    Trang kế tiếp chỉ được tải khi nơi gọi cần thêm link, nên dừng vòng lặp sớm
+    sẽ không tốn thêm request nào.
+    """
+    url = start_url
+    visited = set()
+    for page in range(max_pages):
+        if not url or url in visited:
+            return
+        visited.add(url)
+
+        print(f"Đang truy cập trang danh sách {page + 1}: {url}...")
         response = session.get(url, verify=False, timeout=10)
-
-        # Kiểm tra trạng thái response
         response.raise_for_status()
 
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        # Tìm thẻ <div> có id là "jquery-accordion-menu-header"
-        menu_div = soup.find("div", {"id": "dnn_ctr10921_ModuleContent"})
+        links, url = parse_news_page(response.content, response.url)
+        if not links:
+            print(f"Không tìm thấy liên kết nào trong {response.url}")
+            return
+        yield from links
+
+
+def read_link_set(output_file):
+    """Đọc các link đã lưu (bỏ trùng, giữ thứ tự); ghi lại file nếu có dòng trùng."""
+    if not os.path.exists(output_file):
+        return []
+    with open(output_file, 'r', encoding='utf-8') as f:
+        lines = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    links = list(dict.fromkeys(canonicalize_url(line) or line for line in lines))
+    if len(links) != len(lines):
+        write_link_set(output_file, links)
+    return links
+
+
+def write_link_set(output_file, links):
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    temp_file = output_file + ".tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        f.writelines(link + '\n' for link in links)
+    os.replace(temp_file, output_file)
+
+
+def get_news_links(url, output_file, session, frontier=None, queue="pages", stop_after_seen=5, max_pages=200):
+    """
+    Cập nhật tăng dần danh sách link tin tức trong output_file.
+
+    Các trang danh sách được duyệt theo thứ tự (tin mới nhất trước) và dừng ngay
+    khi gặp stop_after_seen link liên tiếp đã có trong file, nên một lần cập nhật
+    hằng ngày chỉ tốn một hai request. File luôn không có link trùng, link mới
+    nhất ở đầu file.
+    """
+    known = read_link_set(output_file)
+    seen = set(known)
+    new_links = []
+    seen_in_a_row = 0
+    try:
+        for link in iter_news_links(url, session, max_pages):
+            if link in seen:
+                seen_in_a_row += 1
+                if seen_in_a_row >= stop_after_seen:
+                    print(f"Gặp {seen_in_a_row} link đã có liên tiếp, dừng duyệt")
+                    break
+                continue
+            seen_in_a_row = 0
+            seen.add(link)
+            new_links.append(link)
+        success = True
+    except requests.exceptions.RequestException as e:
+        # Vẫn lưu các link mới tìm được trước khi gặp lỗi
+        print(f"Lỗi khi truy cập {url}: {e}")
+        with open("error_log.txt", "a", encoding='utf-8') as error_file:
+            error_file.write(f"{url}: {str(e)}\n")
+        success = False
 
-        # Nếu không tìm thấy, thử tìm các container menu khác
-        # if not menu_div:
-        #     menu_div = soup.find("div", {"id": "jquery-accordion-menu"})
+    if new_links:
+        write_link_set(output_file, new_links + known)
+    print(f"Đã lưu {len(new_links)} liên kết mới từ {url} (tổng {len(known) + len(new_links)})")
 
+    # Đưa các link vào frontier để các crawler lấy việc từ đó
+    if frontier is not None and new_links:
+        added = frontier.add(new_links, queue, source=url)
+        print(f"Đã thêm {added} liên kết mới vào hàng đợi '{queue}'")
 
-        # Lấy tất cả các link trong thẻ <div> này
-        links = [a['href'] for div in menu_div.find_all("div", class_="item-image") for a in
-                 div.find_all('a', href=True)] if menu_div else []
+    return success
 
-        # Tạo thư mục đầu ra nếu chưa tồn tại
-        os.makedirs(os.path.dirname(output_file), exist_ok=True)
 
-        with open(output_file, 'a', encoding='utf-8') as f:
-            # In danh sách các link
-            if not links:
-                print(f"Không tìm thấy liên kết nào trong {url}")
-                f.write(f"# Không tìm thấy liên kết nào trong {url}\n")
-            else:
-                count = 0
-                for link in links:
-                    if link.startswith('https') or link.startswith('http'):
-                        f.write(link + '\n')
-                        count += 1
-                    elif link.startswith('/'):
-                        # Xử lý đường dẫn tương đối
-                        base_url = '/'.join(url.split('/')[:3])  # Lấy phần domain
-                        full_link = base_url + link
-                        f.write(full_link + '\n')
-                        count += 1
-                print(f"Đã lưu {count} liên kết từ {url}")
+def is_page_link(url):
+    return not urlsplit(url).path.lower().endswith(NON_PAGE_EXTENSIONS)
 
-        return True
 
-    except requests.exceptions.RequestException as e:
-        print(f"Lỗi khi truy cập {url}: {e}")
-        with open("error_log.txt", "a", encoding='utf-8') as error_file:
-            error_file.write(f"{url}: {str(e)}\n")
-        return False
+def fetch_page_links(url, session, timeout=10):
+    """
+    Tải một trang và trả về (link trong menu, các link còn lại) dưới dạng URL tuyệt đối.
+    Trang không phải HTML trả về hai danh sách rỗng.
+    """
+    with session.get(url, verify=False, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        if "html" not in response.headers.get("Content-Type", "text/html"):
+            return [], []
+        html = response.text
+
+    soup = parse_html(html)
+    menu_links = [canonicalize_url(link, url) for link in find_menu_links(soup)]
+    other_links = [canonicalize_url(a['href'], url) for a in soup.find_all('a', href=True)]
+    return [link for link in menu_links if link], [link for link in other_links if link]
+
+
+def discover_site(start_urls, session, output_file, frontier=None, queue="pages", max_depth=3,
+                  workers=8, timeout=10):
+    """
+    Khám phá trang web theo chiều rộng, bắt đầu từ các trang chuyên mục.
+
+    Chỉ theo các liên kết cùng tên miền với trang xuất phát, tới độ sâu max_depth.
+    Trong cùng một độ sâu, liên kết trong menu (MENU_IDS) được tải trước. Các trang
+    được tải đồng thời bởi `workers` luồng; tốc độ request tới máy chủ do bộ giới
+    hạn chung của http_client điều chỉnh. Mỗi URL mới được ghi ngay vào
+    output_file (và frontier).
+
+    Returns:
+        Tập các URL đã khám phá (đã chuẩn hóa)
+    """
+    hosts = {urlsplit(canonicalize_url(url)).netloc for url in start_urls}
+
+    # Hàng đợi ưu tiên (độ sâu, ưu tiên, thứ tự, url): 0 = link menu, 1 = link khác
+    heap = []
+    seen = set()
+    counter = 0
+    for url in start_urls:
+        url = canonicalize_url(url)
+        if url not in seen:
+            seen.add(url)
+            heapq.heappush(heap, (0, 0, counter, url))
+            counter += 1
+
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    fetched, errors = 0, 0
+    start_time = time.perf_counter()
+
+    with open(output_file, 'w', encoding='utf-8') as f, ThreadPoolExecutor(max_workers=workers) as executor:
+        for url in sorted(seen):
+            f.write(url + '\n')
+        if frontier is not None:
+            frontier.add(seen, queue, source="discovery")
+
+        in_flight = {}
+        while heap or in_flight:
+            # Giữ đủ `workers` trang đang tải, theo thứ tự ưu tiên
+            while heap and len(in_flight) < workers:
+                depth, _, _, url = heapq.heappop(heap)
+                future = executor.submit(fetch_page_links, url, session, timeout)
+                in_flight[future] = (url, depth)
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                url, depth = in_flight.pop(future)
+                fetched += 1
+                try:
+                    menu_links, other_links = future.result()
+                except Exception as e:
+                    # Lỗi của một trang (mạng, HTML hỏng, ...) không được làm dừng cả quá trình khám phá
+                    errors += 1
+                    if isinstance(e, requests.exceptions.RequestException):
+                        print(f"Lỗi khi truy cập {url}: {e}")
+                    else:
+                        print(f"Lỗi khi xử lý {url}: {e!r}")
+                    with open("error_log.txt", "a", encoding='utf-8') as error_file:
+                        error_file.write(f"{url}: {e!r}\n")
+                    continue
+
+                new_links = []
+                for priority, links in ((0, menu_links), (1, other_links)):
+                    for link in links:
+                        if link in seen or urlsplit(link).netloc not in hosts:
+                            continue
+                        seen.add(link)
+                        new_links.append(link)
+                        if depth + 1 < max_depth and is_page_link(link):
+                            heapq.heappush(heap, (depth + 1, priority, counter, link))
+                            counter += 1
+
+                if new_links:
+                    f.write(''.join(link + '\n' for link in new_links))
+                    f.flush()
+                    if frontier is not None:
+                        frontier.add([link for link in new_links if is_page_link(link)], queue, source=url)
+
+                if fetched % 50 == 0:
+                    elapsed = time.perf_counter() - start_time
+                    print(f"Đã quét {fetched} trang ({fetched / elapsed:.1f} trang/giây), "
+                          f"tìm thấy {len(seen)} URL, còn {len(heap) + len(in_flight)} trang chờ")
+
+    elapsed = time.perf_counter() - start_time
+    print(f"Hoàn tất khám phá: {fetched} trang đã quét ({errors} lỗi), {len(seen)} URL "
+          f"trong {elapsed:.1f} giây. Đã lưu vào {output_file}")
+    return seen
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Thu thập liên kết các trang của hus.vnu.edu.vn")
+    parser.add_argument("--discover", action="store_true",
+                        help="Khám phá toàn bộ trang web theo chiều rộng từ các trang chuyên mục")
+    parser.add_argument("--depth", type=int, default=3, help="Độ sâu tối đa khi khám phá (mặc định: 3)")
+    parser.add_argument("--workers", type=int, default=8, help="Số luồng tải đồng thời (mặc định: 8)")
+    parser.add_argument("--rate", type=float, default=0.5,
+                        help="Tốc độ ban đầu (request/giây) tới một máy chủ, sau đó tự điều chỉnh (mặc định: 0.5)")
+    parser.add_argument("--max-rate", type=float, default=8.0,
+                        help="Số request tối đa mỗi giây tới một máy chủ (mặc định: 8)")
+    parser.add_argument("--output", default="data/hus_page_urls/discovered.txt",
+                        help="File lưu các URL khám phá được")
+    parser.add_argument("--start-urls", nargs="+", default=SECTION_URLS,
+                        help="Các trang xuất phát (mặc định: các trang chuyên mục)")
+    parser.add_argument("--news", action="store_true",
+                        help="Cập nhật danh sách tin tức (dừng khi gặp các tin đã có)")
+    parser.add_argument("--stop-after", type=int, default=5,
+                        help="Số link đã có liên tiếp để dừng cập nhật tin tức (mặc định: 5)")
+    parser.add_argument("--max-pages", type=int, default=200,
+                        help="Số trang danh sách tin tức tối đa (mặc định: 200)")
+    args = parser.parse_args()
+
+    # Mọi request (kể cả các lần thử lại) đi qua bộ giới hạn tốc độ theo máy chủ: tăng dần khi
+    # máy chủ trả lời tốt, giảm một nửa khi gặp 429/503, chờ theo Retry-After
+    http_client.configure_rate_limiter(initial_rate=args.rate, max_rate=args.max_rate)
+
+    if args.discover:
+        session = http_client.configure_session(pool_size=args.workers)
+        discover_site(args.start_urls, session, args.output, Frontier(FRONTIER_DB), max_depth=args.depth,
+                      workers=args.workers)
+        print(f"Tốc độ request: {session.rate_limiter.summary()}")
+        return
+
     # Danh sách các URL cần truy cập
     urls_and_outputs = [
         # ("https://hus.vnu.edu.vn/gioi-thieu.html", "data/hus_page_urls/gioi_thieu.txt"),
@@ -165,20 +381,17 @@ def main():
 
     # Khởi tạo session một lần và tái sử dụng
     session = setup_session()
+    frontier = Frontier(FRONTIER_DB)
     # Crawl phần tin tức sự kiên
-    # for url in urls:
-    #     success = get_news_links(url, news_output, session)
-    #     if not success:
-    #         print(f"Đang tạm dừng 30 giây sau khi gặp lỗi...")
-    #         time.sleep(30)  # Tạm dừng lâu hơn nếu gặp lỗi
-    #
-
-    # Xử lý từng URL
+    if args.news:
+        for url in urls:
+            get_news_links(url, news_output, session, frontier, stop_after_seen=args.stop_after,
+                           max_pages=args.max_pages)
+        return
+
+    # Xử lý từng URL (khi gặp lỗi, bộ giới hạn tự giảm tốc độ thay vì tạm dừng 30 giây)
     for url, output_file in urls_and_outputs:
-        success = get_links(url, output_file, session)
-        if not success:
-            print(f"Đang tạm dừng 30 giây sau khi gặp lỗi...")
-            time.sleep(30)  # Tạm dừng lâu hơn nếu gặp lỗi
+        get_links(url, output_file, session, frontier)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,171 @@
+"""
+Single-pass removal of unwanted elements from a parsed page.
+
+``clean_html`` used to run ``soup.select`` once per selector, walking the
+whole tree for each of them. ``DomCleaner`` compiles the selector list into
+sets of tag names, classes and ids (plus a short list of compound rules such
+as ``div.menu``) and finds every match in one top-down traversal that never
+descends into an element it is going to remove.
+
+Only simple selectors (``tag``, ``.class``, ``#id`` and combinations like
+``tag.class#id``) are compiled; anything else (descendant combinators,
+attribute selectors, ...) is applied with ``soup.select`` after the pass.
+"""
+import re
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from bs4 import BeautifulSoup, Tag
+
+_SIMPLE_SELECTOR = re.compile(r"^(?P<tag>[a-zA-Z][\w-]*)?(?P<rest>(?:[.#][\w-]+)*)$")
+_SELECTOR_PART = re.compile(r"([.#])([\w-]+)")
+
+# (tag, id, classes) of a compound selector; None / empty means "any"
+Rule = Tuple[Optional[str], Optional[str], FrozenSet[str]]
+
+
+def _parse_simple_selector(selector: str) -> Optional[Rule]:
+    match = _SIMPLE_SELECTOR.match(selector.strip())
+    if not match or not selector.strip():
+        return None
+    tag = match.group("tag").lower() if match.group("tag") else None
+    element_id = None
+    classes = set()
+    for kind, value in _SELECTOR_PART.findall(match.group("rest")):
+        if kind == "#":
+            if element_id is not None and element_id != value:
+                return None
+            element_id = value
+        else:
+            classes.add(value)
+    return tag, element_id, frozenset(classes)
+
+
+class DomCleaner:
+    """Removes every element matching a list of CSS selectors in one traversal."""
+
+    def __init__(self, selectors: Iterable[str]):
+        self.selectors = list(selectors)
+        self.tags = set()
+        self.ids = set()
+        self.classes = set()
+        self.compound: List[Rule] = []
+        self.fallback: List[str] = []
+
+        rules = []
+        for selector in self.selectors:
+            rule = _parse_simple_selector(selector)
+            if rule is None:
+                self.fallback.append(selector)
+            else:
+                rules.append(rule)
+
+        for tag, element_id, classes in rules:
+            if tag and element_id is None and not classes:
+                self.tags.add(tag)
+            elif element_id and tag is None and not classes:
+                self.ids.add(element_id)
+            elif len(classes) == 1 and tag is None and element_id is None:
+                self.classes.update(classes)
+            else:
+                self.compound.append((tag, element_id, classes))
+
+        # Drop compound rules already implied by a simple one (e.g. footer.footer-area by footer)
+        self.compound = [
+            (tag, element_id, classes) for tag, element_id, classes in self.compound
+            if tag not in self.tags and element_id not in self.ids and not (classes & self.classes)
+        ]
+
+    def matches(self, element: Tag) -> bool:
+        """
+        Checks whether an element matches one of the removal rules.
+
+        Args:
+            element: Element to check
+
+        Returns:
+            True if the element should be removed
+        """
+        if element.name in self.tags:
+            return True
+        attrs = element.attrs
+        element_id = attrs.get("id")
+        if element_id is not None and element_id in self.ids:
+            return True
+        classes = attrs.get("class")
+        if classes:
+            if isinstance(classes, str):
+                classes = classes.split()
+            for cls in classes:
+                if cls in self.classes:
+                    return True
+        for tag, rule_id, rule_classes in self.compound:
+            if tag is not None and element.name != tag:
+                continue
+            if rule_id is not None and element_id != rule_id:
+                continue
+            if rule_classes and not (classes and rule_classes.issubset(classes)):
+                continue
+            return True
+        return False
+
+    def find_matches(self, root: Tag) -> List[Tag]:
+        """
+        Finds the outermost matching elements under root in one traversal.
+
+        Args:
+            root: Element (or soup) to search
+
+        Returns:
+            Matching elements; descendants of a match are not visited
+        """
+        matches = []
+        stack = [iter(root.contents)]
+        while stack:
+            for node in stack[-1]:
+                if not isinstance(node, Tag):
+                    continue
+                if self.matches(node):
+                    matches.append(node)
+                elif node.contents:
+                    stack.append(iter(node.contents))
+                    break
+            else:
+                stack.pop()
+        return matches
+
+    def clean(self, soup: BeautifulSoup) -> BeautifulSoup:
+        """
+        Removes all matching elements from the soup in place.
+
+        Args:
+            soup: BeautifulSoup object
+
+        Returns:
+            The same, cleaned, BeautifulSoup object
+        """
+        for element in self.find_matches(soup):
+            element.decompose()
+        for selector in self.fallback:
+            for element in soup.select(selector):
+                element.decompose()
+        return soup
+
+
+_compiled: Dict[Tuple[str, ...], DomCleaner] = {}
+
+
+def get_cleaner(selectors: Iterable[str]) -> DomCleaner:
+    """
+    Returns a compiled cleaner for a selector list, compiling it only once.
+
+    Args:
+        selectors: CSS selectors of the elements to remove
+
+    Returns:
+        Cached DomCleaner
+    """
+    key = tuple(selectors)
+    cleaner = _compiled.get(key)
+    if cleaner is None:
+        cleaner = _compiled[key] = DomCleaner(key)
+    return cleaner
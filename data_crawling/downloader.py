@@ -0,0 +1,269 @@
+"""
+Streaming file downloads for the crawlers.
+
+Response bodies are written to disk chunk by chunk instead of being loaded
+with ``response.content``, so peak memory per download is one chunk no matter
+how large the image or PDF is. Each file is written to a temporary name next
+to its destination and renamed into place only when complete, its SHA-256 is
+computed while streaming, and its real type is sniffed from the first bytes.
+
+``save_resumable`` writes to a stable ``.part`` file instead, which is kept
+when the connection drops so the next attempt can continue it with a
+``Range`` request.
+"""
+import hashlib
+import os
+import re
+import uuid
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import requests
+
+CHUNK_SIZE = 64 * 1024
+
+# (magic prefix, MIME type), checked in order
+_SIGNATURES = [
+    (b"%PDF", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"PK\x03\x04", "application/zip"),
+]
+
+
+class DownloadError(IOError):
+    """Raised when a streamed download is rejected."""
+
+
+class DownloadTooLargeError(DownloadError):
+    """Raised when a download exceeds the configured maximum size."""
+
+
+class IncompleteDownloadError(DownloadError):
+    """Raised when a body ends before its announced length; the .part file is kept for resuming."""
+
+
+_CONTENT_RANGE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)")
+
+
+def parse_content_range(value: Optional[str]) -> Optional[Tuple[int, Optional[int]]]:
+    """
+    Parses a Content-Range header.
+
+    Args:
+        value: Header value, e.g. "bytes 1000-4999/5000"
+
+    Returns:
+        (first byte, total size or None if unknown), or None if the header is missing or invalid
+    """
+    match = _CONTENT_RANGE.match(value or "")
+    if not match:
+        return None
+    total = match.group(3)
+    return int(match.group(1)), int(total) if total != "*" else None
+
+
+def file_sha256(path: str, chunk_size: int = CHUNK_SIZE) -> str:
+    """Computes the SHA-256 of a file on disk."""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def sniff_content_type(head: bytes) -> str:
+    """
+    Guesses the MIME type of a file from its first bytes.
+
+    Args:
+        head: First bytes of the file (a few hundred are enough)
+
+    Returns:
+        MIME type, or application/octet-stream if unknown
+    """
+    for signature, mime_type in _SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+
+    text = head.lstrip().lower()
+    if text.startswith((b"<!doctype html", b"<html")):
+        return "text/html"
+    if text.startswith(b"<svg") or (text.startswith(b"<?xml") and b"<svg" in text):
+        return "image/svg+xml"
+    return "application/octet-stream"
+
+
+def read_head(response: requests.Response, size: int = 1000) -> bytes:
+    """
+    Reads only the first bytes of a streamed response body and closes it.
+
+    Args:
+        response: Response opened with stream=True
+        size: Number of bytes to read
+
+    Returns:
+        Up to ``size`` bytes of the body
+    """
+    try:
+        head = b""
+        for chunk in response.iter_content(chunk_size=size):
+            head += chunk
+            if len(head) >= size:
+                break
+        return head[:size]
+    finally:
+        response.close()
+
+
+def save_stream(response: requests.Response, output_path: str, max_bytes: Optional[int] = None,
+                reject_types: Iterable[str] = ("text/html",), chunk_size: int = CHUNK_SIZE,
+                throttle: Optional[Callable[[int], None]] = None) -> Dict:
+    """
+    Streams a response body to a file atomically.
+
+    Args:
+        response: Response opened with stream=True
+        output_path: Final path of the file
+        max_bytes: Abort when the body is larger than this many bytes (None for no limit)
+        reject_types: Sniffed MIME types that are not accepted (e.g. an HTML error page)
+        chunk_size: Bytes read per chunk
+        throttle: Called with the size of every chunk read (e.g. ByteRateLimiter.consume)
+
+    Returns:
+        Dict with path, size, sha256 and sniffed_type
+
+    Raises:
+        DownloadTooLargeError: If the body exceeds max_bytes
+        DownloadError: If the sniffed type is rejected
+    """
+    declared = response.headers.get("content-length")
+    if max_bytes is not None and declared and declared.isdigit() and int(declared) > max_bytes:
+        response.close()
+        raise DownloadTooLargeError(f"{response.url}: Content-Length {declared} exceeds {max_bytes} bytes")
+
+    # Unique temp name in the destination directory so the final rename is atomic
+    tmp_path = f"{output_path}.{uuid.uuid4().hex}.tmp"
+    sha256 = hashlib.sha256()
+    size = 0
+    sniffed_type = None
+
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if not chunk:
+                    continue
+                if sniffed_type is None:
+                    sniffed_type = sniff_content_type(chunk[:512])
+                    if sniffed_type in reject_types:
+                        raise DownloadError(f"{response.url}: unexpected content type {sniffed_type}")
+                size += len(chunk)
+                if throttle is not None:
+                    throttle(len(chunk))
+                if max_bytes is not None and size > max_bytes:
+                    raise DownloadTooLargeError(f"{response.url}: body exceeds {max_bytes} bytes")
+                sha256.update(chunk)
+                f.write(chunk)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        response.close()
+
+    return {
+        "path": output_path,
+        "size": size,
+        "sha256": sha256.hexdigest(),
+        "sniffed_type": sniffed_type or "application/octet-stream",
+    }
+
+
+def save_resumable(response: requests.Response, part_path: str, max_bytes: Optional[int] = None,
+                   magic: Optional[bytes] = None, chunk_size: int = CHUNK_SIZE,
+                   throttle: Optional[Callable[[int], None]] = None) -> Dict:
+    """
+    Streams a response body into a resumable ``.part`` file.
+
+    A 206 response is appended to the existing part (its Content-Range must
+    start where the part ends); any other response rewrites the part from
+    the beginning. The finished part is checked against the announced
+    length and the expected magic bytes; the caller moves it into place.
+
+    Args:
+        response: Response opened with stream=True, possibly to a Range request
+        part_path: Stable path of the partial file
+        max_bytes: Abort when the whole file is larger than this many bytes
+        magic: Bytes the complete file must start with (e.g. b"%PDF")
+        chunk_size: Bytes read per chunk
+        throttle: Called with the size of every chunk read
+
+    Returns:
+        Dict with path (the part file), size, sha256, sniffed_type and resumed_from
+
+    Raises:
+        IncompleteDownloadError: If the body ended early (the part is kept)
+        DownloadTooLargeError: If the file exceeds max_bytes (the part is removed)
+        DownloadError: If the range does not match or the magic bytes are wrong (the part is removed)
+    """
+    offset = 0
+    expected = None
+    sha256 = hashlib.sha256()
+
+    try:
+        if response.status_code == 206:
+            content_range = parse_content_range(response.headers.get("content-range"))
+            current = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            if content_range is None or content_range[0] != current:
+                raise DownloadError(f"{response.url}: Content-Range {response.headers.get('content-range')} "
+                                    f"does not continue the {current} bytes downloaded")
+            offset, expected = content_range
+            # The hash covers the whole file, so feed it the bytes already on disk
+            with open(part_path, "rb") as f:
+                for chunk in iter(lambda: f.read(chunk_size), b""):
+                    sha256.update(chunk)
+        declared = response.headers.get("content-length")
+        if expected is None and declared and declared.isdigit():
+            expected = offset + int(declared)
+        if max_bytes is not None and expected is not None and expected > max_bytes:
+            raise DownloadTooLargeError(f"{response.url}: {expected} bytes exceeds {max_bytes} bytes")
+
+        size = offset
+        with open(part_path, "ab" if offset else "wb") as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if throttle is not None:
+                    throttle(len(chunk))
+                if max_bytes is not None and size > max_bytes:
+                    raise DownloadTooLargeError(f"{response.url}: body exceeds {max_bytes} bytes")
+                sha256.update(chunk)
+                f.write(chunk)
+    except DownloadError:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    finally:
+        response.close()
+
+    if expected is not None and size < expected:
+        raise IncompleteDownloadError(f"{response.url}: got {size} of {expected} bytes")
+
+    with open(part_path, "rb") as f:
+        head = f.read(512)
+    if magic is not None and not head.startswith(magic):
+        os.remove(part_path)
+        raise DownloadError(f"{response.url}: file does not start with {magic!r}")
+
+    return {
+        "path": part_path,
+        "size": size,
+        "sha256": sha256.hexdigest(),
+        "sniffed_type": sniff_content_type(head),
+        "resumed_from": offset,
+    }
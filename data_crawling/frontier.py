@@ -0,0 +1,305 @@
+"""
+Persistent crawl frontier backed by SQLite.
+
+``crawl_links`` adds the URLs it discovers here and the crawlers lease work
+from it instead of being fed ``.txt`` link files by hand. URLs are
+canonicalized before they are stored, so a page listed in several menus is
+queued (and fetched) once per queue. Every URL carries a state
+(pending / in_flight / done / failed), an attempt count and the time it next
+becomes eligible, so a crawl that was killed resumes where it stopped:
+leases held by a dead process, or older than the lease timeout, go back to
+pending.
+"""
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+logger = logging.getLogger("frontier")
+
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    queue TEXT NOT NULL,
+    url TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_eligible REAL NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    last_error TEXT,
+    source TEXT,
+    added REAL NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (queue, url)
+);
+CREATE INDEX IF NOT EXISTS urls_ready ON urls (queue, state, next_eligible);
+"""
+
+
+def _remove_dot_segments(path: str) -> str:
+    segments = []
+    for segment in path.split("/"):
+        if segment == "..":
+            if len(segments) > 1:
+                segments.pop()
+        elif segment != ".":
+            segments.append(segment)
+    normalized = "/".join(segments)
+    if path.endswith(("/.", "/..")):
+        normalized += "/"
+    return normalized
+
+
+def canonicalize_url(url: str, base_url: Optional[str] = None) -> Optional[str]:
+    """
+    Normalizes a URL so that equivalent spellings map to one frontier entry.
+
+    Lowercases scheme and host, drops default ports, fragments and tracking
+    parameters, resolves ``.``/``..`` segments, collapses repeated slashes and
+    sorts the query string.
+
+    Args:
+        url: URL to normalize (may be relative if base_url is given)
+        base_url: Base URL for resolving relative links
+
+    Returns:
+        Canonical URL, or None if it is not an http(s) URL
+    """
+    url = url.strip()
+    if base_url:
+        url = urljoin(base_url, url)
+
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+
+    host = parts.hostname.lower()
+    if parts.port and parts.port != DEFAULT_PORTS[scheme]:
+        host = f"{host}:{parts.port}"
+
+    path = _remove_dot_segments(parts.path or "/")
+    while "//" in path:
+        path = path.replace("//", "/")
+
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith(TRACKING_PARAMS)
+    )
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Frontier:
+    """SQLite work queue of URLs shared by the link collector and the crawlers."""
+
+    def __init__(self, path: str, lease_seconds: float = 600, max_attempts: int = 3,
+                 retry_backoff: float = 60):
+        """
+        Args:
+            path: SQLite database file
+            lease_seconds: How long a leased URL stays in flight before it is handed out again
+            max_attempts: Failures after which a URL is marked failed for good
+            retry_backoff: Base delay before a failed URL is retried (doubles per attempt)
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def add(self, urls: Iterable[str], queue: str, source: Optional[str] = None) -> int:
+        """
+        Queues URLs that are not in the queue yet.
+
+        Args:
+            urls: URLs to add (canonicalized first; non-http(s) URLs are ignored)
+            queue: Queue name, e.g. "pages" or "pdf_pages"
+            source: Where the URLs were found
+
+        Returns:
+            Number of newly queued URLs
+        """
+        now = time.time()
+        canonical = {canonicalize_url(url) for url in urls}
+        canonical.discard(None)
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO urls (queue, url, source, added, updated) VALUES (?, ?, ?, ?, ?)",
+                [(queue, url, source, now, now) for url in sorted(canonical)]
+            )
+            return conn.total_changes - before
+
+    def release_stale_leases(self, queue: str) -> int:
+        """
+        Returns to pending the in-flight URLs whose crawler is gone.
+
+        A lease is stale when it expired or its owner is a process on this host
+        that no longer runs (e.g. a crawl killed with Ctrl+C or by the OOM killer).
+
+        Args:
+            queue: Queue name
+
+        Returns:
+            Number of released URLs
+        """
+        now = time.time()
+        hostname = socket.gethostname()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT url, lease_owner, lease_expires FROM urls WHERE queue = ? AND state = ?",
+                (queue, IN_FLIGHT)
+            ).fetchall()
+            stale = []
+            for url, owner, expires in rows:
+                host, _, pid = (owner or "").rpartition(":")
+                dead = host == hostname and pid.isdigit() and not _process_alive(int(pid))
+                if dead or (expires or 0) < now:
+                    stale.append((now, queue, url))
+            conn.executemany(
+                "UPDATE urls SET state = 'pending', lease_owner = NULL, lease_expires = NULL, updated = ? "
+                "WHERE queue = ? AND url = ?",
+                stale
+            )
+        if stale:
+            logger.info(f"Released {len(stale)} stale in-flight URLs in queue '{queue}'")
+        return len(stale)
+
+    def lease(self, queue: str, limit: int) -> List[str]:
+        """
+        Atomically takes up to ``limit`` eligible pending URLs and marks them in flight.
+
+        Args:
+            queue: Queue name
+            limit: Maximum number of URLs to lease
+
+        Returns:
+            Leased URLs, oldest first
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            urls = [row[0] for row in conn.execute(
+                "SELECT url FROM urls WHERE queue = ? AND state = ? AND next_eligible <= ? "
+                "ORDER BY next_eligible, added LIMIT ?",
+                (queue, PENDING, now, limit)
+            )]
+            conn.executemany(
+                "UPDATE urls SET state = ?, lease_owner = ?, lease_expires = ?, updated = ? "
+                "WHERE queue = ? AND url = ?",
+                [(IN_FLIGHT, self.owner, now + self.lease_seconds, now, queue, url) for url in urls]
+            )
+        return urls
+
+    def complete(self, queue: str, url: str) -> None:
+        """Marks a leased URL as done."""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE urls SET state = ?, lease_owner = NULL, lease_expires = NULL, last_error = NULL, "
+                "updated = ? WHERE queue = ? AND url = ?",
+                (DONE, time.time(), queue, url)
+            )
+
+    def fail(self, queue: str, url: str, error: str = "") -> None:
+        """
+        Records a failed attempt; the URL is retried later with exponential backoff
+        until max_attempts is reached, then marked failed.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT attempts FROM urls WHERE queue = ? AND url = ?", (queue, url)).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            state = FAILED if attempts >= self.max_attempts else PENDING
+            next_eligible = now + self.retry_backoff * 2 ** (attempts - 1)
+            conn.execute(
+                "UPDATE urls SET state = ?, attempts = ?, next_eligible = ?, lease_owner = NULL, "
+                "lease_expires = NULL, last_error = ?, updated = ? WHERE queue = ? AND url = ?",
+                (state, attempts, next_eligible, error[:500], now, queue, url)
+            )
+
+    def requeue(self, queue: str, states: Iterable[str] = (DONE, FAILED)) -> int:
+        """Puts finished URLs back to pending (e.g. for a full refresh). Returns how many."""
+        states = list(states)
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                f"UPDATE urls SET state = 'pending', attempts = 0, next_eligible = 0, updated = ? "
+                f"WHERE queue = ? AND state IN ({', '.join('?' for _ in states)})",
+                (time.time(), queue, *states)
+            )
+            return cursor.rowcount
+
+    def counts(self, queue: str) -> Dict[str, int]:
+        """Returns the number of URLs per state in a queue."""
+        rows = self._connection().execute(
+            "SELECT state, COUNT(*) FROM urls WHERE queue = ? GROUP BY state", (queue,)
+        ).fetchall()
+        return {state: count for state, count in rows}
+
+    def lease_batches(self, queue: str, batch_size: int) -> Iterator[List[str]]:
+        """
+        Leases batches of URLs until no eligible URL is left.
+
+        Stale leases of a previous, killed run are released first. URLs waiting
+        for a retry backoff are left for a later run.
+
+        Args:
+            queue: Queue name
+            batch_size: URLs per batch
+
+        Yields:
+            Lists of leased URLs
+        """
+        self.release_stale_leases(queue)
+        while True:
+            urls = self.lease(queue, batch_size)
+            if not urls:
+                return
+            yield urls
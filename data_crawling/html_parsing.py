@@ -0,0 +1,128 @@
+"""
+Pluggable HTML parser backends for the crawlers.
+
+All scripts build their BeautifulSoup trees through ``parse_html`` so the
+parser can be chosen in one place:
+
+- ``html.parser``: the pure-Python parser from the standard library (slowest)
+- ``lxml``: the C parser from lxml, several times faster on large DNN pages
+- ``strained``: lxml (or html.parser if lxml is missing) restricted by a
+  SoupStrainer to the elements the caller asks for, e.g. only the menu
+  ``<div>`` when collecting links, so the rest of the page is never built.
+  Without an explicit restriction only the title, the DNN module content
+  (``dnn_ctrNNNN_ModuleContent``) and the accordion menu of HUS pages are kept
+
+The default is ``lxml`` when it is installed, otherwise ``html.parser``; it
+can be overridden with ``set_default_backend`` (the scripts' ``--parser``
+option) or the ``HUS_HTML_PARSER`` environment variable.
+"""
+import html
+import os
+import re
+from typing import Dict, List, Optional, Union
+
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+
+try:
+    import lxml  # noqa: F401
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+BACKENDS = ["html.parser", "lxml", "strained"]
+
+# Page areas the strained backend keeps by default: DNN module content and the accordion menu
+CONTENT_AREA_IDS = re.compile(r"^(dnn_ctr\d+_ModuleContent|jquery-accordion-menu(-header)?)$")
+_TITLE = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+
+_default_override: Optional[str] = None
+
+
+def available_backends() -> List[str]:
+    """Returns the backends usable in this environment."""
+    return [backend for backend in BACKENDS if backend != "lxml" or HAS_LXML]
+
+
+def default_backend() -> str:
+    """Returns the backend used when none is given explicitly."""
+    backend = _default_override or os.environ.get("HUS_HTML_PARSER")
+    if backend:
+        return backend
+    return "lxml" if HAS_LXML else "html.parser"
+
+
+def set_default_backend(backend: Optional[str]) -> None:
+    """Overrides the default backend for this process (None restores the automatic choice)."""
+    global _default_override
+    if backend is not None and backend not in BACKENDS:
+        raise ValueError(f"Unknown HTML parser backend: {backend} (choose from {', '.join(BACKENDS)})")
+    _default_override = backend
+
+
+def parse_html(markup: Union[str, bytes], backend: Optional[str] = None,
+               only: Optional[Union[str, List[str]]] = None, only_attrs: Optional[Dict] = None) -> BeautifulSoup:
+    """
+    Parses HTML with the selected backend.
+
+    Args:
+        markup: HTML text or bytes
+        backend: One of BACKENDS (default_backend() if None)
+        only: Tag name(s) to keep with the ``strained`` backend
+        only_attrs: Attribute filters for those tags, e.g. {"id": "jquery-accordion-menu"}
+
+    Returns:
+        BeautifulSoup object
+
+    Raises:
+        ValueError: If the backend is unknown or not installed
+    """
+    backend = backend or default_backend()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown HTML parser backend: {backend} (choose from {', '.join(BACKENDS)})")
+    if backend == "lxml" and not HAS_LXML:
+        raise ValueError("HTML parser backend 'lxml' requires the lxml package")
+
+    if backend == "strained":
+        return parse_strained(markup, "lxml" if HAS_LXML else "html.parser", only, only_attrs)
+
+    return BeautifulSoup(markup, backend)
+
+
+def parse_strained(markup: Union[str, bytes], features: str, only: Optional[Union[str, List[str]]] = None,
+                   only_attrs: Optional[Dict] = None) -> BeautifulSoup:
+    """
+    Parses only the requested elements of a page with a SoupStrainer.
+
+    Without ``only``/``only_attrs`` the ``<div>`` elements whose id matches
+    CONTENT_AREA_IDS are kept, plus the page ``<title>``: a strainer cannot
+    select the id-less title together with id-filtered divs, so the title is
+    taken from the markup and added to the tree.
+
+    Args:
+        markup: HTML text or bytes
+        features: BeautifulSoup tree builder ("lxml" or "html.parser")
+        only: Tag name(s) to keep
+        only_attrs: Attribute filters for those tags
+
+    Returns:
+        BeautifulSoup object holding the kept elements (there is no <html>/<body>)
+    """
+    if only or only_attrs:
+        return BeautifulSoup(markup, features, parse_only=SoupStrainer(only, attrs=only_attrs or {}))
+
+    soup = BeautifulSoup(markup, features, parse_only=SoupStrainer("div", attrs={"id": CONTENT_AREA_IDS}))
+    text = markup if isinstance(markup, str) else markup.decode("utf-8", errors="replace")
+    match = _TITLE.search(text)
+    if match:
+        title = soup.new_tag("title")
+        title.string = html.unescape(match.group(1)).strip()
+        soup.insert(0, title)
+    return soup
+
+
+def content_root(soup: BeautifulSoup) -> Optional[Tag]:
+    """Returns the element to extract content from: <body>, or the whole tree of a strained parse."""
+    if soup.body is not None:
+        return soup.body
+    # A strained parse keeps the content areas without <html>/<body>
+    return soup if soup.find("div") is not None else None
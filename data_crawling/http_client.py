@@ -0,0 +1,239 @@
+"""
+Shared pooled HTTP client for the HUS crawlers.
+
+All crawler scripts issue their requests through one ``requests.Session`` so
+that TLS connections to hus.vnu.edu.vn are kept alive and reused between
+requests and worker threads. The session carries the retry/backoff policy
+that used to live in ``crawl_links.setup_session`` and advertises every
+content encoding urllib3 can decode.
+
+Every request attempt (retries included) is paced by the process-wide
+``AdaptiveRateLimiter``, which replaces the fixed sleeps the scripts used to
+do between requests.
+"""
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+from rate_limiter import AdaptiveRateLimiter
+
+# The HUS site is crawled with verify=False
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+logger = logging.getLogger("http_client")
+
+DEFAULT_POOL_SIZE = 10
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/90.0.4430.212 Safari/537.36",
+    "Accept-Language": "vi-VN,vi;q=0.9,en-US;q=0.8,en;q=0.7",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+    # gzip/deflate, plus br/zstd when the decoders are installed
+    "Accept-Encoding": ACCEPT_ENCODING,
+}
+
+
+class ConnectionStats:
+    """Thread-safe counters of requests sent and connections opened."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+
+    def record_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def record_connection(self) -> None:
+        with self._lock:
+            self.connections_opened += 1
+
+    @property
+    def connections_reused(self) -> int:
+        """Requests that went over an already open connection."""
+        return max(self.requests - self.connections_opened, 0)
+
+    def summary(self) -> str:
+        return (f"{self.requests} requests, {self.connections_opened} connections opened, "
+                f"{self.connections_reused} reused")
+
+
+def _counting_pool(pool_class, stats: ConnectionStats, rate_limiter: AdaptiveRateLimiter):
+    """
+    Subclasses a urllib3 connection pool so that every socket connect is counted
+    and every request attempt goes through the rate limiter.
+    """
+
+    class CountingConnection(pool_class.ConnectionCls):
+        # urllib3 reconnects an existing connection object when the server
+        # closed it, so count connect() calls rather than new connection objects
+        def connect(self):
+            stats.record_connection()
+            return super().connect()
+
+    class CountingConnectionPool(pool_class):
+        ConnectionCls = CountingConnection
+
+        # Called once per attempt, so retries are paced and observed too
+        def _make_request(self, *args, **kwargs):
+            rate_limiter.acquire(self.host)
+            start = time.monotonic()
+            try:
+                response = super()._make_request(*args, **kwargs)
+            except Exception:
+                rate_limiter.record(self.host, None, time.monotonic() - start)
+                raise
+            rate_limiter.record(self.host, response.status, time.monotonic() - start,
+                                response.headers.get("Retry-After"))
+            return response
+
+    return CountingConnectionPool
+
+
+class CountingHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that records every request and every connection opened in
+    ConnectionStats and paces requests with an AdaptiveRateLimiter.
+    """
+
+    def __init__(self, stats: ConnectionStats, rate_limiter: AdaptiveRateLimiter, **kwargs):
+        self.stats = stats
+        self.rate_limiter = rate_limiter
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: _counting_pool(pool_class, self.stats, self.rate_limiter)
+            for scheme, pool_class in self.poolmanager.pool_classes_by_scheme.items()
+        }
+
+    def send(self, request, **kwargs):
+        self.stats.record_request()
+        return super().send(request, **kwargs)
+
+
+def create_session(pool_size: int = DEFAULT_POOL_SIZE, headers: Optional[Dict] = None,
+                   stats: Optional[ConnectionStats] = None,
+                   rate_limiter: Optional[AdaptiveRateLimiter] = None) -> requests.Session:
+    """
+    Creates a session with keep-alive pooling, retries and compression.
+
+    Args:
+        pool_size: Maximum number of pooled connections per host; should match the worker count
+        headers: Extra default headers merged over DEFAULT_HEADERS
+        stats: Counters to record into (a new ConnectionStats by default)
+        rate_limiter: Per-host rate limiter (the process-wide one by default)
+
+    Returns:
+        Configured requests.Session; its counters are available as ``session.stats``
+        and its limiter as ``session.rate_limiter``
+    """
+    session = requests.Session()
+
+    # Retry with exponential backoff (1s, 2s, 4s, ...) and honour Retry-After
+    retry_strategy = Retry(
+        total=3,
+        status_forcelist=[429, 500, 502, 503, 504],
+        backoff_factor=1,
+        respect_retry_after_header=True
+    )
+
+    stats = stats or ConnectionStats()
+    rate_limiter = rate_limiter or get_rate_limiter()
+    adapter = CountingHTTPAdapter(
+        stats,
+        rate_limiter,
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=retry_strategy
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    session.headers.update(DEFAULT_HEADERS)
+    if headers:
+        session.headers.update(headers)
+    session.stats = stats
+    session.rate_limiter = rate_limiter
+
+    return session
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_rate_limiter: Optional[AdaptiveRateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def configure_rate_limiter(**kwargs) -> AdaptiveRateLimiter:
+    """
+    Replaces the process-wide rate limiter used by sessions created afterwards.
+
+    Args:
+        **kwargs: AdaptiveRateLimiter arguments (initial_rate, max_rate, ...)
+
+    Returns:
+        The new rate limiter
+    """
+    global _rate_limiter
+    with _rate_limiter_lock:
+        _rate_limiter = AdaptiveRateLimiter(**kwargs)
+        return _rate_limiter
+
+
+def get_rate_limiter() -> AdaptiveRateLimiter:
+    """Returns the process-wide rate limiter, creating it with defaults if needed."""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = AdaptiveRateLimiter()
+        return _rate_limiter
+
+
+def configure_session(pool_size: int = DEFAULT_POOL_SIZE, headers: Optional[Dict] = None) -> requests.Session:
+    """
+    (Re)creates the shared session with a pool sized for the given worker count.
+
+    Args:
+        pool_size: Number of worker threads that will share the session
+        headers: Extra default headers
+
+    Returns:
+        The shared session
+    """
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = create_session(pool_size, headers)
+        return _session
+
+
+def get_session() -> requests.Session:
+    """
+    Returns the process-wide shared session, creating it with defaults if needed.
+
+    Returns:
+        The shared session
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+        return _session
+
+
+def log_connection_stats(target_logger: logging.Logger = logger) -> None:
+    """Logs how many connections were reused by the shared session and the final request rates."""
+    if _session is not None:
+        target_logger.info(f"HTTP connections: {_session.stats.summary()}")
+        target_logger.info(f"Request rates: {_session.rate_limiter.summary()}")
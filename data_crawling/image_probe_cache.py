@@ -0,0 +1,93 @@
+"""
+Persistent, size-bounded cache of image probe results.
+
+The same header, footer and sidebar images appear on almost every HUS page.
+Probing each of them with a HEAD request on every page (and every run) is
+wasted work, so probe results are kept here keyed by image URL: the reported
+Content-Length, the ETag and the keep/drop decision. The cache is an LRU
+bounded to ``max_entries`` and is saved to a JSON file between runs.
+"""
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger("image_probe_cache")
+
+
+class ImageProbeCache:
+    """Thread-safe LRU of image URL → probe result, persisted as JSON."""
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if path:
+            self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                # Entries are stored least recently used first
+                for url, result in json.load(f):
+                    self._entries[url] = result
+            self._evict()
+            logger.info(f"Loaded {len(self._entries)} image probe results from {self.path}")
+        except (IOError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable image probe cache {self.path}: {e}")
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, img_url: str) -> Optional[Dict]:
+        """
+        Looks up the probe result of an image.
+
+        Args:
+            img_url: Image URL
+
+        Returns:
+            Dict with content_length, etag and keep, or None if the image was never probed
+        """
+        with self._lock:
+            result = self._entries.get(img_url)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(img_url)
+            self.hits += 1
+            return result
+
+    def put(self, img_url: str, result: Dict) -> None:
+        """Stores the probe result of an image, evicting the least recently used entries."""
+        with self._lock:
+            self._entries[img_url] = result
+            self._entries.move_to_end(img_url)
+            self._evict()
+
+    def save(self) -> None:
+        """Writes the cache atomically (temp file + rename)."""
+        if not self.path:
+            return
+        with self._lock:
+            snapshot = list(self._entries.items())
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            logger.info(f"Saved {len(snapshot)} image probe results to {self.path} "
+                        f"({self.hits} hits, {self.misses} misses this run)")
+        except IOError as e:
+            logger.error(f"Failed to save image probe cache {self.path}: {e}")
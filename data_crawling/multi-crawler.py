@@ -1,17 +1,33 @@
 import argparse
+import asyncio
 import json
 import logging
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urlparse
 
 import requests
 from bs4 import BeautifulSoup, Tag
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
 
+import http_client
+from dom_cleaner import get_cleaner
+from content_extractor import ContentBlock, format_block, iter_content_blocks
+from corpus_shards import ShardWriter, page_record
+from frontier import Frontier
+from html_parsing import BACKENDS, content_root, parse_html
+from blob_store import BlobStore
+from boilerplate import BoilerplateFilter, block_key
+from image_probe_cache import ImageProbeCache
+from near_duplicates import NearDuplicateIndex
+from validator_store import ValidatorStore, content_hash
+
 # Suppress only the specific InsecureRequestWarning
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
@@ -34,11 +50,93 @@ DEFAULT_CONFIG = {
     "image_min_size_kb": 10,
     "excluded_image_patterns": [".gif", "logo", "icon", "banner", "button"],
     "request_timeout": 30,
-    "rate_limit_delay": 2.0,  # seconds between requests
+    "rate_limit_delay": 2.0,  # initial seconds between requests to a host; the rate then adapts
+    "max_rate": 10.0,  # requests per second per host the adaptive limiter never exceeds
     "output_dir": "crawled_data",
+    "max_concurrency": 8,  # in-flight requests overall (async engine)
+    "max_per_host": 4,  # in-flight requests per host (async engine)
+    "validators_file": None,  # defaults to <output_dir>/validators.json
+    "image_cache_file": None,  # defaults to <output_dir>/image_probe_cache.json
+    "image_cache_size": 10000,  # max image probe results kept across runs
+    "image_probe_workers": 8,  # concurrent image probes per page
+    "max_download_mb": 50,  # larger images are not downloaded
+    "blob_dir": None,  # defaults to <output_dir>/blobs
+    "frontier_batch_size": 20,  # URLs leased at once by the sync engine
+    "html_parser": None,  # html_parsing backend; None picks lxml when installed
+    "output_format": "dirs",  # "dirs": content.txt + metadata.json per page; "shards": rolling corpus shards
+    "shard_dir": None,  # defaults to <output_dir>/shards
+    "shard_max_mb": 64,  # size at which a new shard is started
+    "near_duplicate_threshold": 0.8,  # estimated Jaccard similarity of a near-duplicate page; None disables the check
+    "near_duplicate_file": None,  # defaults to <output_dir>/near_duplicates.json
+    "boilerplate_file": None,  # learned template blocks (boilerplate.py); defaults to <output_dir>/boilerplate.json
+    # Elements removed from every page before extraction
+    "unwanted_selectors": [
+        "footer",
+        "footer.footer-area",
+        ".single-blog-post",
+        ".post-thumbnail",
+        "nav",
+        ".navigation",
+        ".sidebar",
+        ".ads",
+        ".advertisement",
+        "script",
+        "style",
+        ".cookie-notice",
+        "#comments",
+        ".social-media",
+        ".breadcrumbs",
+        ".site-header",
+        ".menu",
+    ],
+    # Extra removal selectors per host, e.g. {"hus.vnu.edu.vn": ["#dnn_ctr1234_ModuleContent"]}
+    "site_unwanted_selectors": {},
 }
 
 
+class RequestLimiter:
+    """
+    Caps the number of in-flight HTTP requests overall and per host.
+
+    Requests are issued from worker threads, so the limits are enforced with
+    thread semaphores rather than asyncio primitives.
+    """
+
+    def __init__(self, max_total: int, max_per_host: int):
+        self._total = threading.BoundedSemaphore(max_total)
+        self._max_per_host = max_per_host
+        self._hosts: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _host_semaphore(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = threading.BoundedSemaphore(self._max_per_host)
+            return self._hosts[host]
+
+    @contextmanager
+    def slot(self, url: str):
+        """Holds one request slot for the host of ``url``."""
+        host_semaphore = self._host_semaphore(urlparse(url).netloc)
+        with host_semaphore, self._total:
+            yield
+
+
+def request_slot(url: str, config: Dict):
+    """
+    Returns a context manager that reserves a request slot for a URL.
+
+    Args:
+        url: URL about to be requested
+        config: Configuration dictionary
+
+    Returns:
+        The limiter slot, or a no-op context when no limiter is configured
+    """
+    limiter = config.get("request_limiter")
+    return limiter.slot(url) if limiter else nullcontext()
+
+
 def sanitize_filename(url: str) -> str:
     """
     Creates a safe filename from a URL.
@@ -79,56 +177,109 @@ def fetch_page(url: str, config: Dict = None) -> Optional[BeautifulSoup]:
 
     try:
         logger.info(f"Fetching URL: {url}")
-        response = requests.get(
-            url,
-            headers=config["headers"],
-            verify=False,
-            timeout=config["request_timeout"]
-        )
+        with request_slot(url, config):
+            response = http_client.get_session().get(
+                url,
+                headers=config["headers"],
+                verify=False,
+                timeout=config["request_timeout"]
+            )
         response.raise_for_status()
-        return BeautifulSoup(response.text, "html.parser")
+        return parse_html(response.text, config.get("html_parser"))
     except requests.exceptions.RequestException as e:
         logger.error(f"Failed to fetch URL: {url}. Error: {e}")
         return None
 
 
-def clean_html(soup: BeautifulSoup) -> BeautifulSoup:
+def fetch_page_if_changed(url: str, config: Dict) -> Tuple[Optional[BeautifulSoup], bool]:
+    """
+    Fetches a page conditionally, using the validator store in the configuration.
+
+    When the page was crawled before, its stored ETag / Last-Modified are sent as
+    If-None-Match / If-Modified-Since. A 304 response, or a 200 response whose body
+    hash equals the stored one, means the page is unchanged and is not parsed.
+
+    Args:
+        url: URL to fetch
+        config: Configuration dictionary
+
+    Returns:
+        Tuple of (soup, changed). soup is None if the request failed or the page
+        is unchanged; changed is False only in the latter case.
+    """
+    store = config.get("validator_store")
+    if store is None:
+        return fetch_page(url, config), True
+
+    # Only trust validators when the previous output is still stored
+    previously_crawled = not config.get("force_recrawl") and is_stored(url, config)
+    headers = dict(config["headers"])
+    if previously_crawled:
+        headers.update(store.conditional_headers(url))
+
+    try:
+        logger.info(f"Fetching URL: {url}")
+        with request_slot(url, config):
+            response = http_client.get_session().get(
+                url,
+                headers=headers,
+                verify=False,
+                timeout=config["request_timeout"]
+            )
+
+        if response.status_code == 304:
+            logger.info(f"Not modified (304): {url}")
+            return None, False
+        response.raise_for_status()
+
+        body_hash = content_hash(response.content)
+        if previously_crawled and store.is_unchanged(url, body_hash):
+            logger.info(f"Unchanged content hash: {url}")
+            return None, False
+
+        store.update(url, response.headers.get("ETag"), response.headers.get("Last-Modified"), body_hash)
+        return parse_html(response.text, config.get("html_parser")), True
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Failed to fetch URL: {url}. Error: {e}")
+        return None, True
+
+
+def unwanted_selectors_for(url: Optional[str], config: Dict) -> List[str]:
+    """
+    Returns the removal selectors that apply to a page.
+
+    Args:
+        url: Page URL (None for the global rules only)
+        config: Configuration dictionary
+
+    Returns:
+        Global unwanted selectors followed by the extra ones configured for the page's host
+    """
+    selectors = list(config["unwanted_selectors"])
+    if url:
+        selectors.extend(config["site_unwanted_selectors"].get(urlparse(url).netloc, []))
+    return selectors
+
+
+def clean_html(soup: BeautifulSoup, config: Dict = None, url: Optional[str] = None) -> BeautifulSoup:
     """
     Removes unwanted elements from the HTML.
 
+    The selector list is compiled once into a DomCleaner, which finds all
+    unwanted elements in a single traversal of the tree.
+
     Args:
         soup: BeautifulSoup object
+        config: Configuration dictionary
+        url: Page URL, used to add site-specific rules
 
     Returns:
         Cleaned BeautifulSoup object
     """
-    # Define selectors for unwanted elements
-    unwanted_selectors = [
-        "footer",
-        "footer.footer-area",
-        ".single-blog-post",
-        ".post-thumbnail",
-        "nav",
-        ".navigation",
-        ".sidebar",
-        ".ads",
-        ".advertisement",
-        "script",
-        "style",
-        ".cookie-notice",
-        "#comments",
-        ".social-media",
-        ".breadcrumbs",
-        ".site-header",
-        ".menu",
-    ]
-
-    # Remove unwanted elements
-    for selector in unwanted_selectors:
-        for element in soup.select(selector):
-            element.decompose()
+    if config is None:
+        config = DEFAULT_CONFIG
 
-    return soup
+    return get_cleaner(unwanted_selectors_for(url, config)).clean(soup)
 
 
 def should_keep_image(img_url: str, config: Dict) -> bool:
@@ -155,33 +306,181 @@ def should_keep_image(img_url: str, config: Dict) -> bool:
     return True
 
 
-def check_image_size(img_url: str, config: Dict) -> bool:
+def probe_image(img_url: str, config: Dict) -> Optional[Dict]:
     """
-    Checks if an image meets the minimum size requirements.
+    Probes an image with a HEAD request.
 
     Args:
         img_url: Image URL
         config: Configuration dictionary
 
     Returns:
-        Boolean indicating whether the image meets size requirements
+        Dict with content_length, etag and keep, or None if the request failed
     """
     try:
         headers = {**config["headers"], "Range": "bytes=0-1024"}
-        response = requests.head(
-            img_url,
-            headers=headers,
-            verify=False,
-            timeout=config["request_timeout"]
-        )
-
-        if "content-length" in response.headers:
-            size_kb = int(response.headers["content-length"]) / 1024
-            return size_kb >= config["image_min_size_kb"]
-        return False
+        with request_slot(img_url, config):
+            response = http_client.get_session().head(
+                img_url,
+                headers=headers,
+                verify=False,
+                timeout=config["request_timeout"]
+            )
     except requests.exceptions.RequestException as e:
         logger.debug(f"Could not check image size for {img_url}: {e}")
-        return False
+        return None
+
+    content_length = None
+    if "content-length" in response.headers:
+        content_length = int(response.headers["content-length"])
+    return {
+        "content_length": content_length,
+        "etag": response.headers.get("ETag"),
+        "keep": content_length is not None and content_length / 1024 >= config["image_min_size_kb"],
+    }
+
+
+def check_image_size(img_url: str, config: Dict) -> bool:
+    """
+    Checks if an image meets the minimum size requirements.
+
+    Probe results are looked up in and stored to the image probe cache in the
+    configuration, so an image is probed at most once across pages and runs.
+
+    Args:
+        img_url: Image URL
+        config: Configuration dictionary
+
+    Returns:
+        Boolean indicating whether the image meets size requirements
+    """
+    cache = config.get("image_probe_cache")
+    result = cache.get(img_url) if cache else None
+    if result is None:
+        result = probe_image(img_url, config)
+        if result is None:
+            return False
+        if cache:
+            cache.put(img_url, result)
+
+    # Re-evaluate the size so that a changed --min-img-size applies to cached results
+    if result["content_length"] is not None:
+        return result["content_length"] / 1024 >= config["image_min_size_kb"]
+    return result["keep"]
+
+
+def check_image_sizes(img_urls: List[str], config: Dict) -> Dict[str, bool]:
+    """
+    Checks the size of several images concurrently.
+
+    Args:
+        img_urls: Image URLs (duplicates are probed once)
+        config: Configuration dictionary
+
+    Returns:
+        Mapping of image URL to whether it meets the size requirements
+    """
+    unique_urls = list(dict.fromkeys(img_urls))
+    if len(unique_urls) <= 1:
+        return {img_url: check_image_size(img_url, config) for img_url in unique_urls}
+
+    workers = min(config["image_probe_workers"], len(unique_urls))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(lambda img_url: check_image_size(img_url, config), unique_urls)
+        return dict(zip(unique_urls, results))
+
+
+def collect_blocks(soup: BeautifulSoup, base_url: str, config: Dict) -> Tuple[List[ContentBlock], List[Tuple[int, str]]]:
+    """
+    Extracts typed content blocks from HTML in a single streaming pass, without checking image sizes.
+
+    Unwanted elements (see clean_html) are skipped during the same traversal,
+    so the page does not need to be cleaned first. Blocks of the site's learned
+    boilerplate filter are dropped, and image blocks that pass
+    should_keep_image are kept as candidates for filter_images.
+
+    Args:
+        soup: BeautifulSoup object
+        base_url: Base URL for resolving relative links
+        config: Configuration dictionary
+
+    Returns:
+        Tuple of (blocks, image_candidates), image_candidates being (position in blocks, image URL)
+    """
+    body = content_root(soup)
+    blocks = []
+    image_candidates = []
+
+    if not body:
+        logger.warning("No body element found in HTML")
+        return blocks, image_candidates
+
+    cleaner = get_cleaner(unwanted_selectors_for(base_url, config))
+    if cleaner.fallback:
+        # Selectors the single pass cannot evaluate are removed beforehand
+        cleaner.clean(soup)
+
+    boilerplate = config.get("boilerplate_filter")
+    template_keys = boilerplate.keys_for(base_url) if boilerplate is not None else None
+    removed = []
+    for block in iter_content_blocks(body, base_url, skip=cleaner.matches, dom_paths=template_keys is not None):
+        if template_keys is not None and block_key(block) in template_keys:
+            removed.append(block)
+        elif block.kind == "image":
+            if should_keep_image(block.text, config):
+                # Keep the image's position; its size is checked in one batch later
+                image_candidates.append((len(blocks), block.text))
+                blocks.append(block)
+        else:
+            blocks.append(block)
+
+    if template_keys is not None:
+        boilerplate.record(removed)
+
+    return blocks, image_candidates
+
+
+def filter_images(blocks: List[ContentBlock], image_candidates: List[Tuple[int, str]],
+                  config: Dict) -> Tuple[List[ContentBlock], List[str]]:
+    """
+    Checks the sizes of a page's candidate images in one batch and drops the blocks of small ones.
+
+    Args:
+        blocks: Blocks returned by collect_blocks
+        image_candidates: Image candidates returned by collect_blocks
+        config: Configuration dictionary
+
+    Returns:
+        Tuple of (blocks, image_urls)
+    """
+    if not image_candidates:
+        return blocks, []
+
+    keep = check_image_sizes([img_url for _, img_url in image_candidates], config)
+    image_urls = []
+    dropped = set()
+    for position, img_url in image_candidates:
+        if keep[img_url]:
+            image_urls.append(img_url)
+        else:
+            dropped.add(position)
+    return [block for position, block in enumerate(blocks) if position not in dropped], image_urls
+
+
+def extract_blocks(soup: BeautifulSoup, base_url: str, config: Dict) -> Tuple[List[ContentBlock], List[str]]:
+    """
+    Extracts typed content blocks from HTML, keeping only images that pass the size check.
+
+    Args:
+        soup: BeautifulSoup object
+        base_url: Base URL for resolving relative links
+        config: Configuration dictionary
+
+    Returns:
+        Tuple of (blocks, image_urls)
+    """
+    blocks, image_candidates = collect_blocks(soup, base_url, config)
+    return filter_images(blocks, image_candidates, config)
 
 
 def extract_content(soup: BeautifulSoup, base_url: str, config: Dict) -> Tuple[List[str], List[str]]:
@@ -196,111 +495,114 @@ def extract_content(soup: BeautifulSoup, base_url: str, config: Dict) -> Tuple[L
     Returns:
         Tuple of (content_list, image_urls)
     """
-    body = soup.body
-    content_list = []
-    image_urls = []
+    blocks, image_urls = extract_blocks(soup, base_url, config)
+    return [format_block(block) for block in blocks], image_urls
 
-    if not body:
-        logger.warning("No body element found in HTML")
-        return content_list, image_urls
 
-    elements = body.find_all(["h1", "h2", "h3", "h4", "h5", "h6", "p", "table", "img"], recursive=True)
+def image_extension(img_url: str, response: requests.Response) -> str:
+    """
+    Determines the file extension of an image from its Content-Type or URL.
 
-    for element in elements:
-        # Process based on element type
-        if element.name.startswith('h1') and len(element.name) == 2:
-            text = element.get_text(strip=True)
-            if text:
-                content_list.append(f"Tiêu đề: {text}\n")
+    Args:
+        img_url: Image URL
+        response: Response of the image request
 
-        elif element.name == "p":
-            # Skip paragraphs inside tables
-            if not element.find_parent("table"):
-                text = element.get_text(strip=True)
-                if text:
-                    content_list.append(f"{text}\n")
+    Returns:
+        File extension without dot
+    """
+    if "content-type" in response.headers and "image" in response.headers["content-type"]:
+        ext = response.headers["content-type"].split("/")[-1].split(";")[0]
+        if ext == "jpeg":
+            ext = "jpg"
+    else:
+        ext = img_url.split(".")[-1].lower()
+        if ext not in ["jpg", "jpeg", "png", "gif", "webp", "svg"]:
+            ext = "jpg"
+    return ext
+
+
+def download_image(img_url: str, config: Dict) -> Optional[str]:
+    """
+    Downloads a single image into the content-addressed blob store.
 
-        elif element.name == "table":
-            content_list.append('\n')
-            table_data = []
+    Images already stored are re-validated with a conditional request (or not
+    requested at all if already fetched during this run) instead of being
+    downloaded again.
 
-            for row in element.find_all("tr"):
-                cells = [cell.get_text(strip=True) for cell in row.find_all(["td", "th"])]
-                if any(cells):  # Skip empty rows
-                    table_data.append("\t".join(cells))
+    Args:
+        img_url: Image URL
+        config: Configuration dictionary
 
-            if table_data:
-                content_list.append("\n".join(table_data) + "\n")
+    Returns:
+        Path to the image blob or None if the download failed
+    """
+    store = config["blob_store"]
 
-        elif element.name == "img" and element.get("src"):
-            # Process image
-            img_url = element.get("src")
+    def open_response(conditional_headers: Dict[str, str]) -> requests.Response:
+        return http_client.get_session().get(
+            img_url,
+            headers={**config["headers"], **conditional_headers},
+            verify=False,
+            timeout=config["request_timeout"],
+            stream=True
+        )
 
-            # Handle relative URLs
-            if not img_url.startswith(('http://', 'https://')):
-                img_url = urljoin(base_url, img_url)
+    try:
+        with request_slot(img_url, config):
+            entry = store.fetch(
+                img_url,
+                open_response,
+                lambda response: image_extension(img_url, response),
+                max_bytes=config["max_download_mb"] * 1024 * 1024
+            )
 
-            if should_keep_image(img_url, config) and check_image_size(img_url, config):
-                content_list.append(f"🖼️ Ảnh: {img_url}\n")
-                image_urls.append(img_url)
+        img_path = store.blob_path(entry)
+        logger.info(f"Downloaded image: {img_url} → {img_path}")
+        return img_path
 
-    return content_list, image_urls
+    except Exception as e:
+        logger.error(f"Failed to download image {img_url}: {e}")
+        return None
 
 
-def download_images(image_urls: List[str], output_dir: str, config: Dict) -> List[str]:
+def download_images(image_urls: List[str], config: Dict) -> List[str]:
     """
     Downloads images from URLs.
 
     Args:
         image_urls: List of image URLs
-        output_dir: Directory to save images
         config: Configuration dictionary
 
     Returns:
         List of paths to downloaded images
     """
-    # Create directory if it doesn't exist
-    img_dir = Path(output_dir)
-    img_dir.mkdir(parents=True, exist_ok=True)
-
     downloaded_paths = []
 
-    for i, img_url in enumerate(image_urls):
-        # Rate limiting
-        if i > 0:
-            time.sleep(config["rate_limit_delay"])
+    # Requests are paced by the shared per-host rate limiter
+    for img_url in image_urls:
+        img_path = download_image(img_url, config)
+        if img_path:
+            downloaded_paths.append(img_path)
 
-        try:
-            response = requests.get(
-                img_url,
-                headers=config["headers"],
-                verify=False,
-                timeout=config["request_timeout"]
-            )
-            response.raise_for_status()
-
-            # Determine file extension from Content-Type or URL
-            if "content-type" in response.headers and "image" in response.headers["content-type"]:
-                ext = response.headers["content-type"].split("/")[-1].split(";")[0]
-                if ext == "jpeg":
-                    ext = "jpg"
-            else:
-                ext = img_url.split(".")[-1].lower()
-                if ext not in ["jpg", "jpeg", "png", "gif", "webp", "svg"]:
-                    ext = "jpg"
+    return downloaded_paths
 
-            # Save image with sequential numbering
-            img_path = img_dir / f"image_{i + 1}.{ext}"
-            with open(img_path, "wb") as f:
-                f.write(response.content)
 
-            logger.info(f"Downloaded image: {img_url} → {img_path}")
-            downloaded_paths.append(str(img_path))
+async def download_images_async(image_urls: List[str], config: Dict) -> List[str]:
+    """
+    Downloads images from URLs concurrently, bounded by the request limiter.
 
-        except Exception as e:
-            logger.error(f"Failed to download image {img_url}: {e}")
+    Args:
+        image_urls: List of image URLs
+        config: Configuration dictionary
 
-    return downloaded_paths
+    Returns:
+        List of paths to downloaded images, in page order
+    """
+    results = await asyncio.gather(*(
+        asyncio.to_thread(download_image, img_url, config)
+        for img_url in image_urls
+    ))
+    return [path for path in results if path]
 
 
 def save_content(content_list: List[str], output_file: str) -> None:
@@ -319,7 +621,8 @@ def save_content(content_list: List[str], output_file: str) -> None:
         logger.error(f"Failed to save content to {output_file}: {e}")
 
 
-def save_metadata(url: str, title: str, content_file: str, image_files: List[str], metadata_file: str) -> None:
+def save_metadata(url: str, title: str, content_file: str, image_files: List[str], metadata_file: str,
+                  changed: bool = True, content_sha256: Optional[str] = None) -> None:
     """
     Saves metadata about the crawled page.
 
@@ -329,14 +632,19 @@ def save_metadata(url: str, title: str, content_file: str, image_files: List[str
         content_file: Path to content file
         image_files: List of paths to image files
         metadata_file: Path to metadata file
+        changed: Whether the page changed since the previous crawl
+        content_sha256: SHA-256 of content.txt, compared by incremental index updates
     """
     metadata = {
         "url": url,
         "title": title,
         "crawl_date": datetime.now().isoformat(),
         "content_file": content_file,
-        "image_files": image_files
+        "image_files": image_files,
+        "changed": changed
     }
+    if content_sha256:
+        metadata["content_sha256"] = content_sha256
 
     try:
         with open(metadata_file, "w", encoding="utf-8") as f:
@@ -346,6 +654,178 @@ def save_metadata(url: str, title: str, content_file: str, image_files: List[str
         logger.error(f"Failed to save metadata to {metadata_file}: {e}")
 
 
+def mark_unchanged(url: str, config: Dict) -> None:
+    """
+    Records in the page's existing metadata that it has not changed since the last crawl.
+
+    Args:
+        url: URL that was checked
+        config: Configuration dictionary
+    """
+    if config.get("shard_writer") is not None:
+        # The page's record in an earlier shard stays the current one
+        logger.info(f"⏭️ Unchanged since last crawl: {url}")
+        return
+    metadata_file = page_dir_for(url, config) / "metadata.json"
+    try:
+        with open(metadata_file, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        metadata["changed"] = False
+        metadata["last_checked"] = datetime.now().isoformat()
+        with open(metadata_file, "w", encoding="utf-8") as f:
+            json.dump(metadata, f, ensure_ascii=False, indent=2)
+        logger.info(f"⏭️ Unchanged since last crawl: {url}")
+    except (IOError, ValueError) as e:
+        logger.error(f"Failed to update metadata {metadata_file}: {e}")
+
+
+def is_stored(url: str, config: Dict) -> bool:
+    """
+    Returns True if the output of an earlier crawl of a page is still stored.
+
+    Args:
+        url: Page URL
+        config: Configuration dictionary
+
+    Returns:
+        Whether a record of the page is in the shards (shards output) or its metadata.json exists
+    """
+    shard_writer = config.get("shard_writer")
+    if shard_writer is not None:
+        return url in shard_writer
+    return (page_dir_for(url, config) / "metadata.json").exists()
+
+
+def page_dir_for(url: str, config: Dict) -> Path:
+    """
+    Returns the output directory of a page.
+
+    Args:
+        url: Page URL
+        config: Configuration dictionary
+
+    Returns:
+        Path of the page directory under the output directory
+    """
+    return Path(config["output_dir"]) / sanitize_filename(url)
+
+
+def process_page(url: str, soup: BeautifulSoup,
+                 config: Dict) -> Tuple[str, List[ContentBlock], List[str], Optional[Tuple[str, float]]]:
+    """
+    Cleans a fetched page and extracts its content.
+
+    The page's text is checked against the near-duplicate index before its
+    images are probed; a duplicate is returned without blocks or images.
+
+    Args:
+        url: URL of the page
+        soup: BeautifulSoup object of the fetched page
+        config: Configuration dictionary
+
+    Returns:
+        Tuple of (page_title, blocks, image_urls, duplicate), duplicate being
+        (canonical URL, estimated similarity) for a near-duplicate page, else None
+    """
+    # Get page title
+    title_tag = soup.find('title')
+    page_title = title_tag.get_text(strip=True) if title_tag else "Untitled Page"
+
+    # Extract content (unwanted elements are skipped in the same pass)
+    blocks, image_candidates = collect_blocks(soup, url, config)
+
+    near_duplicates = config.get("near_duplicates")
+    if near_duplicates is not None:
+        text = "".join(format_block(block) for block in blocks if block.kind != "image")
+        duplicate = near_duplicates.check(url, text)
+        if duplicate is not None:
+            return page_title, [], [], duplicate
+
+    blocks, image_urls = filter_images(blocks, image_candidates, config)
+
+    # Ensure we have content
+    if not blocks:
+        logger.warning(f"No content extracted from {url}")
+        blocks = [ContentBlock("paragraph", "Không tìm thấy nội dung.")]
+
+    return page_title, blocks, image_urls, None
+
+
+def save_page(url: str, page_title: str, blocks: List[ContentBlock], image_files: List[str],
+              config: Dict) -> None:
+    """
+    Saves an extracted page, to the corpus shards or as a page directory.
+
+    Args:
+        url: URL of the page
+        page_title: Page title
+        blocks: Extracted content blocks
+        image_files: Paths of the downloaded images
+        config: Configuration dictionary
+    """
+    shard_writer = config.get("shard_writer")
+    if shard_writer is not None:
+        shard_writer.append(page_record(url, page_title, datetime.now().isoformat(), blocks, image_files))
+        return
+
+    # Create output directory named after the URL
+    page_dir = page_dir_for(url, config)
+    page_dir.mkdir(parents=True, exist_ok=True)
+
+    content_file = page_dir / "content.txt"
+    content_list = [format_block(block) for block in blocks]
+    save_content(content_list, str(content_file))
+    save_metadata(url, page_title, str(content_file), image_files, str(page_dir / "metadata.json"),
+                  content_sha256=content_hash("".join(content_list).encode("utf-8")))
+
+
+def save_duplicate(url: str, page_title: str, canonical_url: str, similarity: float, config: Dict) -> None:
+    """
+    Records a near-duplicate page in the metadata only; its content is neither stored nor indexed.
+
+    Args:
+        url: URL of the page
+        page_title: Page title
+        canonical_url: URL of the page it duplicates
+        similarity: Estimated Jaccard similarity with the canonical page
+        config: Configuration dictionary
+    """
+    logger.info(f"🔁 Near-duplicate of {canonical_url} ({similarity:.0%}): {url}")
+    shard_writer = config.get("shard_writer")
+    if shard_writer is not None:
+        record = page_record(url, page_title, datetime.now().isoformat(), [], [])
+        record["duplicate_of"] = canonical_url
+        record["similarity"] = round(similarity, 3)
+        shard_writer.append(record)
+        return
+
+    page_dir = page_dir_for(url, config)
+    page_dir.mkdir(parents=True, exist_ok=True)
+    # Content of an earlier crawl, when the page was still canonical, must not be indexed
+    (page_dir / "content.txt").unlink(missing_ok=True)
+    metadata = {
+        "url": url,
+        "title": page_title,
+        "crawl_date": datetime.now().isoformat(),
+        "duplicate_of": canonical_url,
+        "similarity": round(similarity, 3),
+        "changed": True
+    }
+    metadata_file = page_dir / "metadata.json"
+    try:
+        with open(metadata_file, "w", encoding="utf-8") as f:
+            json.dump(metadata, f, ensure_ascii=False, indent=2)
+    except IOError as e:
+        logger.error(f"Failed to save metadata to {metadata_file}: {e}")
+
+
+def forget_validators(url: str, config: Dict) -> None:
+    """Drops the stored validators of a URL whose crawl failed, so the next run re-fetches it."""
+    store = config.get("validator_store")
+    if store is not None:
+        store.forget(url)
+
+
 def crawl_url(url: str, config: Dict) -> bool:
     """
     Crawls a single URL and saves the content.
@@ -358,55 +838,186 @@ def crawl_url(url: str, config: Dict) -> bool:
         Boolean indicating success
     """
     try:
-        # Fetch and parse page
-        soup = fetch_page(url, config)
+        # Fetch and parse page (skipped when unchanged since the last crawl)
+        soup, changed = fetch_page_if_changed(url, config)
+        if not changed:
+            mark_unchanged(url, config)
+            return True
         if not soup:
             logger.error(f"Failed to fetch page: {url}")
             return False
 
-        # Get page title
-        title_tag = soup.find('title')
-        page_title = title_tag.get_text(strip=True) if title_tag else "Untitled Page"
+        page_title, blocks, image_urls, duplicate = process_page(url, soup, config)
+        if duplicate is not None:
+            save_duplicate(url, page_title, *duplicate, config)
+            return True
+
+        # Download images (into the shared blob store)
+        image_files = download_images(image_urls, config)
 
-        # Create safe filename from URL
-        page_id = sanitize_filename(url)
+        # Save content and metadata
+        save_page(url, page_title, blocks, image_files, config)
 
-        # Create output directories
-        output_base = Path(config["output_dir"])
-        page_dir = output_base / page_id
-        page_dir.mkdir(parents=True, exist_ok=True)
+        logger.info(f"✅ Successfully crawled: {url}")
+        return True
+
+    except Exception as e:
+        logger.error(f"Error crawling {url}: {e}", exc_info=True)
+        forget_validators(url, config)
+        return False
 
-        # Clean HTML
-        soup = clean_html(soup)
 
-        # Extract content
-        content_list, image_urls = extract_content(soup, url, config)
+async def crawl_url_async(url: str, config: Dict) -> bool:
+    """
+    Crawls a single URL on the asyncio engine.
+
+    Blocking work (HTTP requests, parsing, extraction) runs in worker threads
+    so that pages and their images are processed concurrently.
+
+    Args:
+        url: URL to crawl
+        config: Configuration dictionary
 
-        # Ensure we have content
-        if not content_list:
-            logger.warning(f"No content extracted from {url}")
-            content_list = ["Không tìm thấy nội dung.\n"]
+    Returns:
+        Boolean indicating success
+    """
+    try:
+        soup, changed = await asyncio.to_thread(fetch_page_if_changed, url, config)
+        if not changed:
+            await asyncio.to_thread(mark_unchanged, url, config)
+            return True
+        if not soup:
+            logger.error(f"Failed to fetch page: {url}")
+            return False
 
-        # Save content
-        content_file = page_dir / "content.txt"
-        save_content(content_list, str(content_file))
+        page_title, blocks, image_urls, duplicate = await asyncio.to_thread(process_page, url, soup, config)
+        if duplicate is not None:
+            await asyncio.to_thread(save_duplicate, url, page_title, *duplicate, config)
+            return True
 
-        # Download images
-        img_dir = page_dir / "images"
-        image_files = download_images(image_urls, str(img_dir), config)
+        image_files = await download_images_async(image_urls, config)
 
-        # Save metadata
-        metadata_file = page_dir / "metadata.json"
-        save_metadata(url, page_title, str(content_file), image_files, str(metadata_file))
+        await asyncio.to_thread(save_page, url, page_title, blocks, image_files, config)
 
         logger.info(f"✅ Successfully crawled: {url}")
         return True
 
     except Exception as e:
         logger.error(f"Error crawling {url}: {e}", exc_info=True)
+        forget_validators(url, config)
         return False
 
 
+def prepare_async_engine(config: Dict) -> Dict:
+    """
+    Sets up the running event loop for the asyncio engine.
+
+    Args:
+        config: Configuration dictionary
+
+    Returns:
+        Copy of the configuration with the shared RequestLimiter
+    """
+    config = {
+        **config,
+        "request_limiter": RequestLimiter(config["max_concurrency"], config["max_per_host"]),
+    }
+    loop = asyncio.get_running_loop()
+    # Page tasks and their image downloads share the pool; the limiter keeps
+    # the actual request concurrency within bounds.
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=config["max_concurrency"] * 2))
+    return config
+
+
+async def crawl_urls_async(urls: List[str], config: Dict) -> int:
+    """
+    Crawls URLs concurrently with the asyncio engine.
+
+    At most ``max_concurrency`` pages are in progress at once, and every HTTP
+    request holds a slot of the shared RequestLimiter, which caps in-flight
+    requests overall and per host.
+
+    Args:
+        urls: URLs to crawl
+        config: Configuration dictionary
+
+    Returns:
+        Number of successfully crawled URLs
+    """
+    config = prepare_async_engine(config)
+    page_slots = asyncio.Semaphore(config["max_concurrency"])
+
+    async def bounded_crawl(url: str) -> bool:
+        async with page_slots:
+            return await crawl_url_async(url, config)
+
+    results = await asyncio.gather(*(bounded_crawl(url) for url in urls))
+    return sum(results)
+
+
+def crawl_frontier(frontier: Frontier, queue: str, config: Dict) -> Tuple[int, int]:
+    """
+    Crawls the URLs leased from a frontier queue one after another.
+
+    Each URL is marked done or failed in the frontier as soon as it is
+    processed, so an interrupted crawl resumes with the remaining URLs.
+
+    Args:
+        frontier: Crawl frontier
+        queue: Frontier queue to lease from
+        config: Configuration dictionary
+
+    Returns:
+        Tuple of (successfully crawled, attempted) URL counts
+    """
+    success_count, attempted = 0, 0
+    for batch in frontier.lease_batches(queue, config["frontier_batch_size"]):
+        for url in batch:
+            attempted += 1
+            if crawl_url(url, config):
+                frontier.complete(queue, url)
+                success_count += 1
+            else:
+                frontier.fail(queue, url, "crawl failed")
+    return success_count, attempted
+
+
+async def crawl_frontier_async(frontier: Frontier, queue: str, config: Dict) -> Tuple[int, int]:
+    """
+    Crawls the URLs of a frontier queue concurrently with the asyncio engine.
+
+    ``max_concurrency`` workers each lease one URL at a time, so a slow page
+    never holds back a whole batch.
+
+    Args:
+        frontier: Crawl frontier
+        queue: Frontier queue to lease from
+        config: Configuration dictionary
+
+    Returns:
+        Tuple of (successfully crawled, attempted) URL counts
+    """
+    config = prepare_async_engine(config)
+    await asyncio.to_thread(frontier.release_stale_leases, queue)
+
+    async def worker() -> Tuple[int, int]:
+        success_count, attempted = 0, 0
+        while True:
+            leased = await asyncio.to_thread(frontier.lease, queue, 1)
+            if not leased:
+                return success_count, attempted
+            url = leased[0]
+            attempted += 1
+            if await crawl_url_async(url, config):
+                await asyncio.to_thread(frontier.complete, queue, url)
+                success_count += 1
+            else:
+                await asyncio.to_thread(frontier.fail, queue, url, "crawl failed")
+
+    results = await asyncio.gather(*(worker() for _ in range(config["max_concurrency"])))
+    return sum(ok for ok, _ in results), sum(attempted for _, attempted in results)
+
+
 def read_urls_from_file(file_path: str) -> List[str]:
     """
     Reads URLs from a file.
@@ -439,7 +1050,34 @@ def main():
     parser.add_argument("--timeout", type=int, default=30,
                         help="Request timeout in seconds")
     parser.add_argument("--delay", type=float, default=2.0,
-                        help="Delay between requests in seconds")
+                        help="Initial delay between requests to a host in seconds (the rate then adapts)")
+    parser.add_argument("--max-rate", type=float, default=10.0,
+                        help="Maximum requests per second per host")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-crawl every page even if its stored validators say it is unchanged")
+    parser.add_argument("--parser", choices=BACKENDS, default=None,
+                        help="HTML parser backend (default: lxml if installed, else html.parser)")
+    parser.add_argument("--engine", choices=["sync", "async"], default="sync",
+                        help="Crawl engine: sequential (sync) or concurrent asyncio (async)")
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="Maximum in-flight requests overall (async engine)")
+    parser.add_argument("--per-host", type=int, default=4,
+                        help="Maximum in-flight requests per host (async engine)")
+    parser.add_argument("--frontier", type=str, default=None,
+                        help="SQLite crawl frontier to lease URLs from (e.g. data/frontier.sqlite)")
+    parser.add_argument("--queue", type=str, default="pages",
+                        help="Frontier queue to crawl")
+    parser.add_argument("--requeue", choices=["done", "failed", "all"], nargs="?", const="all", default=None,
+                        help="Put the done and/or failed URLs of the frontier queue back to pending before "
+                             "crawling, e.g. for a refresh (default: all)")
+    parser.add_argument("--output-format", choices=["dirs", "shards"], default="dirs",
+                        help="Save a directory per page (dirs) or append pages to rolling JSONL/Arrow shards")
+    parser.add_argument("--shard-mb", type=int, default=64,
+                        help="Shard size in MB (shards output)")
+    parser.add_argument("--dedup-threshold", type=float, default=0.8,
+                        help="Estimated text similarity from which a page is recorded as a near-duplicate")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="Store every page, even near-duplicates of pages already crawled")
 
     args = parser.parse_args()
 
@@ -448,7 +1086,14 @@ def main():
     config["image_min_size_kb"] = args.min_img_size
     config["request_timeout"] = args.timeout
     config["rate_limit_delay"] = args.delay
+    config["max_rate"] = args.max_rate
     config["output_dir"] = args.output_dir
+    config["max_concurrency"] = args.concurrency
+    config["max_per_host"] = args.per_host
+    config["html_parser"] = args.parser
+    config["output_format"] = args.output_format
+    config["shard_max_mb"] = args.shard_mb
+    config["near_duplicate_threshold"] = None if args.no_dedup else args.dedup_threshold
 
     # Get URLs to crawl
     urls_to_crawl = []
@@ -457,9 +1102,20 @@ def main():
     if args.urls_file:
         urls_to_crawl.extend(read_urls_from_file(args.urls_file))
 
-    # If no URLs provided, use default examples
-
-    if not urls_to_crawl:
+    frontier = None
+    if args.frontier:
+        # URLs given on the command line are queued; the crawl itself leases from the frontier
+        frontier = Frontier(args.frontier)
+        if urls_to_crawl:
+            added = frontier.add(urls_to_crawl, args.queue, source="command line")
+            logger.info(f"Queued {added} new URLs in frontier queue '{args.queue}'")
+        if args.requeue:
+            states = ["done", "failed"] if args.requeue == "all" else [args.requeue]
+            requeued = frontier.requeue(args.queue, states)
+            logger.info(f"Requeued {requeued} URLs in frontier queue '{args.queue}'")
+    elif args.requeue:
+        parser.error("--requeue needs --frontier")
+    elif not urls_to_crawl:
         urls_to_crawl = [
             "https://hus.vnu.edu.vn/gioi-thieu/co-cau-to-chuc/du-an-va-cong-ty.html",
             "https://hus.vnu.edu.vn/gioi-thieu/co-cau-to-chuc/phong-ban-chuc-nang.html",
@@ -468,20 +1124,76 @@ def main():
     # Create output directory
     Path(config["output_dir"]).mkdir(parents=True, exist_ok=True)
 
-    # Crawl each URL
-    success_count = 0
-    for url in urls_to_crawl:
-        if crawl_url(url, config):
-            success_count += 1
-        # Add delay between crawls
-        if url != urls_to_crawl[-1]:  # Don't delay after the last URL
-            time.sleep(config["rate_limit_delay"])
+    # Share one pooled session between all workers; every request is paced per host
+    http_client.configure_rate_limiter(initial_rate=1.0 / max(config["rate_limit_delay"], 0.01),
+                                       max_rate=config["max_rate"])
+    http_client.configure_session(pool_size=config["max_concurrency"])
+
+    # Validators from previous runs make unchanged pages cost a single conditional request
+    validators_file = config["validators_file"] or os.path.join(config["output_dir"], "validators.json")
+    config["validator_store"] = ValidatorStore(validators_file)
+    config["force_recrawl"] = args.force
+
+    # Probe results of images shared across pages (logos, banners) are reused across runs
+    image_cache_file = config["image_cache_file"] or os.path.join(config["output_dir"], "image_probe_cache.json")
+    config["image_probe_cache"] = ImageProbeCache(image_cache_file, config["image_cache_size"])
+
+    # Images are stored once by SHA-256, however many pages reference them
+    config["blob_store"] = BlobStore(config["blob_dir"] or os.path.join(config["output_dir"], "blobs"))
+
+    if config["output_format"] == "shards":
+        shard_dir = config["shard_dir"] or os.path.join(config["output_dir"], "shards")
+        config["shard_writer"] = ShardWriter(shard_dir, config["shard_max_mb"] * 1024 * 1024)
+
+    # Near-duplicates of pages crawled in this or earlier runs are only recorded, not stored
+    if config["near_duplicate_threshold"] is not None:
+        near_duplicate_file = config["near_duplicate_file"] or os.path.join(config["output_dir"], "near_duplicates.json")
+        config["near_duplicates"] = NearDuplicateIndex(near_duplicate_file, config["near_duplicate_threshold"])
+
+    # Template blocks learned by boilerplate.py are dropped during extraction
+    boilerplate_file = config["boilerplate_file"] or os.path.join(config["output_dir"], "boilerplate.json")
+    if os.path.exists(boilerplate_file):
+        config["boilerplate_filter"] = BoilerplateFilter(boilerplate_file)
+
+    start_time = time.perf_counter()
+
+    if frontier is not None:
+        if args.engine == "async":
+            success_count, total_count = asyncio.run(crawl_frontier_async(frontier, args.queue, config))
+        else:
+            success_count, total_count = crawl_frontier(frontier, args.queue, config)
+        logger.info(f"Frontier queue '{args.queue}': {frontier.counts(args.queue)}")
+    elif args.engine == "async":
+        success_count = asyncio.run(crawl_urls_async(urls_to_crawl, config))
+        total_count = len(urls_to_crawl)
+    else:
+        # Crawl each URL
+        success_count = 0
+        for url in urls_to_crawl:
+            if crawl_url(url, config):
+                success_count += 1
+        total_count = len(urls_to_crawl)
+
+    elapsed = time.perf_counter() - start_time
+
+    config["validator_store"].save()
+    config["image_probe_cache"].save()
+    config["blob_store"].save()
+    if config.get("near_duplicates") is not None:
+        config["near_duplicates"].save()
+    if config.get("shard_writer") is not None:
+        config["shard_writer"].close()
 
     # Summary
-    logger.info(f"Crawl completed. Successfully crawled {success_count}/{len(urls_to_crawl)} URLs.")
+    if config.get("boilerplate_filter") is not None:
+        logger.info(config["boilerplate_filter"].summary())
+    logger.info(f"Crawl completed. Successfully crawled {success_count}/{total_count} URLs.")
+    logger.info(f"Elapsed {elapsed:.1f}s ({total_count / elapsed if elapsed else 0:.2f} pages/sec, "
+                f"{args.engine} engine)")
+    http_client.log_connection_stats(logger)
     logger.info(f"Results saved to {os.path.abspath(config['output_dir'])}")
 
-    return 0 if success_count == len(urls_to_crawl) else 1
+    return 0 if success_count == total_count else 1
 
 
 if __name__ == "__main__":
@@ -0,0 +1,218 @@
+"""
+Near-duplicate detection of crawled pages with MinHash and LSH banding.
+
+Many HUS pages are near-copies: the same notice published under several menu
+sections, print versions of articles. Every copy costs image probes and
+downloads during the crawl and passages in the search index. This module
+flags a page as a duplicate of an earlier (canonical) page as soon as its
+text is extracted:
+
+- the text is normalized (NFC, lowercase, word tokens) and cut into
+  overlapping word ``shingle_size``-grams, each hashed to 32 bits (CRC-32);
+- a MinHash signature of ``num_perm`` 32-bit values, one per hash function
+  ``(a·x + b) mod (2^61 - 1)``, estimates the Jaccard similarity of two
+  pages' shingle sets as the fraction of equal values. A page costs one
+  fixed-size signature (512 bytes by default), whatever its length;
+- the signature is cut into ``bands`` bands; pages sharing any band are
+  candidates, and a candidate whose estimated similarity reaches
+  ``threshold`` makes the page a duplicate. Only canonical pages are added,
+  so every duplicate points at a page that was actually stored.
+
+Signatures are saved to a JSON file between runs, so a page re-crawled later
+is still compared with the canonical pages of earlier runs. With numpy
+installed the signature is computed as one vectorized product; the pure
+Python path gives identical values.
+"""
+import base64
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import unicodedata
+import zlib
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+logger = logging.getLogger("near_duplicates")
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+TOKEN = re.compile(r"\w+")
+
+
+def shingle_hashes(text: str, shingle_size: int = 5) -> List[int]:
+    """
+    Returns the distinct 32-bit hashes of the word shingles of a text.
+
+    Args:
+        text: Page text
+        shingle_size: Words per shingle
+
+    Returns:
+        Sorted shingle hashes (empty if the text has fewer words than a shingle)
+    """
+    tokens = TOKEN.findall(unicodedata.normalize("NFC", text).lower())
+    return sorted({
+        zlib.crc32(" ".join(tokens[i:i + shingle_size]).encode("utf-8"))
+        for i in range(len(tokens) - shingle_size + 1)
+    })
+
+
+class NearDuplicateIndex:
+    """Thread-safe MinHash LSH index of canonical pages, persisted as JSON."""
+
+    def __init__(self, path: Optional[str] = None, threshold: float = 0.8, num_perm: int = 128,
+                 bands: int = 16, shingle_size: int = 5, min_shingles: int = 10, seed: int = 1):
+        """
+        Args:
+            path: JSON file the signatures are loaded from and saved to (None = in memory only)
+            threshold: Estimated Jaccard similarity from which a page is a duplicate
+            num_perm: MinHash values per signature
+            bands: LSH bands (num_perm must be a multiple); more bands find less similar candidates
+            shingle_size: Words per shingle
+            min_shingles: Pages with fewer shingles are too short to judge and are never flagged
+            seed: Seed of the hash functions (signatures are only comparable with the same seed)
+        """
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.path = path
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.min_shingles = min_shingles
+        self.seed = seed
+        rng = random.Random(seed)
+        # a, b < 2^32 and shingle hashes < 2^32 keep a·x + b below 2^64, so the numpy path is exact
+        self._perms = [(rng.randrange(1, MAX_HASH), rng.randrange(0, MAX_HASH)) for _ in range(num_perm)]
+        if HAS_NUMPY:
+            self._a = np.array([a for a, _ in self._perms], dtype=np.uint64)[:, None]
+            self._b = np.array([b for _, b in self._perms], dtype=np.uint64)[:, None]
+        self._lock = threading.Lock()
+        self._signatures: Dict[str, bytes] = {}
+        self._buckets: Dict[Tuple[int, bytes], List[str]] = {}
+        self.duplicates = 0
+        if path:
+            self._load()
+
+    def _params(self) -> Dict:
+        return {"num_perm": self.num_perm, "bands": self.bands, "shingle_size": self.shingle_size, "seed": self.seed}
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (IOError, ValueError) as e:
+            logger.warning(f"Could not load near-duplicate signatures from {self.path}: {e}")
+            return
+        if data.get("params") != self._params():
+            logger.warning(f"Near-duplicate signatures in {self.path} use other parameters; starting over")
+            return
+        for url, signature in data["pages"].items():
+            self._add(url, base64.b64decode(signature))
+        logger.info(f"Loaded near-duplicate signatures of {len(self._signatures)} pages from {self.path}")
+
+    def save(self) -> None:
+        """Writes the signatures atomically (temp file + rename)."""
+        if not self.path:
+            return
+        with self._lock:
+            pages = {url: base64.b64encode(signature).decode("ascii") for url, signature in self._signatures.items()}
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"params": self._params(), "pages": pages}, f)
+            os.replace(tmp_path, self.path)
+            logger.info(f"Near-duplicates: {self.duplicates} pages flagged this run, "
+                        f"{len(pages)} canonical pages saved to {self.path}")
+        except IOError as e:
+            logger.error(f"Failed to save near-duplicate signatures to {self.path}: {e}")
+
+    def signature(self, hashes: List[int]) -> bytes:
+        """Returns the MinHash signature of a shingle hash set, as num_perm little-endian uint32."""
+        if HAS_NUMPY:
+            values = (self._a * np.array(hashes, dtype=np.uint64) + self._b) % MERSENNE_PRIME & MAX_HASH
+            return values.min(axis=1).astype("<u4").tobytes()
+        signature = array("I", (min(((a * x + b) % MERSENNE_PRIME) & MAX_HASH for x in hashes)
+                                for a, b in self._perms))
+        if sys.byteorder == "big":
+            signature.byteswap()
+        return signature.tobytes()
+
+    def similarity(self, first: bytes, second: bytes) -> float:
+        """Estimated Jaccard similarity of two signatures."""
+        return sum(1 for x, y in zip(array("I", first), array("I", second)) if x == y) / self.num_perm
+
+    def _band_keys(self, signature: bytes) -> List[Tuple[int, bytes]]:
+        width = self.rows * 4
+        return [(band, signature[band * width:(band + 1) * width]) for band in range(self.bands)]
+
+    def _add(self, url: str, signature: bytes) -> None:
+        self._signatures[url] = signature
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, []).append(url)
+
+    def _remove(self, url: str) -> None:
+        signature = self._signatures.pop(url, None)
+        if signature is None:
+            return
+        for key in self._band_keys(signature):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.remove(url)
+                if not bucket:
+                    del self._buckets[key]
+
+    def check(self, url: str, text: str) -> Optional[Tuple[str, float]]:
+        """
+        Checks a page against the canonical pages, and registers it as canonical if it is not a duplicate.
+
+        A URL that is already known (a re-crawl) is compared with the other
+        pages only, and its signature is replaced.
+
+        Args:
+            url: Page URL
+            text: Extracted page text
+
+        Returns:
+            (canonical URL, estimated similarity) if the page is a near-duplicate, else None
+        """
+        hashes = shingle_hashes(text, self.shingle_size)
+        signature = self.signature(hashes) if len(hashes) >= self.min_shingles else None
+        with self._lock:
+            self._remove(url)
+            if signature is None:
+                return None
+            best = None
+            seen = set()
+            for key in self._band_keys(signature):
+                for other in self._buckets.get(key, ()):
+                    if other in seen:
+                        continue
+                    seen.add(other)
+                    similarity = self.similarity(signature, self._signatures[other])
+                    if similarity >= self.threshold and (best is None or similarity > best[1]):
+                        best = (other, similarity)
+            if best is not None:
+                self.duplicates += 1
+                return best
+            self._add(url, signature)
+            return None
+
+    def __len__(self) -> int:
+        return len(self._signatures)
@@ -0,0 +1,460 @@
+"""
+Text and table extraction from the PDFs downloaded by crawl_khung_ctdt.
+
+The curriculum frameworks are only published as PDFs, so this stage turns
+each downloaded PDF into a page directory like the ones multi-crawler writes:
+a ``content.txt`` in the same block format (``content_extractor.format_block``)
+and a ``metadata.json``. The QA side can then read PDFs and HTML pages the
+same way.
+
+Extraction is CPU bound, so it runs in a process pool sized to the cores.
+Results are cached by the SHA-256 of the PDF, so a re-run only extracts new or
+changed files. A PDF linked from several pages is extracted once. Every file
+is logged with its timing, and the run ends with the overall pages/sec.
+
+Backends:
+
+- ``pdfplumber`` (if installed): text, plus tables detected from ruling lines
+- ``pypdf``: layout-preserving text; runs of lines split into aligned columns
+  are emitted as table rows
+
+Usage:
+    python pdf_text.py downloaded_pdfs/pdf_listing.json -o crawled_data
+    python pdf_text.py --pdf-dir some_pdfs/ -o crawled_data -w 4
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import unquote, urlparse
+
+from content_extractor import ContentBlock, format_block
+from downloader import file_sha256
+
+try:
+    import pdfplumber
+    HAS_PDFPLUMBER = True
+except ImportError:
+    HAS_PDFPLUMBER = False
+
+try:
+    from pypdf import PdfReader
+    HAS_PYPDF = True
+except ImportError:
+    HAS_PYPDF = False
+
+logger = logging.getLogger("pdf_text")
+
+# Bump when the block output changes, so cached results are extracted again
+EXTRACTOR_VERSION = 1
+
+# In layout text, columns of a table are separated by runs of 3+ spaces
+COLUMN_GAP = re.compile(r" {3,}")
+BULLETS = ("•", "-", "+", "*", "–")
+MAX_HEADING_LENGTH = 120
+
+
+def default_backend() -> Optional[str]:
+    """Returns the best installed extraction backend, or None if there is none."""
+    if HAS_PDFPLUMBER:
+        return "pdfplumber"
+    if HAS_PYPDF:
+        return "pypdf"
+    return None
+
+
+def _clean(text: str) -> str:
+    return " ".join(text.split())
+
+
+def _is_heading(line: str) -> bool:
+    # Section titles of the frameworks are written in capitals, e.g. "PHẦN II: KHUNG CHƯƠNG TRÌNH"
+    letters = [c for c in line if c.isalpha()]
+    return len(line) <= MAX_HEADING_LENGTH and len(letters) >= 3 and line == line.upper()
+
+
+def layout_blocks(text: str) -> Iterator[ContentBlock]:
+    """
+    Splits the layout text of one page into content blocks.
+
+    Consecutive lines are joined into a paragraph until a blank line. Two or
+    more consecutive lines that split into aligned columns become a table.
+    Short lines written in capitals become headings. Lines holding only a page
+    number are dropped.
+
+    Args:
+        text: Page text extracted with the layout preserved
+
+    Yields:
+        ContentBlock records of the page
+    """
+    paragraph: List[str] = []
+    rows: List[List[str]] = []
+
+    def flush_paragraph() -> Iterator[ContentBlock]:
+        if paragraph:
+            yield ContentBlock("paragraph", " ".join(paragraph))
+            paragraph.clear()
+
+    def flush_rows() -> Iterator[ContentBlock]:
+        if len(rows) >= 2:
+            yield ContentBlock("table")
+            for cells in rows:
+                yield ContentBlock("table_row", "\t".join(cells), cells=tuple(cells))
+        else:
+            # A single line with wide gaps is just spaced-out text
+            paragraph.extend(_clean(" ".join(cells)) for cells in rows)
+        rows.clear()
+
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            yield from flush_rows()
+            yield from flush_paragraph()
+            continue
+        if line.isdigit() and len(line) <= 4:
+            continue
+
+        cells = [_clean(cell) for cell in COLUMN_GAP.split(line)]
+        if len(cells) >= 2 and not line.startswith(BULLETS):
+            if not rows:
+                yield from flush_paragraph()
+            rows.append(cells)
+            continue
+
+        yield from flush_rows()
+        line = _clean(line)
+        if _is_heading(line):
+            yield from flush_paragraph()
+            yield ContentBlock("heading", line, level=2)
+        else:
+            paragraph.append(line)
+
+    yield from flush_rows()
+    yield from flush_paragraph()
+
+
+def _pypdf_pages(path: str) -> Iterator[List[ContentBlock]]:
+    reader = PdfReader(path)
+    for page in reader.pages:
+        yield list(layout_blocks(page.extract_text(extraction_mode="layout") or ""))
+
+
+def _pdfplumber_pages(path: str) -> Iterator[List[ContentBlock]]:
+    with pdfplumber.open(path) as pdf:
+        for page in pdf.pages:
+            tables = page.find_tables()
+            text_page = page
+            for table in tables:
+                text_page = text_page.outside_bbox(table.bbox)
+            blocks = list(layout_blocks(text_page.extract_text(layout=True) or ""))
+            for table in tables:
+                rows = [[_clean(cell or "") for cell in row] for row in table.extract()]
+                blocks.append(ContentBlock("table"))
+                blocks.extend(ContentBlock("table_row", "\t".join(cells), cells=tuple(cells))
+                              for cells in rows if any(cells))
+            yield blocks
+
+
+def extract_pdf(path: str, backend: Optional[str] = None) -> Dict:
+    """
+    Extracts the content blocks of a PDF and renders them as content.txt text.
+
+    Runs in a worker process, so it only takes and returns picklable values.
+
+    Args:
+        path: PDF file
+        backend: "pdfplumber" or "pypdf" (default: the best installed one)
+
+    Returns:
+        Dict with the content text, page/table counts, backend and seconds spent
+    """
+    start = time.perf_counter()
+    backend = backend or default_backend()
+    if backend == "pdfplumber":
+        pages = _pdfplumber_pages(path)
+    elif backend == "pypdf":
+        pages = _pypdf_pages(path)
+    else:
+        raise RuntimeError("No PDF backend installed (pip install pypdf or pdfplumber)")
+
+    parts = []
+    page_count = table_count = 0
+    for blocks in pages:
+        page_count += 1
+        for block in blocks:
+            table_count += block.kind == "table"
+            parts.append(format_block(block))
+
+    return {
+        "content": "".join(parts),
+        "pages": page_count,
+        "tables": table_count,
+        "backend": backend,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+class TextCache:
+    """Extraction results keyed by PDF SHA-256: ``<dir>/<sha[:2]>/<sha>.txt`` plus a JSON index."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.index_file = os.path.join(directory, "index.json")
+        self.index: Dict[str, Dict] = {}
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, "r", encoding="utf-8") as f:
+                    self.index = json.load(f)
+            except (IOError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable PDF text cache index {self.index_file}: {e}")
+
+    def text_path(self, sha256: str) -> str:
+        return os.path.join(self.directory, sha256[:2], f"{sha256}.txt")
+
+    def get(self, sha256: str, backend: str) -> Optional[Dict]:
+        """Returns the cached result of a PDF (with its content), or None if it must be extracted."""
+        info = self.index.get(sha256)
+        if not info or info.get("version") != EXTRACTOR_VERSION or info.get("backend") != backend:
+            return None
+        try:
+            with open(self.text_path(sha256), "r", encoding="utf-8") as f:
+                return {**info, "content": f.read()}
+        except IOError:
+            return None
+
+    def put(self, sha256: str, result: Dict) -> None:
+        path = self.text_path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(result["content"])
+        self.index[sha256] = {
+            "version": EXTRACTOR_VERSION,
+            "backend": result["backend"],
+            "pages": result["pages"],
+            "tables": result["tables"],
+            "seconds": round(result["seconds"], 3),
+        }
+
+    def save(self) -> None:
+        tmp_file = f"{self.index_file}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(tmp_file, self.index_file)
+
+
+def load_listing(listing_file: str) -> List[Dict]:
+    """
+    Reads the pdf_listing.json written by crawl_khung_ctdt.
+
+    crawl_khung_ctdt writes paths relative to the listing file; older listings
+    have paths relative to the directory the crawler ran in. Each document's
+    file is the first existing one of: its file path, its blob path, then
+    those two (if relative) joined to the directory of the listing.
+
+    Returns:
+        Documents with url, title, page_url, file and sha256
+    """
+    with open(listing_file, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    base = os.path.dirname(os.path.abspath(listing_file))
+    documents = []
+    for entry in entries:
+        paths = [path for path in (entry.get("file"), entry.get("blob")) if path]
+        candidates = paths + [os.path.join(base, path) for path in paths if not os.path.isabs(path)]
+        path = next((path for path in candidates if os.path.exists(path)), paths[0] if paths else None)
+        documents.append({**entry, "file": path})
+    return documents
+
+
+def scan_pdf_dir(directory: str) -> List[Dict]:
+    """Lists the PDFs of a directory (not recursive) as documents."""
+    documents = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if name.lower().endswith(".pdf") and os.path.isfile(path):
+            documents.append({
+                "url": f"file://{os.path.abspath(path)}",
+                "title": os.path.splitext(name)[0],
+                "page_url": None,
+                "file": path,
+            })
+    return documents
+
+
+def document_dir_name(url: str) -> str:
+    """Returns the page directory name of a PDF, like multi-crawler's sanitize_filename."""
+    parsed = urlparse(url)
+    name = unquote(parsed.path).strip("/").replace("/", "_").replace("\\", "_")
+    name = re.sub(r"[^\w.\-]+", "_", name).strip("_")
+    return (name or parsed.netloc)[:200]
+
+
+def write_document(document: Dict, result: Dict, output_dir: str) -> bool:
+    """
+    Writes content.txt and metadata.json of an extracted PDF.
+
+    The document title (the link text) is written as the first heading; the
+    cached text is shared by every copy of the PDF, whatever its title.
+
+    Args:
+        document: Document from the listing
+        result: Extraction result
+        output_dir: Crawl output directory (same layout as multi-crawler)
+
+    Returns:
+        Whether content.txt changed
+    """
+    page_dir = os.path.join(output_dir, document_dir_name(document["url"]))
+    os.makedirs(page_dir, exist_ok=True)
+    content_file = os.path.join(page_dir, "content.txt")
+    title = document.get("title") or os.path.basename(document["file"])
+    content = format_block(ContentBlock("heading", title, level=1)) + result["content"]
+
+    changed = True
+    if os.path.exists(content_file):
+        with open(content_file, "r", encoding="utf-8") as f:
+            changed = f.read() != content
+    if changed:
+        with open(content_file, "w", encoding="utf-8") as f:
+            f.write(content)
+
+    metadata = {
+        "url": document["url"],
+        "title": title,
+        "crawl_date": datetime.now().isoformat(),
+        "content_file": content_file,
+        "image_files": [],
+        "changed": changed,
+        "source": "pdf",
+        "page_url": document.get("page_url"),
+        "pdf_file": document["file"],
+        "sha256": document["sha256"],
+        "pages": result["pages"],
+        "tables": result["tables"],
+    }
+    with open(os.path.join(page_dir, "metadata.json"), "w", encoding="utf-8") as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
+    return changed
+
+
+def extract_documents(documents: List[Dict], output_dir: str, cache_dir: Optional[str] = None,
+                      workers: Optional[int] = None, backend: Optional[str] = None) -> Dict:
+    """
+    Extracts a set of PDFs in a process pool, reusing cached results.
+
+    Args:
+        documents: Documents from load_listing or scan_pdf_dir
+        output_dir: Crawl output directory for the content.txt/metadata.json directories
+        cache_dir: Directory of the text cache (default: <output_dir>/pdf_text_cache)
+        workers: Worker processes (default: number of cores)
+        backend: Extraction backend (default: the best installed one)
+
+    Returns:
+        Summary counts and timings
+    """
+    backend = backend or default_backend()
+    if backend is None:
+        raise RuntimeError("No PDF backend installed (pip install pypdf or pdfplumber)")
+    cache = TextCache(cache_dir or os.path.join(output_dir, "pdf_text_cache"))
+    workers = workers or os.cpu_count() or 1
+
+    # Group the documents by content hash: each distinct PDF is extracted once
+    by_hash: Dict[str, List[Dict]] = {}
+    for document in documents:
+        if not document.get("file") or not os.path.exists(document["file"]):
+            logger.warning(f"PDF file not found, skipping: {document.get('file')} ({document['url']})")
+            continue
+        document["sha256"] = document.get("sha256") or file_sha256(document["file"])
+        by_hash.setdefault(document["sha256"], []).append(document)
+
+    stats = {"documents": 0, "extracted": 0, "cached": 0, "failed": 0, "changed": 0,
+             "pages": 0, "cpu_seconds": 0.0}
+    start = time.perf_counter()
+
+    def finish(sha256: str, result: Dict) -> None:
+        for document in by_hash[sha256]:
+            stats["documents"] += 1
+            stats["changed"] += write_document(document, result, output_dir)
+
+    to_extract = []
+    for sha256 in by_hash:
+        cached = cache.get(sha256, backend)
+        if cached is not None:
+            stats["cached"] += 1
+            finish(sha256, cached)
+        else:
+            to_extract.append(sha256)
+    logger.info(f"{len(by_hash)} distinct PDFs: {stats['cached']} cached, "
+                f"{len(to_extract)} to extract with {backend} on {workers} processes")
+
+    if to_extract:
+        with ProcessPoolExecutor(max_workers=min(workers, len(to_extract))) as pool:
+            futures = {
+                pool.submit(extract_pdf, by_hash[sha256][0]["file"], backend): sha256
+                for sha256 in to_extract
+            }
+            for future in as_completed(futures):
+                sha256 = futures[future]
+                path = by_hash[sha256][0]["file"]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    stats["failed"] += 1
+                    logger.error(f"Failed to extract {path}: {e}")
+                    continue
+                stats["extracted"] += 1
+                stats["pages"] += result["pages"]
+                stats["cpu_seconds"] += result["seconds"]
+                rate = result["pages"] / result["seconds"] if result["seconds"] else 0.0
+                logger.info(f"Extracted {os.path.basename(path)}: {result['pages']} pages, "
+                            f"{result['tables']} tables in {result['seconds']:.2f}s ({rate:.1f} pages/s)")
+                cache.put(sha256, result)
+                finish(sha256, result)
+        cache.save()
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["pages_per_second"] = stats["pages"] / stats["seconds"] if stats["seconds"] else 0.0
+    logger.info(f"Extracted {stats['pages']} pages from {stats['extracted']} PDFs in {stats['seconds']:.1f}s "
+                f"({stats['pages_per_second']:.1f} pages/s, {stats['cpu_seconds']:.1f} CPU s); "
+                f"{stats['cached']} from cache, {stats['failed']} failed, "
+                f"{stats['changed']}/{stats['documents']} content files changed")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract text and tables from downloaded PDFs into content.txt.")
+    parser.add_argument("listings", nargs="*", help="pdf_listing.json files written by crawl_khung_ctdt")
+    parser.add_argument("--pdf-dir", action="append", default=[], help="Directory of PDF files to extract")
+    parser.add_argument("-o", "--output-dir", default="crawled_data",
+                        help="Output directory, same layout as multi-crawler (default: crawled_data)")
+    parser.add_argument("--cache-dir", default=None,
+                        help="Text cache directory (default: <output-dir>/pdf_text_cache)")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="Worker processes (default: number of cores)")
+    parser.add_argument("--backend", choices=["pdfplumber", "pypdf"], default=None,
+                        help="Extraction backend (default: pdfplumber if installed, otherwise pypdf)")
+    args = parser.parse_args()
+
+    documents = []
+    for listing_file in args.listings:
+        documents.extend(load_listing(listing_file))
+    for directory in args.pdf_dir:
+        documents.extend(scan_pdf_dir(directory))
+    if not documents:
+        parser.error("no PDFs given (pass a pdf_listing.json or --pdf-dir)")
+
+    extract_documents(documents, args.output_dir, args.cache_dir, args.workers, args.backend)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    # pypdf warns about every font it cannot fully decode
+    logging.getLogger("pypdf").setLevel(logging.ERROR)
+    main()
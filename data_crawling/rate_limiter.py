@@ -0,0 +1,220 @@
+"""
+Adaptive per-host request rate limiting.
+
+Every HTTP request sent through the shared ``http_client`` session takes a
+token from the bucket of its host before it goes out, whichever thread or
+script sends it. The refill rate of each bucket adapts to the server:
+
+- additive increase: every successful response raises the rate a little;
+- multiplicative decrease: a 429/503 (or a timeout / connection error)
+  halves it, at most once per cooldown so a burst of throttled in-flight
+  requests counts once;
+- ``Retry-After`` blocks the host until the given time;
+- latency growth: when the smoothed response time grows well above the best
+  one seen, the rate is lowered before the server starts refusing requests.
+
+``AdaptiveRateLimiter.snapshot()`` exposes the current rate of every host.
+
+``ByteRateLimiter`` caps the total bandwidth of a group of downloads.
+"""
+import logging
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+logger = logging.getLogger("rate_limiter")
+
+THROTTLE_STATUSES = (429, 503)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parses a Retry-After header value.
+
+    Args:
+        value: Seconds or an HTTP date
+
+    Returns:
+        Seconds to wait, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class HostBucket:
+    """Token bucket of one host with an AIMD-controlled refill rate."""
+
+    def __init__(self, host: str, rate: float, min_rate: float, max_rate: float, burst: float):
+        self.host = host
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.last_decrease = 0.0
+        self.latency = None  # smoothed response time
+        self.best_latency = None
+        self.requests = 0
+        self.throttled = 0
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Takes a token and returns how long the caller must wait before sending."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Tokens may go negative: each waiting caller reserves the next free slot
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.requests += 1
+            return max(wait, self.blocked_until - now)
+
+    def _decrease(self, now: float, factor: float, cooldown: float, reason: str) -> None:
+        if now - self.last_decrease < cooldown:
+            return
+        self.last_decrease = now
+        self.rate = max(self.min_rate, self.rate * factor)
+        self.tokens = min(self.tokens, 0.0)
+        logger.info(f"Rate for {self.host} lowered to {self.rate:.2f} req/s ({reason})")
+
+
+class AdaptiveRateLimiter:
+    """Process-wide set of per-host token buckets shared by all worker threads."""
+
+    def __init__(self, initial_rate: float = 2.0, min_rate: float = 0.2, max_rate: float = 10.0,
+                 burst: float = 2.0, increase: float = 0.05, decrease_factor: float = 0.5,
+                 latency_factor: float = 2.5, cooldown: float = 2.0):
+        """
+        Args:
+            initial_rate: Requests per second allowed to a host before any feedback
+            min_rate: Lowest rate the limiter backs off to
+            max_rate: Highest rate it ever ramps up to
+            burst: Bucket capacity (requests that may go out back to back)
+            increase: Rate added after each successful response
+            decrease_factor: Rate multiplier applied on 429/503 and errors
+            latency_factor: Smoothed latency above this multiple of the best one lowers the rate
+            cooldown: Minimum seconds between two decreases of a host's rate
+        """
+        self.initial_rate = min(max(initial_rate, min_rate), max_rate)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.latency_factor = latency_factor
+        self.cooldown = cooldown
+        self._buckets: Dict[str, HostBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host: str) -> HostBucket:
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = HostBucket(
+                    host, self.initial_rate, self.min_rate, self.max_rate, self.burst)
+            return bucket
+
+    def acquire(self, host: str) -> float:
+        """
+        Blocks until a request to the host may be sent.
+
+        Args:
+            host: Host name
+
+        Returns:
+            Seconds waited
+        """
+        wait = self.bucket(host).reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def record(self, host: str, status: Optional[int], latency: float,
+               retry_after: Optional[str] = None) -> None:
+        """
+        Feeds the outcome of a request back into the host's rate.
+
+        Args:
+            host: Host name
+            status: HTTP status code, or None if the request failed (timeout, connection error)
+            latency: Seconds until the response headers arrived
+            retry_after: Retry-After header of the response
+        """
+        bucket = self.bucket(host)
+        with bucket.lock:
+            now = time.monotonic()
+            delay = parse_retry_after(retry_after)
+            if delay:
+                bucket.blocked_until = max(bucket.blocked_until, now + delay)
+
+            if status is None or status in THROTTLE_STATUSES:
+                bucket.throttled += 1
+                reason = f"HTTP {status}" if status else "request error"
+                bucket._decrease(now, self.decrease_factor, self.cooldown, reason)
+                return
+
+            bucket.latency = latency if bucket.latency is None else 0.8 * bucket.latency + 0.2 * latency
+            if bucket.best_latency is None or bucket.latency < bucket.best_latency:
+                bucket.best_latency = bucket.latency
+            if bucket.latency > self.latency_factor * bucket.best_latency and bucket.best_latency > 0.05:
+                bucket._decrease(now, 0.8, self.cooldown, f"latency {bucket.latency:.2f}s")
+            elif bucket.rate < bucket.max_rate:
+                bucket.rate = min(bucket.max_rate, bucket.rate + self.increase)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Returns the current rate and counters of every host."""
+        with self._lock:
+            buckets = list(self._buckets.values())
+        return {
+            bucket.host: {
+                "rate": round(bucket.rate, 3),
+                "requests": bucket.requests,
+                "throttled": bucket.throttled,
+                "latency": round(bucket.latency, 3) if bucket.latency is not None else None,
+            }
+            for bucket in buckets
+        }
+
+    def summary(self) -> str:
+        return ", ".join(
+            f"{host}: {stats['rate']:.2f} req/s ({stats['requests']} requests, {stats['throttled']} throttled)"
+            for host, stats in self.snapshot().items()
+        ) or "no requests"
+
+
+class ByteRateLimiter:
+    """Token bucket of bytes shared by concurrent downloads to cap their total bandwidth."""
+
+    def __init__(self, bytes_per_second: float, burst: Optional[float] = None):
+        """
+        Args:
+            bytes_per_second: Total download rate allowed
+            burst: Bucket capacity in bytes (one second worth by default)
+        """
+        self.rate = bytes_per_second
+        self.burst = burst or bytes_per_second
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, size: int) -> None:
+        """Blocks until ``size`` bytes may be read."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= size
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
@@ -0,0 +1,28 @@
+"""
+The crawler scripts import each other as top-level modules (they are run from
+data_crawling/), so the tests put that directory on sys.path.
+"""
+import importlib.util
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+DATA_CRAWLING = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(DATA_CRAWLING))
+
+
+@pytest.fixture(scope="session")
+def crawler(tmp_path_factory):
+    """multi-crawler.py as a module (not importable by name because of the hyphen)."""
+    # The module opens crawler.log in the working directory when imported
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("crawler"))
+    try:
+        spec = importlib.util.spec_from_file_location("multi_crawler", DATA_CRAWLING / "multi-crawler.py")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        os.chdir(cwd)
+    return module
@@ -0,0 +1,77 @@
+import json
+
+from bs4 import BeautifulSoup
+
+from boilerplate import BoilerplateFilter, BoilerplateLearner, crawled_urls, sample_per_site
+from content_extractor import iter_content_blocks
+
+SITE = "https://hus.vnu.edu.vn"
+FOOTER = "Địa chỉ: 334 Nguyễn Trãi, Thanh Xuân, Hà Nội"
+
+
+def page(number, extra=""):
+    return f"""<html><body>
+    <div class="skin"><p class="contact">{FOOTER}</p><p>Chia sẻ</p></div>
+    <div class="article"><h2>Bài viết {number}</h2><p>Nội dung riêng của bài {number}.</p>{extra}</div>
+    </body></html>"""
+
+
+def blocks_of(html, url):
+    return list(iter_content_blocks(BeautifulSoup(html, "html.parser").body, url, dom_paths=True))
+
+
+def learn(pages=12, min_pages=10):
+    learner = BoilerplateLearner(threshold=0.6, min_pages=min_pages)
+    for number in range(pages):
+        url = f"{SITE}/tin-{number}.html"
+        learner.observe(url, blocks_of(page(number), url))
+    return learner.build()
+
+
+def test_learner_finds_template_blocks():
+    sites = learn()
+    assert sites["hus.vnu.edu.vn"]["pages"] == 12
+    # The footer contact line and the share row, not the articles
+    assert len(sites["hus.vnu.edu.vn"]["keys"]) == 2
+    assert learn(pages=5) == {}
+
+
+def test_filter_drops_template_blocks_only(crawler, tmp_path):
+    path = str(tmp_path / "boilerplate.json")
+    BoilerplateFilter.save(path, learn(), 0.6)
+    boilerplate = BoilerplateFilter(path)
+    assert len(boilerplate) == 1 and boilerplate.threshold == 0.6
+    assert boilerplate.keys_for("https://other.vnu.edu.vn/a.html") is None
+
+    config = dict(crawler.DEFAULT_CONFIG, boilerplate_filter=boilerplate)
+    # The same text quoted inside an article has another DOM path and is kept
+    html = page(99, extra=f"<p>{FOOTER}</p>")
+    blocks, _ = crawler.collect_blocks(BeautifulSoup(html, "html.parser"), f"{SITE}/tin-99.html", config)
+    assert [block.text for block in blocks] == ["Bài viết 99", "Nội dung riêng của bài 99.", FOOTER]
+    assert (boilerplate.pages, boilerplate.blocks_removed) == (1, 2)
+
+
+def test_save_keeps_other_sites(tmp_path):
+    path = str(tmp_path / "boilerplate.json")
+    BoilerplateFilter.save(path, {"a.vnu.edu.vn": {"pages": 10, "keys": [1, 2]}}, 0.6)
+    BoilerplateFilter.save(path, {"b.vnu.edu.vn": {"pages": 20, "keys": [3]}}, 0.7)
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    assert data["threshold"] == 0.7
+    assert data["sites"]["a.vnu.edu.vn"]["keys"] == [f"{1:016x}", f"{2:016x}"]
+    assert BoilerplateFilter(path).keys_for("https://b.vnu.edu.vn/x.html") == frozenset({3})
+
+
+def test_crawled_urls_skips_near_duplicates(tmp_path):
+    for name, metadata in [("a", {"url": f"{SITE}/a.html"}),
+                           ("b", {"url": f"{SITE}/b.html", "duplicate_of": f"{SITE}/a.html"})]:
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "metadata.json").write_text(json.dumps(metadata), encoding="utf-8")
+    assert crawled_urls(str(tmp_path)) == [f"{SITE}/a.html"]
+
+
+def test_sample_per_site():
+    urls = [f"{SITE}/{i}.html" for i in range(50)] + ["https://other.vnu.edu.vn/x.html"] * 3
+    picked = sample_per_site(urls, 10)
+    assert len(picked) == 11 and len(set(picked)) == 11
+    assert sample_per_site(urls, 10) == picked
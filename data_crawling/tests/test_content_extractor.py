@@ -0,0 +1,97 @@
+from bs4 import BeautifulSoup
+
+from content_extractor import ContentBlock, format_block, iter_content_blocks
+
+PAGE = """<html><body>
+<h1>Giới thiệu</h1>
+<p>Trường Đại học <b>Khoa học</b> Tự nhiên</p>
+<div class="ads"><p>Quảng cáo</p></div>
+<h2>Lịch sử</h2>
+<table>
+  <tr><th>Năm</th><th>Sự kiện</th></tr>
+  <tr><td>1956</td><td><p>Thành lập</p><img src="/img/1956.jpg"></td></tr>
+  <tr><td></td><td></td></tr>
+</table>
+<p>   </p>
+<img src="https://hus.vnu.edu.vn/logo.png">
+</body></html>"""
+
+
+def blocks(**kwargs):
+    soup = BeautifulSoup(PAGE, "html.parser")
+    return list(iter_content_blocks(soup.body, "https://hus.vnu.edu.vn/gioi-thieu.html", **kwargs))
+
+
+def test_blocks_in_document_order():
+    assert [(block.kind, block.text) for block in blocks()] == [
+        ("heading", "Giới thiệu"),
+        ("paragraph", "Trường Đại họcKhoa họcTự nhiên"),
+        ("paragraph", "Quảng cáo"),
+        ("heading", "Lịch sử"),
+        ("table", ""),
+        ("table_row", "Năm\tSự kiện"),
+        ("table_row", "1956\tThành lập"),
+        # Images inside a table follow its rows
+        ("image", "https://hus.vnu.edu.vn/img/1956.jpg"),
+        ("image", "https://hus.vnu.edu.vn/logo.png"),
+    ]
+
+
+def test_heading_paths_and_tables():
+    rows = [block for block in blocks() if block.kind == "table_row"]
+    assert rows[1].cells == ("1956", "Thành lập")
+    assert {block.table for block in rows} == {1}
+    assert rows[0].heading_path == ("Giới thiệu", "Lịch sử")
+
+
+def test_skip_and_dom_paths():
+    skipped = blocks(skip=lambda tag: "ads" in (tag.get("class") or []), dom_paths=True)
+    assert "Quảng cáo" not in [block.text for block in skipped]
+    assert skipped[0].dom_path == "h1"
+    assert skipped[-1].dom_path == "img"
+
+
+def test_format_block():
+    assert format_block(ContentBlock("heading", "Lịch sử", level=2)) == "Tiêu đề: Lịch sử\n"
+    assert format_block(ContentBlock("paragraph", "Nội dung")) == "Nội dung\n"
+    assert format_block(ContentBlock("table", table=1)) == "\n"
+    assert format_block(ContentBlock("table_row", "a\tb", cells=("a", "b"))) == "a\tb\n"
+    assert format_block(ContentBlock("image", "https://hus.vnu.edu.vn/a.jpg")) == "🖼️ Ảnh: https://hus.vnu.edu.vn/a.jpg\n"
+
+
+def kinds_and_texts(html):
+    soup = BeautifulSoup(html, "html.parser")
+    return [(block.kind, block.text) for block in iter_content_blocks(soup, "https://hus.vnu.edu.vn/")]
+
+
+def test_inline_images_follow_their_text():
+    assert kinds_and_texts('<p>Caption <img src="/a.jpg"> tail</p>') == [
+        ("paragraph", "Captiontail"),
+        ("image", "https://hus.vnu.edu.vn/a.jpg"),
+    ]
+    assert kinds_and_texts('<h2>Sơ đồ <img src="/b.png"></h2><p>Nội dung</p>') == [
+        ("heading", "Sơ đồ"),
+        ("image", "https://hus.vnu.edu.vn/b.png"),
+        ("paragraph", "Nội dung"),
+    ]
+    # Inside a table the heading and its image still come after the rows, in that order
+    assert kinds_and_texts('<table><tr><td><h3>H <img src="/i.png"></h3></td><td>v</td></tr></table>') == [
+        ("table", ""),
+        ("table_row", "H\tv"),
+        ("heading", "H"),
+        ("image", "https://hus.vnu.edu.vn/i.png"),
+    ]
+
+
+def test_nested_table_is_part_of_the_outer_cell():
+    html = ("<table><tr><td>A</td><td><table><tr><td>x</td><td>y</td></tr></table></td></tr>"
+            "<tr><td>B</td><td>C</td></tr></table><p>sau</p>")
+    soup = BeautifulSoup(html, "html.parser")
+    result = list(iter_content_blocks(soup, "https://hus.vnu.edu.vn/"))
+    assert [(block.kind, block.text) for block in result] == [
+        ("table", ""),
+        ("table_row", "A\txy"),
+        ("table_row", "B\tC"),
+        ("paragraph", "sau"),
+    ]
+    assert {block.table for block in result if block.kind != "paragraph"} == {1}
@@ -0,0 +1,103 @@
+import pytest
+
+from content_extractor import ContentBlock, format_block, parse_content
+from corpus_shards import CorpusReader, ShardWriter, page_record, record_content
+from validator_store import ValidatorStore, content_hash
+
+URL = "https://hus.vnu.edu.vn/gioi-thieu/lich-su.html"
+
+BLOCKS = [
+    ContentBlock("heading", "Lịch sử", level=2),
+    ContentBlock("paragraph", "Trường được thành lập năm 1956."),
+    ContentBlock("table", table=1),
+    ContentBlock("table_row", "Năm\tSự kiện", cells=("Năm", "Sự kiện"), table=1),
+    ContentBlock("table_row", "1995\tĐổi tên", cells=("1995", "Đổi tên"), table=1),
+    ContentBlock("paragraph", "Sau bảng"),
+    ContentBlock("image", "https://hus.vnu.edu.vn/img/a.jpg"),
+    ContentBlock("table", table=2),
+    ContentBlock("table_row", "x\ty", cells=("x", "y"), table=2),
+]
+
+
+def test_parse_content_inverts_format_block():
+    text = "".join(format_block(block) for block in BLOCKS)
+    assert parse_content(text) == BLOCKS
+    assert "".join(format_block(block) for block in parse_content(text)) == text
+
+
+def test_shards_round_trip(tmp_path):
+    writer = ShardWriter(str(tmp_path), max_shard_bytes=300, arrow=False)
+    for i in range(5):
+        writer.append(page_record(f"{URL}?p={i}", f"Trang {i}", "2024-01-01T00:00:00", BLOCKS, []))
+    writer.close()
+    assert writer.shards > 1
+
+    with CorpusReader(str(tmp_path)) as reader:
+        assert len(reader) == 5
+        record = reader.get(f"{URL}?p=3")
+        assert record["title"] == "Trang 3"
+        assert parse_content(record_content(record)) == BLOCKS
+        assert reader.get(URL) is None
+
+
+def test_unclosed_shard_is_scanned(tmp_path):
+    writer = ShardWriter(str(tmp_path), arrow=False)
+    writer.append(page_record(URL, "Lịch sử", "2024-01-01T00:00:00", BLOCKS, []))
+    # No close(): the crawl was killed before the footer was written
+    writer._file.flush()
+    with CorpusReader(str(tmp_path)) as reader:
+        assert URL in reader
+
+
+def test_writer_knows_pages_of_earlier_runs(tmp_path):
+    first = ShardWriter(str(tmp_path), arrow=False)
+    first.append(page_record(URL, "Lịch sử", "2024-01-01T00:00:00", BLOCKS, []))
+    first.close()
+
+    second = ShardWriter(str(tmp_path), arrow=False)
+    assert URL in second
+    assert f"{URL}?p=1" not in second
+    second.append(page_record(f"{URL}?p=1", "", "2024-01-02T00:00:00", [], []))
+    assert f"{URL}?p=1" in second
+    second.close()
+
+
+class NotModifiedSession:
+    def __init__(self):
+        self.requests = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.requests.append(headers)
+        response = type("Response", (), {})()
+        response.status_code = 304
+        return response
+
+
+@pytest.fixture
+def shard_config(crawler, tmp_path):
+    store = ValidatorStore(str(tmp_path / "validators.json"))
+    store.update(URL, '"v1"', None, content_hash(b"page"))
+    config = dict(crawler.DEFAULT_CONFIG, validator_store=store, output_dir=str(tmp_path / "pages"))
+    writer = ShardWriter(str(tmp_path / "shards"), arrow=False)
+    writer.append(page_record(URL, "Lịch sử", "2024-01-01T00:00:00", BLOCKS, []))
+    writer.close()
+    config["shard_writer"] = ShardWriter(str(tmp_path / "shards"), arrow=False)
+    return config
+
+
+def test_shards_output_sends_validators(crawler, shard_config, monkeypatch):
+    session = NotModifiedSession()
+    monkeypatch.setattr(crawler.http_client, "get_session", lambda: session)
+
+    assert crawler.fetch_page_if_changed(URL, shard_config) == (None, False)
+    assert session.requests[-1]["If-None-Match"] == '"v1"'
+
+
+def test_validators_not_sent_for_pages_missing_from_shards(crawler, shard_config, monkeypatch):
+    session = NotModifiedSession()
+    monkeypatch.setattr(crawler.http_client, "get_session", lambda: session)
+    other = "https://hus.vnu.edu.vn/tuyen-sinh.html"
+    shard_config["validator_store"].update(other, '"v2"', None, content_hash(b"other"))
+
+    crawler.fetch_page_if_changed(other, shard_config)
+    assert "If-None-Match" not in session.requests[-1]
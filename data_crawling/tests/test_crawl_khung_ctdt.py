@@ -0,0 +1,147 @@
+import importlib
+import io
+import json
+import os
+import threading
+
+import pytest
+import requests
+
+from blob_store import BlobStore
+from pdf_text import load_listing
+
+
+@pytest.fixture
+def khung(tmp_path, monkeypatch):
+    # The module opens pdf_downloader.log in the working directory when first imported
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module("crawl_khung_ctdt")
+
+
+class FailingFrontier:
+    """Hands out one batch, then fails like a locked or corrupt frontier database."""
+
+    def lease_batches(self, queue, batch_size):
+        yield ["https://hus.vnu.edu.vn/dao-tao.html"]
+        raise RuntimeError("database is locked")
+
+    def complete(self, queue, url):
+        pass
+
+    def fail(self, queue, url, error=""):
+        pass
+
+
+def test_download_workers_stop_when_discovery_fails(khung, tmp_path, monkeypatch):
+    def find_pdf_links(url, output_folder, div_pattern, raise_errors):
+        return [{"url": f"{url}/{i}.pdf", "page_url": url, "output_path": str(tmp_path / f"{i}.pdf")}
+                for i in range(5)]
+
+    monkeypatch.setattr(khung, "find_pdf_links", find_pdf_links)
+    monkeypatch.setattr(khung, "download_pdf", lambda task, *args, **kwargs: None)
+    errors = []
+
+    def run():
+        try:
+            khung.process_url_list([], str(tmp_path / "pdfs"), frontier=FailingFrontier(),
+                                   download_workers=3, queue_size=2)
+        except RuntimeError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    # Without the stop signals the download pool would wait for its workers forever
+    assert not thread.is_alive()
+    assert [str(e) for e in errors] == ["database is locked"]
+
+
+PDF_URL = "https://hus.vnu.edu.vn/files/ctdt.pdf"
+PDF = b"%PDF-1.4\n" + b"x" * 2000 + b"\n%%EOF\n"
+
+
+class FakeSession:
+    """Answers every request with a PDF, or raises the given exception."""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.requests = 0
+
+    def get(self, url, **kwargs):
+        self.requests += 1
+        if self.error is not None:
+            raise self.error
+        response = requests.Response()
+        response.status_code = 200
+        response.headers["Content-Type"] = "application/pdf"
+        response.url = url
+        response.raw = io.BytesIO(PDF)
+        return response
+
+
+def pdf_task(tmp_path):
+    return {"url": PDF_URL, "name": "ctdt", "page_url": "https://hus.vnu.edu.vn/dao-tao.html",
+            "output_path": str(tmp_path / "ctdt.pdf")}
+
+
+def test_existing_pdf_is_adopted_without_downloading(khung, tmp_path, monkeypatch):
+    session = FakeSession(requests.exceptions.ConnectionError("offline"))
+    monkeypatch.setattr(khung.http_client, "get_session", lambda: session)
+    task = pdf_task(tmp_path)
+    with open(task["output_path"], "wb") as f:
+        f.write(PDF)
+
+    store = BlobStore(str(tmp_path / "blobs"))
+    entry = khung.download_pdf(task, store)
+    assert session.requests == 0
+    assert entry["size"] == len(PDF) and store.adopted == 1 and store.downloads == 0
+    assert store.verify(entry, store.blob_path(entry), khung.PDF_MAGIC)
+    assert store.lookup(PDF_URL) == entry
+
+
+def test_broken_file_is_kept_until_the_download_succeeds(khung, tmp_path, monkeypatch):
+    task = pdf_task(tmp_path)
+    with open(task["output_path"], "wb") as f:
+        f.write(b"<html>Not found</html>")
+    store = BlobStore(str(tmp_path / "blobs"))
+
+    monkeypatch.setattr(khung.http_client, "get_session", lambda: FakeSession(requests.exceptions.ConnectionError()))
+    with pytest.raises(requests.exceptions.ConnectionError):
+        khung.download_pdf(task, store)
+    with open(task["output_path"], "rb") as f:
+        assert f.read() == b"<html>Not found</html>"
+
+    monkeypatch.setattr(khung.http_client, "get_session", lambda: FakeSession())
+    entry = khung.download_pdf(task, store)
+    assert store.downloads == 1 and store.adopted == 0
+    with open(task["output_path"], "rb") as f:
+        assert f.read() == PDF
+    assert not list(tmp_path.glob("*.tmp"))
+    assert store.lookup(PDF_URL) == entry
+
+
+def test_listing_paths_resolve_from_any_directory(khung, tmp_path, monkeypatch):
+    output = tmp_path / "pdfs"
+    store = BlobStore(str(output / "blobs"))
+    task = pdf_task(output / "div_1")
+    (output / "div_1").mkdir(parents=True)
+    monkeypatch.setattr(khung.http_client, "get_session", lambda: FakeSession())
+    listing = []
+    entry = khung.download_pdf(task, store, listing=listing)
+    listing_file = str(output / "pdf_listing.json")
+    khung.save_pdf_listing(listing, listing_file)
+
+    with open(listing_file, encoding="utf-8") as f:
+        saved = json.load(f)[0]
+    assert saved["file"] == os.path.join("div_1", "ctdt.pdf")
+    assert saved["blob"] == os.path.join("blobs", entry["blob"])
+
+    # Run from another directory: paths are joined to the listing's directory, subfolders included
+    elsewhere = tmp_path / "elsewhere"
+    elsewhere.mkdir()
+    monkeypatch.chdir(elsewhere)
+    assert load_listing(listing_file)[0]["file"] == os.path.join(str(output), "div_1", "ctdt.pdf")
+
+    # The blob is used when the named file is gone
+    os.remove(task["output_path"])
+    assert load_listing(listing_file)[0]["file"] == os.path.join(str(output), "blobs", entry["blob"])
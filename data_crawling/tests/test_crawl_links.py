@@ -0,0 +1,58 @@
+import requests
+
+from crawl_links import discover_site
+
+BASE = "https://hus.vnu.edu.vn"
+
+PAGES = {
+    f"{BASE}/gioi-thieu.html": """
+        <div id="jquery-accordion-menu"><a href="/gioi-thieu/lich-su.html">Lịch sử</a>
+        <a href="/gioi-thieu/hong.html">Hỏng</a></div>
+        <a href="/gioi-thieu/loi-mang.html">Lỗi mạng</a>
+        <a href="https://example.com/ngoai.html">Ngoài</a>""",
+    f"{BASE}/gioi-thieu/lich-su.html": '<a href="/gioi-thieu/lich-su/chi-tiet.html">Chi tiết</a>',
+    f"{BASE}/gioi-thieu/lich-su/chi-tiet.html": "<p>Nội dung</p>",
+}
+
+
+class FakeResponse:
+    def __init__(self, url):
+        self.url = url
+        self.headers = {"Content-Type": "text/html; charset=utf-8"}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    @property
+    def text(self):
+        if self.url.endswith("hong.html"):
+            raise ValueError("broken page")
+        return PAGES.get(self.url, "")
+
+
+class FakeSession:
+    def get(self, url, **kwargs):
+        if url.endswith("loi-mang.html"):
+            raise requests.exceptions.ConnectionError("connection reset")
+        return FakeResponse(url)
+
+
+def test_discover_site_survives_failing_pages(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    output = tmp_path / "links.txt"
+
+    seen = discover_site([f"{BASE}/gioi-thieu.html"], FakeSession(), str(output), workers=2)
+
+    # Links behind a broken page are still discovered, at every depth
+    assert f"{BASE}/gioi-thieu/lich-su/chi-tiet.html" in seen
+    assert "https://example.com/ngoai.html" not in seen
+    assert set(output.read_text(encoding="utf-8").split()) == seen
+    errors = (tmp_path / "error_log.txt").read_text(encoding="utf-8")
+    assert f"{BASE}/gioi-thieu/hong.html: ValueError" in errors
+    assert f"{BASE}/gioi-thieu/loi-mang.html: ConnectionError" in errors
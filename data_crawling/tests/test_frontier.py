@@ -0,0 +1,127 @@
+
+import pytest
+
+from frontier import DONE, FAILED, IN_FLIGHT, PENDING, Frontier, canonicalize_url
+
+BASE = "https://hus.vnu.edu.vn"
+
+
+@pytest.fixture
+def frontier(tmp_path):
+    return Frontier(str(tmp_path / "frontier.sqlite"), lease_seconds=600, max_attempts=3, retry_backoff=60)
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("HTTPS://HUS.vnu.edu.vn:443/a//b/./c/../d.html#top", f"{BASE}/a/b/d.html"),
+    (f"{BASE}/list?page=2&utm_source=fb&a=1", f"{BASE}/list?a=1&page=2"),
+    ("http://hus.vnu.edu.vn:8080", "http://hus.vnu.edu.vn:8080/"),
+    ("mailto:info@hus.edu.vn", None),
+    ("javascript:void(0)", None),
+])
+def test_canonicalize_url(url, expected):
+    assert canonicalize_url(url) == expected
+
+
+def test_canonicalize_relative_url():
+    assert canonicalize_url("../b.html", f"{BASE}/x/y/a.html") == f"{BASE}/x/b.html"
+
+
+def test_add_deduplicates_equivalent_urls(frontier):
+    assert frontier.add([f"{BASE}/a.html", f"{BASE}/a.html#x", "HTTPS://hus.vnu.edu.vn/a.html"], "pages") == 1
+    assert frontier.add([f"{BASE}/a.html", f"{BASE}/b.html"], "pages") == 1
+    # Queues are independent
+    assert frontier.add([f"{BASE}/a.html"], "pdf_pages") == 1
+    assert frontier.counts("pages") == {PENDING: 2}
+
+
+def test_lease_marks_urls_in_flight(frontier):
+    frontier.add([f"{BASE}/{i}.html" for i in range(5)], "pages")
+    first = frontier.lease("pages", 3)
+    second = frontier.lease("pages", 3)
+    assert len(first) == 3 and len(second) == 2
+    assert not set(first) & set(second)
+    assert frontier.lease("pages", 3) == []
+    assert frontier.counts("pages") == {IN_FLIGHT: 5}
+
+    frontier.complete("pages", first[0])
+    assert frontier.counts("pages") == {IN_FLIGHT: 4, DONE: 1}
+
+
+def test_fail_backs_off_then_gives_up(frontier, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("frontier.time.time", lambda: now[0])
+    url = f"{BASE}/a.html"
+    frontier.add([url], "pages")
+
+    for attempt, backoff in enumerate([60, 120], 1):
+        assert frontier.lease("pages", 1) == [url]
+        frontier.fail("pages", url, "timeout")
+        assert frontier.counts("pages") == {PENDING: 1}
+        # Not eligible again until the (doubling) backoff has passed
+        now[0] += backoff - 1
+        assert frontier.lease("pages", 1) == []
+        now[0] += 1
+
+    assert frontier.lease("pages", 1) == [url]
+    frontier.fail("pages", url, "timeout")
+    assert frontier.counts("pages") == {FAILED: 1}
+
+    assert frontier.requeue("pages") == 1
+    assert frontier.lease("pages", 1) == [url]
+
+
+def test_expired_lease_is_released(frontier, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("frontier.time.time", lambda: now[0])
+    frontier.add([f"{BASE}/a.html"], "pages")
+    frontier.lease("pages", 1)
+    # Our own, live process still holds an unexpired lease
+    assert frontier.release_stale_leases("pages") == 0
+    now[0] += 601
+    assert frontier.release_stale_leases("pages") == 1
+    assert frontier.counts("pages") == {PENDING: 1}
+
+
+def test_lease_of_dead_process_is_released(frontier, monkeypatch):
+    frontier.add([f"{BASE}/a.html", f"{BASE}/b.html"], "pages")
+    frontier.lease("pages", 1)
+    monkeypatch.setattr("frontier._process_alive", lambda pid: False)
+
+    batches = list(frontier.lease_batches("pages", 10))
+    assert [sorted(batch) for batch in batches] == [[f"{BASE}/a.html", f"{BASE}/b.html"]]
+
+
+def test_requeue_revives_finished_urls(frontier):
+    frontier.add([f"{BASE}/a.html", f"{BASE}/b.html"], "pages")
+    a, b = frontier.lease("pages", 2)
+    frontier.complete("pages", a)
+    for _ in range(3):
+        frontier.fail("pages", b)
+    # Adding them again does not revive them
+    assert frontier.add([a, b], "pages") == 0
+    assert frontier.counts("pages") == {DONE: 1, FAILED: 1}
+
+    assert frontier.requeue("pages", [FAILED]) == 1
+    assert frontier.lease("pages", 2) == [b]
+    assert frontier.requeue("pages") == 1
+    assert frontier.lease("pages", 2) == [a]
+
+
+def test_crawler_requeue_flag(crawler, tmp_path, monkeypatch):
+    path = str(tmp_path / "frontier.sqlite")
+    frontier = Frontier(path)
+    frontier.add([f"{BASE}/a.html"], "pages")
+    frontier.complete("pages", frontier.lease("pages", 1)[0])
+
+    crawled = []
+    monkeypatch.setattr(crawler, "crawl_url", lambda url, config: crawled.append(url) or True)
+    monkeypatch.chdir(tmp_path)
+    argv = ["multi-crawler.py", "--frontier", path, "--output-dir", str(tmp_path / "out")]
+    monkeypatch.setattr("sys.argv", argv)
+    crawler.main()
+    assert crawled == []
+
+    monkeypatch.setattr("sys.argv", argv + ["--requeue", "done"])
+    crawler.main()
+    assert crawled == [f"{BASE}/a.html"]
+    assert Frontier(path).counts("pages") == {DONE: 1}
@@ -0,0 +1,54 @@
+import pytest
+
+import html_parsing
+from benchmark_parsers import FIXTURE_DIR, extract_text
+from html_parsing import available_backends, content_root, parse_html, parse_strained, set_default_backend
+
+FIXTURES = sorted(FIXTURE_DIR.glob("*.html"))
+
+
+@pytest.fixture(params=FIXTURES, ids=lambda path: path.stem)
+def markup(request):
+    return request.param.read_text(encoding="utf-8")
+
+
+def test_backends_extract_the_same_content(crawler, markup, monkeypatch):
+    # Keep every image candidate without probing it over the network
+    monkeypatch.setattr(crawler, "check_image_sizes", lambda img_urls, config: {url: True for url in img_urls})
+    reference = extract_text(crawler, parse_html(markup, "html.parser"))
+    strained_reference = extract_text(crawler, parse_strained(markup, "html.parser"))
+    assert reference and strained_reference
+    for backend in available_backends():
+        expected = strained_reference if backend == "strained" else reference
+        assert extract_text(crawler, parse_html(markup, backend)) == expected, backend
+
+
+def test_strained_parse_keeps_content_areas_and_title(markup):
+    soup = parse_html(markup, "strained")
+    assert soup.body is None and content_root(soup) is soup
+    assert soup.title.string == parse_html(markup, "html.parser").title.get_text().strip()
+    ids = {div["id"] for div in soup.find_all("div", id=True, recursive=False)}
+    assert ids and all(html_parsing.CONTENT_AREA_IDS.match(div_id) for div_id in ids)
+
+
+def test_strained_parse_with_explicit_restriction():
+    markup = ('<title>T</title><div id="jquery-accordion-menu"><a href="/a.html">A</a></div>'
+              '<div id="dnn_ctr1_ModuleContent"><p>x</p></div>')
+    soup = parse_strained(markup, "html.parser", only="div", only_attrs={"id": "jquery-accordion-menu"})
+    assert [a["href"] for a in soup.find_all("a")] == ["/a.html"]
+    assert soup.title is None and soup.find("p") is None
+    assert content_root(parse_strained("<p>no content area</p>", "html.parser")) is None
+
+
+def test_default_backend_override(monkeypatch):
+    monkeypatch.setenv("HUS_HTML_PARSER", "html.parser")
+    assert html_parsing.default_backend() == "html.parser"
+    set_default_backend("strained")
+    try:
+        assert html_parsing.default_backend() == "strained"
+    finally:
+        set_default_backend(None)
+    with pytest.raises(ValueError):
+        set_default_backend("html5lib")
+    with pytest.raises(ValueError):
+        parse_html("<p></p>", "html5lib")
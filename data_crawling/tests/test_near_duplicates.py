@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+import near_duplicates
+from near_duplicates import NearDuplicateIndex, shingle_hashes
+
+WORDS = ("trường đại học khoa học tự nhiên thông báo sinh viên kế hoạch đào tạo năm học học kỳ "
+         "đăng ký môn học lịch thi hội nghị nghiên cứu hợp tác quốc tế học bổng tuyển sinh").split()
+
+
+def article(seed, length=300):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+
+def edited(text, changes, seed=0):
+    words = text.split()
+    rng = random.Random(seed)
+    for position in rng.sample(range(len(words)), changes):
+        words[position] = "thaydoi"
+    return " ".join(words)
+
+
+def jaccard(first, second):
+    first, second = set(shingle_hashes(first)), set(shingle_hashes(second))
+    return len(first & second) / len(first | second)
+
+
+def test_shingle_hashes_normalize_text():
+    text = "Thông báo lịch thi học kỳ I năm học 2024"
+    assert shingle_hashes(text) == shingle_hashes("  THÔNG BÁO, lịch thi -- học kỳ I năm học 2024!")
+    assert len(shingle_hashes(text)) == len(text.split()) - 4
+    assert shingle_hashes("quá ngắn") == []
+
+
+def test_signature_estimates_jaccard():
+    index = NearDuplicateIndex(num_perm=256, bands=32)
+    first = article(1)
+    for changes in (5, 30, 100):
+        second = edited(first, changes)
+        estimate = index.similarity(index.signature(shingle_hashes(first)), index.signature(shingle_hashes(second)))
+        assert estimate == pytest.approx(jaccard(first, second), abs=0.1)
+
+
+def test_numpy_and_python_signatures_are_identical(monkeypatch):
+    if not near_duplicates.HAS_NUMPY:
+        pytest.skip("numpy is not installed")
+    hashes = shingle_hashes(article(2))
+    expected = NearDuplicateIndex().signature(hashes)
+    monkeypatch.setattr(near_duplicates, "HAS_NUMPY", False)
+    assert NearDuplicateIndex().signature(hashes) == expected
+
+
+def test_check_flags_near_copies_only():
+    index = NearDuplicateIndex(threshold=0.8)
+    original = article(3)
+    assert index.check("https://hus.vnu.edu.vn/a.html", original) is None
+    duplicate = index.check("https://hus.vnu.edu.vn/b.html", edited(original, 3))
+    assert duplicate[0] == "https://hus.vnu.edu.vn/a.html" and duplicate[1] >= 0.8
+    assert index.check("https://hus.vnu.edu.vn/c.html", article(4)) is None
+    assert index.check("https://hus.vnu.edu.vn/d.html", "Trang quá ngắn để so sánh") is None
+    # Duplicates and short pages are not registered as canonical pages
+    assert len(index) == 2 and index.duplicates == 1
+
+
+def test_recrawled_page_is_not_its_own_duplicate():
+    index = NearDuplicateIndex()
+    text = article(5)
+    assert index.check("https://hus.vnu.edu.vn/a.html", text) is None
+    assert index.check("https://hus.vnu.edu.vn/a.html", text) is None
+    assert len(index) == 1
+
+
+def test_signatures_persist(tmp_path):
+    path = str(tmp_path / "near_duplicates.json")
+    index = NearDuplicateIndex(path)
+    text = article(6)
+    index.check("https://hus.vnu.edu.vn/a.html", text)
+    index.save()
+
+    assert NearDuplicateIndex(path).check("https://hus.vnu.edu.vn/b.html", text)[0] == "https://hus.vnu.edu.vn/a.html"
+    # Signatures made with other parameters are not comparable and are dropped
+    assert len(NearDuplicateIndex(path, seed=2)) == 0
+    with pytest.raises(ValueError):
+        NearDuplicateIndex(num_perm=100, bands=16)
@@ -0,0 +1,51 @@
+import json
+
+from validator_store import ValidatorStore, content_hash
+
+
+def test_conditional_headers(tmp_path):
+    store = ValidatorStore(str(tmp_path / "validators.json"))
+    assert store.conditional_headers("https://hus.vnu.edu.vn/a.html") == {}
+
+    store.update("https://hus.vnu.edu.vn/a.html", '"abc"', "Mon, 01 Jan 2024 00:00:00 GMT", content_hash(b"x"))
+    store.update("https://hus.vnu.edu.vn/b.html", None, None, content_hash(b"y"))
+    assert store.conditional_headers("https://hus.vnu.edu.vn/a.html") == {
+        "If-None-Match": '"abc"',
+        "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT",
+    }
+    assert store.conditional_headers("https://hus.vnu.edu.vn/b.html") == {}
+
+
+def test_is_unchanged_compares_body_hash(tmp_path):
+    store = ValidatorStore(str(tmp_path / "validators.json"))
+    url = "https://hus.vnu.edu.vn/a.html"
+    assert not store.is_unchanged(url, content_hash(b"body"))
+    store.update(url, None, None, content_hash(b"body"))
+    assert store.is_unchanged(url, content_hash(b"body"))
+    assert not store.is_unchanged(url, content_hash(b"new body"))
+
+    store.forget(url)
+    assert store.get(url) is None
+    assert not store.is_unchanged(url, content_hash(b"body"))
+
+
+def test_save_and_reload(tmp_path):
+    path = tmp_path / "out" / "validators.json"
+    store = ValidatorStore(str(path))
+    store.update("https://hus.vnu.edu.vn/a.html", '"e"', None, content_hash(b"a"))
+    store.save()
+    assert not (tmp_path / "out" / "validators.json.tmp").exists()
+
+    reloaded = ValidatorStore(str(path))
+    assert reloaded.get("https://hus.vnu.edu.vn/a.html") == {
+        "etag": '"e"', "last_modified": None, "content_hash": content_hash(b"a")}
+
+
+def test_unreadable_store_is_ignored(tmp_path):
+    path = tmp_path / "validators.json"
+    path.write_text("{not json", encoding="utf-8")
+    store = ValidatorStore(str(path))
+    assert store.get("https://hus.vnu.edu.vn/a.html") is None
+    store.update("https://hus.vnu.edu.vn/a.html", None, None, "h")
+    store.save()
+    assert json.loads(path.read_text(encoding="utf-8"))["https://hus.vnu.edu.vn/a.html"]["content_hash"] == "h"
@@ -0,0 +1,101 @@
+"""
+Persistent store of HTTP cache validators for conditional re-crawls.
+
+For every crawled URL the store keeps the ``ETag`` and ``Last-Modified``
+response headers and a SHA-256 of the response body. Later runs send them back
+as ``If-None-Match`` / ``If-Modified-Since`` so unchanged pages cost a single
+small 304 response, and pages served without validators are still skipped
+when their body hash has not changed.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger("validator_store")
+
+
+def content_hash(data: bytes) -> str:
+    """Returns the hex SHA-256 of a response body."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class ValidatorStore:
+    """Thread-safe URL → validators mapping persisted as a JSON file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Optional[str]]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+            logger.info(f"Loaded validators for {len(self._entries)} URLs from {self.path}")
+        except (IOError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable validator store {self.path}: {e}")
+
+    def get(self, url: str) -> Optional[Dict[str, Optional[str]]]:
+        """Returns the stored validators of a URL, if any."""
+        with self._lock:
+            entry = self._entries.get(url)
+            return dict(entry) if entry else None
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """
+        Builds the conditional request headers for a URL.
+
+        Args:
+            url: URL about to be requested
+
+        Returns:
+            ``If-None-Match`` / ``If-Modified-Since`` headers, empty if the URL is unknown
+        """
+        entry = self.get(url) or {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def is_unchanged(self, url: str, body_hash: str) -> bool:
+        """Returns True if the body hash matches the one stored for the URL."""
+        entry = self.get(url)
+        return bool(entry) and entry.get("content_hash") == body_hash
+
+    def update(self, url: str, etag: Optional[str], last_modified: Optional[str], body_hash: str) -> None:
+        """Records the validators of a freshly downloaded response."""
+        with self._lock:
+            self._entries[url] = {
+                "etag": etag,
+                "last_modified": last_modified,
+                "content_hash": body_hash,
+            }
+
+    def forget(self, url: str) -> None:
+        """Drops the validators of a URL so that it is fully re-fetched next time."""
+        with self._lock:
+            self._entries.pop(url, None)
+
+    def save(self) -> None:
+        """Writes the store atomically (temp file + rename)."""
+        with self._lock:
+            snapshot = dict(self._entries)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            logger.info(f"Saved validators for {len(snapshot)} URLs to {self.path}")
+        except IOError as e:
+            logger.error(f"Failed to save validator store {self.path}: {e}")
@@ -0,0 +1,459 @@
+"""
+Compact BM25 inverted index over the crawled corpus.
+
+The builder streams the passages of the crawler output (see chunker) and
+indexes two fields:
+
+- ``text``: syllable tokens of the title, heading path and passage text;
+- ``folded`` (optional, ``--fold``): the same tokens without diacritics, so
+  "hoc phi" still finds "học phí". It is weighted lower than the exact field.
+
+Postings are not kept as Python lists. Each term's postings are a run of
+varint-encoded (doc id delta, term frequency) pairs in one bytes blob per
+field. A uint64 offsets array gives the start of every run, and document
+lengths are a uint32 array. Queries memory-map the blob and decode only the
+runs of the query terms. With numpy installed, runs are decoded and scored
+as vectors into a dense score array. Otherwise a pure-Python loop is used.
+The decoded score contributions of recently used terms are kept in a
+bounded LRU cache, since common syllables ("học", "sinh") appear in most
+questions and have the longest runs.
+
+Index layout (one directory):
+    meta.json                   parameters and statistics
+    <field>.vocab               terms, one per line, in term id order
+    <field>.offsets             uint64[terms + 1] byte offsets into <field>.postings
+    <field>.postings            varint (doc delta, tf) pairs
+    <field>.doclen              uint32[documents] field length of every passage
+    passages.jsonl/.offsets     the passages (see passage_store)
+
+Usage:
+    python bm25.py build ../data_crawling/crawled_data -o bm25_index --fold
+    python bm25.py query bm25_index "học phí ngành toán" -k 5
+    python bm25.py bench bm25_index --queries 200
+"""
+import argparse
+import heapq
+import json
+import logging
+import math
+import mmap
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from chunker import iter_passages
+from passage_store import PassageStore, PassageWriter
+from tokenizer import fold_tokens, tokenize
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+logger = logging.getLogger("bm25")
+
+INDEX_VERSION = 1
+FIELD_WEIGHTS = {"text": 1.0, "folded": 0.4}
+
+
+def encode_varint(value: int, out: bytearray) -> None:
+    """Appends an unsigned LEB128 varint."""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_postings(data, start: int, end: int) -> List[Tuple[int, int]]:
+    """
+    Decodes a run of varint (doc delta, tf) pairs.
+
+    Args:
+        data: Postings blob (bytes or mmap)
+        start: Byte offset of the run
+        end: Byte offset just past the run
+
+    Returns:
+        (doc id, term frequency) pairs in doc id order
+    """
+    run = data[start:end]
+    values = []
+    value = shift = 0
+    for byte in run:
+        if byte < 0x80:
+            values.append(value | (byte << shift))
+            value = shift = 0
+        else:
+            value |= (byte & 0x7F) << shift
+            shift += 7
+    postings = []
+    doc = 0
+    for i in range(0, len(values), 2):
+        doc += values[i]
+        postings.append((doc, values[i + 1]))
+    return postings
+
+
+def decode_postings_numpy(data, start: int, end: int) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Vectorized decode_postings: returns (doc ids, term frequencies) arrays."""
+    run = np.frombuffer(data[start:end], dtype=np.uint8)
+    ends = np.flatnonzero(run < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    # Position of every byte inside its varint gives its shift
+    shifts = 7 * (np.arange(len(run)) - np.repeat(starts, ends - starts + 1))
+    values = np.add.reduceat((run & 0x7F).astype(np.int64) << shifts, starts)
+    return np.cumsum(values[0::2]), values[1::2]
+
+
+class FieldBuilder:
+    """Accumulates the postings of one field while documents are added in id order."""
+
+    def __init__(self):
+        self.vocab: Dict[str, int] = {}
+        self.postings: List[bytearray] = []
+        self.last_doc = array("q")
+        self.doclen = array("I")
+
+    def add(self, doc: int, tokens: List[str]) -> None:
+        self.doclen.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                term_id = self.vocab[term] = len(self.postings)
+                self.postings.append(bytearray())
+                self.last_doc.append(0)
+            run = self.postings[term_id]
+            encode_varint(doc - self.last_doc[term_id], run)
+            encode_varint(tf, run)
+            self.last_doc[term_id] = doc
+
+    def save(self, directory: str, name: str) -> Dict:
+        offsets = array("Q", [0])
+        with open(os.path.join(directory, f"{name}.postings"), "wb") as f:
+            for run in self.postings:
+                f.write(run)
+                offsets.append(offsets[-1] + len(run))
+        with open(os.path.join(directory, f"{name}.offsets"), "wb") as f:
+            offsets.tofile(f)
+        with open(os.path.join(directory, f"{name}.doclen"), "wb") as f:
+            self.doclen.tofile(f)
+        with open(os.path.join(directory, f"{name}.vocab"), "w", encoding="utf-8") as f:
+            f.write("\n".join(self.vocab))
+        total = sum(self.doclen)
+        return {
+            "terms": len(self.vocab),
+            "postings_bytes": offsets[-1],
+            "avgdl": total / len(self.doclen) if self.doclen else 0.0,
+        }
+
+
+def passage_tokens(passage: Dict) -> List[str]:
+    """Tokens indexed for a passage: title, heading path and text."""
+    return tokenize(" ".join([passage.get("title", ""), *passage.get("heading_path", []), passage["text"]]))
+
+
+def build_index(passages: Iterable[Dict], directory: str, fold: bool = False,
+                k1: float = 1.2, b: float = 0.75) -> Dict:
+    """
+    Builds a BM25 index.
+
+    Args:
+        passages: Passage dicts (see chunker.iter_passages)
+        directory: Index directory
+        fold: Also index the diacritic-folded field
+        k1: BM25 term frequency saturation
+        b: BM25 length normalization
+
+    Returns:
+        The index metadata (also written to meta.json)
+    """
+    start = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    fields = {"text": FieldBuilder()}
+    if fold:
+        fields["folded"] = FieldBuilder()
+    store = PassageWriter(directory)
+
+    for passage in passages:
+        doc = store.add(passage)
+        tokens = passage_tokens(passage)
+        fields["text"].add(doc, tokens)
+        if fold:
+            fields["folded"].add(doc, fold_tokens(tokens))
+    store.close()
+
+    meta = {
+        "version": INDEX_VERSION,
+        "documents": len(store),
+        "k1": k1,
+        "b": b,
+        "fields": {name: builder.save(directory, name) for name, builder in fields.items()},
+        "build_seconds": round(time.perf_counter() - start, 3),
+    }
+    with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def idf(documents: int, df: int, weight: float = 1.0) -> float:
+    """BM25 inverse document frequency of a term in df of documents passages, times a field weight."""
+    return weight * math.log(1 + (documents - df + 0.5) / (df + 0.5))
+
+
+class _Field:
+    def __init__(self, directory: str, name: str, stats: Dict, k1: float, b: float):
+        with open(os.path.join(directory, f"{name}.vocab"), "r", encoding="utf-8") as f:
+            self.vocab = {term: term_id for term_id, term in enumerate(f.read().split("\n")) if term}
+        self.offsets = array("Q")
+        with open(os.path.join(directory, f"{name}.offsets"), "rb") as f:
+            self.offsets.frombytes(f.read())
+        doclen = array("I")
+        with open(os.path.join(directory, f"{name}.doclen"), "rb") as f:
+            doclen.frombytes(f.read())
+        # Length normalization of every document, precomputed once
+        avgdl = stats["avgdl"] or 1.0
+        if HAS_NUMPY:
+            self.norm = k1 * (1 - b + b * np.frombuffer(doclen, dtype=np.uint32) / avgdl)
+        else:
+            self.norm = array("d", (k1 * (1 - b + b * length / avgdl) for length in doclen))
+        self._file = open(os.path.join(directory, f"{name}.postings"), "rb")
+        self.postings = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b""
+
+    def run(self, term: str) -> Optional[Tuple[int, int]]:
+        """Returns the byte range of a term's postings, or None if the term is unknown."""
+        term_id = self.vocab.get(term)
+        if term_id is None:
+            return None
+        return self.offsets[term_id], self.offsets[term_id + 1]
+
+    def close(self) -> None:
+        if isinstance(self.postings, mmap.mmap):
+            self.postings.close()
+        self._file.close()
+
+
+class BM25Index:
+    """Read side of an index written by build_index."""
+
+    def __init__(self, directory: str, term_cache_mb: float = 64):
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported BM25 index version {self.meta.get('version')} in {directory}")
+        self.directory = directory
+        self.documents = self.meta["documents"]
+        self.k1 = self.meta["k1"]
+        self.fields = {
+            name: _Field(directory, name, stats, self.k1, self.meta["b"])
+            for name, stats in self.meta["fields"].items()
+        }
+        self.passages = PassageStore(directory)
+        self.term_cache_bytes = int(term_cache_mb * 1024 * 1024)
+        self._term_cache: "OrderedDict[Tuple[_Field, int], Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+        self._term_cache_used = 0
+        self._term_lock = threading.Lock()
+
+    def _idf(self, df: int, weight: float) -> float:
+        return idf(self.documents, df, weight)
+
+    def query_runs(self, query: str) -> Iterable[Tuple[str, str, _Field, int, int]]:
+        """Yields (field name, term, field, start, end) for the query terms present in the index."""
+        tokens = tokenize(query)
+        for name, field in self.fields.items():
+            for term in set(fold_tokens(tokens) if name == "folded" else tokens):
+                run = field.run(term)
+                if run is not None:
+                    yield name, term, field, run[0], run[1]
+
+    def scores(self, query: str) -> Dict[int, float]:
+        """Returns the BM25 score of every passage matching at least one query term."""
+        if HAS_NUMPY:
+            dense = self._dense_scores(query)
+            matched = np.flatnonzero(dense)
+            return dict(zip(matched.tolist(), dense[matched].tolist()))
+
+        scores: Dict[int, float] = {}
+        k1_plus_1 = self.k1 + 1
+        for name, _, field, start, end in self.query_runs(query):
+            postings = decode_postings(field.postings, start, end)
+            idf = self._idf(len(postings), FIELD_WEIGHTS[name])
+            norm = field.norm
+            for doc, tf in postings:
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * k1_plus_1 / (tf + norm[doc])
+        return scores
+
+    def term_postings(self, field: _Field, start: int, end: int) -> Tuple["np.ndarray", "np.ndarray"]:
+        """
+        Returns the doc ids of one term run and their BM25 term frequency parts, through the term cache.
+
+        The score contribution of the term to a document is its idf times the
+        tf part; the idf is left out so that it can use collection statistics
+        other than this index's own (see segments.py).
+        """
+        key = (field, start)
+        with self._term_lock:
+            cached = self._term_cache.get(key)
+            if cached is not None:
+                self._term_cache.move_to_end(key)
+                return cached
+        docs, tfs = decode_postings_numpy(field.postings, start, end)
+        docs = docs.astype(np.int32)
+        cached = docs, tfs * (self.k1 + 1) / (tfs + field.norm[docs])
+        size = cached[0].nbytes + cached[1].nbytes
+        if size <= self.term_cache_bytes:
+            with self._term_lock:
+                if key not in self._term_cache:
+                    self._term_cache[key] = cached
+                    self._term_cache_used += size
+                while self._term_cache_used > self.term_cache_bytes:
+                    _, (old_docs, old_scores) = self._term_cache.popitem(last=False)
+                    self._term_cache_used -= old_docs.nbytes + old_scores.nbytes
+        return cached
+
+    def _dense_scores(self, query: str) -> "np.ndarray":
+        scores = np.zeros(self.documents)
+        for name, _, field, start, end in self.query_runs(query):
+            docs, tf_parts = self.term_postings(field, start, end)
+            # Doc ids are unique within a run, so fancy-index addition is safe
+            scores[docs] += self._idf(len(docs), FIELD_WEIGHTS[name]) * tf_parts
+        return scores
+
+    def top(self, query: str, k: int = 10) -> List[Tuple[int, float]]:
+        """Returns the (passage number, score) pairs of the top-k passages, best first."""
+        if HAS_NUMPY:
+            scores = self._dense_scores(query)
+            k = min(k, int(np.count_nonzero(scores)))
+            if k == 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(int(doc), float(scores[doc])) for doc in top]
+        return heapq.nlargest(k, self.scores(query).items(), key=lambda item: item[1])
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[float, Dict]]:
+        """
+        Returns the top-k passages of a query.
+
+        Args:
+            query: Question or keywords
+            k: Number of passages
+
+        Returns:
+            (score, passage) pairs, best first
+        """
+        return [(score, self.passages[doc]) for doc, score in self.top(query, k)]
+
+    def size_bytes(self) -> int:
+        """Size of the index files, without the stored passages."""
+        return sum(
+            os.path.getsize(os.path.join(self.directory, f"{name}.{ext}"))
+            for name in self.fields for ext in ("vocab", "offsets", "postings", "doclen")
+        )
+
+    def close(self) -> None:
+        for field in self.fields.values():
+            field.close()
+        self.passages.close()
+
+
+def print_hits(hits: List[Tuple[float, Dict]], width: int = 300) -> None:
+    for rank, (score, passage) in enumerate(hits, 1):
+        path = " > ".join(passage.get("heading_path", []))
+        print(f"{rank:2d}. {score:7.3f}  {passage['url']}" + (f"  [{path}]" if path else ""))
+        text = passage["text"].replace("\n", " | ")
+        print(f"      {text[:width]}{'…' if len(text) > width else ''}")
+
+
+def bench(index: BM25Index, queries: Optional[List[str]], count: int, k: int) -> Dict:
+    """Measures query latency, on given queries or on queries sampled from passage texts."""
+    if not queries:
+        rng = random.Random(0)
+        queries = []
+        for _ in range(count):
+            tokens = index.passages[rng.randrange(index.documents)]["text"].split()
+            start = rng.randrange(max(len(tokens) - 5, 1))
+            queries.append(" ".join(tokens[start:start + 5]))
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "queries": len(latencies),
+        "mean_ms": statistics.fmean(latencies),
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BM25 index over the crawled corpus.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Build an index")
+    build.add_argument("inputs", nargs="+", help="crawled_data/ directories, shard directories or passages.jsonl")
+    build.add_argument("-o", "--output", default="bm25_index", help="Index directory (default: bm25_index)")
+    build.add_argument("--fold", action="store_true", help="Also index a diacritic-folded field")
+    build.add_argument("--max-tokens", type=int, default=200, help="Maximum tokens per passage (default: 200)")
+    build.add_argument("--overlap", type=int, default=40, help="Overlap between passages in tokens (default: 40)")
+    build.add_argument("--k1", type=float, default=1.2)
+    build.add_argument("--b", type=float, default=0.75)
+
+    query = commands.add_parser("query", help="Search an index")
+    query.add_argument("index")
+    query.add_argument("query")
+    query.add_argument("-k", type=int, default=10, help="Number of passages (default: 10)")
+
+    bench_parser = commands.add_parser("bench", help="Measure query latency")
+    bench_parser.add_argument("index")
+    bench_parser.add_argument("--queries-file", default=None, help="File with one query per line")
+    bench_parser.add_argument("--queries", type=int, default=200, help="Sampled queries if no file is given")
+    bench_parser.add_argument("-k", type=int, default=10)
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        passages = iter_passages(args.inputs, args.max_tokens, args.overlap)
+        meta = build_index(passages, args.output, args.fold, args.k1, args.b)
+        index = BM25Index(args.output)
+        passages_bytes = index.passages.offsets[-1]
+        logger.info(f"Indexed {meta['documents']} passages in {meta['build_seconds']:.1f}s "
+                    f"({meta['documents'] / meta['build_seconds'] if meta['build_seconds'] else 0:.0f} passages/s)")
+        for name, stats in meta["fields"].items():
+            logger.info(f"Field {name}: {stats['terms']} terms, {stats['postings_bytes'] / 1024:.0f} KB of postings, "
+                        f"avg length {stats['avgdl']:.1f}")
+        logger.info(f"Index size {index.size_bytes() / 1024:.0f} KB "
+                    f"(passages {passages_bytes / 1024:.0f} KB stored separately)")
+        index.close()
+    elif args.command == "query":
+        index = BM25Index(args.index)
+        start = time.perf_counter()
+        hits = index.search(args.query, args.k)
+        elapsed = (time.perf_counter() - start) * 1000
+        print_hits(hits)
+        print(f"{len(hits)} results in {elapsed:.1f} ms")
+        index.close()
+    elif args.command == "bench":
+        index = BM25Index(args.index)
+        queries = None
+        if args.queries_file:
+            with open(args.queries_file, "r", encoding="utf-8") as f:
+                queries = [line.strip() for line in f if line.strip()]
+        result = bench(index, queries, args.queries, args.k)
+        print(f"{result['queries']} queries: mean {result['mean_ms']:.2f} ms, "
+              f"p50 {result['p50_ms']:.2f} ms, p95 {result['p95_ms']:.2f} ms")
+        index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    sys.exit(main())
@@ -0,0 +1,441 @@
+"""
+Streaming passage chunker for the crawler output.
+
+Reads the pages written by ``data_crawling/multi-crawler.py`` (and
+``pdf_text.py``), either as page directories (``content.txt`` +
+``metadata.json``) or as corpus shards (``shard-NNNNN.jsonl``), and splits
+them into overlapping passages of bounded length for retrieval:
+
+- text is segmented into Vietnamese sentences, and sentences are packed into
+  passages of at most ``max_tokens`` tokens (whitespace-separated syllables);
+  the last sentences of a passage, up to ``overlap_tokens``, are repeated at
+  the start of the next one;
+- passages never cross a heading; each one keeps the path of headings above
+  it and the URL and title of its page;
+- table rows are packed whole, and every table passage starts with the
+  table's header row, so a row is never separated from its column names;
+- image markers are dropped.
+
+Everything is a generator: one page is held in memory at a time, whatever
+the size of the corpus.
+
+Usage:
+    python chunker.py ../data_crawling/crawled_data -o passages.jsonl
+    python chunker.py ../data_crawling/crawled_data/shards --max-tokens 160 --overlap 32
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+try:
+    import resource  # Unix only; used for the peak memory report
+except ImportError:
+    resource = None
+
+logger = logging.getLogger("chunker")
+
+HEADING_PREFIX = "Tiêu đề: "
+IMAGE_PREFIX = "🖼️ Ảnh: "
+SHARD_PATTERN = re.compile(r"^shard-\d{5}\.jsonl$")
+
+VIETNAMESE_UPPER = "A-ZÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ"
+# A sentence ends at . ! ? … (plus closing quotes/brackets) followed by whitespace and
+# the start of a new sentence: a capital letter, a digit, an opening quote or a bullet
+SENTENCE_END = re.compile(rf"(?<=[.!?…])[\"'”’)\]]*\s+(?=[{VIETNAMESE_UPPER}0-9\"“‘(\[•\-–])")
+# Abbreviations that end with a period but do not end a sentence
+ABBREVIATIONS = frozenset(
+    abbr.lower() for abbr in (
+        "GS.", "PGS.", "TS.", "ThS.", "PGS.TS.", "GS.TS.", "TSKH.", "KS.", "CN.", "BS.", "NCS.",
+        "TP.", "Tp.", "Q.", "P.", "TT.", "TX.", "St.", "Tr.", "tr.", "NXB.", "v.v.", "vv.", "Mr.", "Ms.",
+        "Dr.", "Th.", "No.", "VD.", "vd.", "ĐHQG.", "ĐHQGHN.", "KHTN.",
+    )
+)
+# List markers such as "1." "2.3." "IV." "a." are not sentences of their own
+LIST_MARKER = re.compile(r"^(?:\d+(?:\.\d+)*|[IVXLC]+|[a-zđ])\.$")
+
+
+class Passage(NamedTuple):
+    """One retrievable unit of text."""
+
+    url: str
+    title: str
+    heading_path: Tuple[str, ...]
+    text: str
+    tokens: int
+    kind: str  # "text" or "table"
+    position: int  # 0-based number of the passage within its page
+    crawl_date: str = ""
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": f"{self.url}#{self.position}",
+            "url": self.url,
+            "title": self.title,
+            "crawl_date": self.crawl_date,
+            "heading_path": list(self.heading_path),
+            "kind": self.kind,
+            "tokens": self.tokens,
+            "text": self.text,
+        }
+
+
+class Page(NamedTuple):
+    """A crawled page as a stream of (kind, text, level) items."""
+
+    url: str
+    title: str
+    items: Iterable[Tuple[str, str, int]]  # kind: "heading", "paragraph", "table", "table_row" or "image"
+    crawl_date: str = ""
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Splits Vietnamese text into sentences.
+
+    Abbreviations (``PGS.TS.``, ``TP.``, ``v.v.``...) and list markers
+    (``1.``, ``IV.``, ``a.``) do not end a sentence; they are glued to the
+    text that follows.
+
+    Args:
+        text: Paragraph text
+
+    Returns:
+        Non-empty sentences, stripped
+    """
+    pieces = SENTENCE_END.split(text)
+    if len(pieces) == 1:
+        stripped = text.strip()
+        return [stripped] if stripped else []
+
+    sentences: List[str] = []
+    carry = ""
+    for piece in pieces:
+        piece = piece.strip()
+        if not piece:
+            continue
+        if carry:
+            piece = f"{carry} {piece}"
+            carry = ""
+        last_word = piece.rsplit(None, 1)[-1]
+        if last_word.lower() in ABBREVIATIONS or (last_word == piece and LIST_MARKER.match(piece)):
+            carry = piece
+        else:
+            sentences.append(piece)
+    if carry:
+        sentences.append(carry)
+    return sentences
+
+
+def count_tokens(text: str) -> int:
+    """Counts whitespace-separated tokens (Vietnamese syllables)."""
+    return len(text.split())
+
+
+def _split_long(sentence: str, max_tokens: int) -> Iterator[Tuple[str, int]]:
+    words = sentence.split()
+    for start in range(0, len(words), max_tokens):
+        window = words[start:start + max_tokens]
+        yield " ".join(window), len(window)
+
+
+def content_items(lines: Iterable[str]) -> Iterator[Tuple[str, str, int]]:
+    """
+    Classifies the lines of a content.txt stream into items.
+
+    An empty line opens a table; the tab-separated lines after it are its
+    rows. Heading levels are not stored in content.txt, so headings come
+    back as level 2.
+
+    Args:
+        lines: Lines of a content.txt file (with or without newlines)
+
+    Yields:
+        (kind, text, level) items
+    """
+    in_table = False
+    for line in lines:
+        line = line.rstrip("\n")
+        if line.startswith(HEADING_PREFIX):
+            in_table = False
+            yield "heading", line[len(HEADING_PREFIX):], 2
+        elif line.startswith(IMAGE_PREFIX):
+            yield "image", line[len(IMAGE_PREFIX):], 0
+        elif not line:
+            in_table = True
+            yield "table", "", 0
+        elif in_table and "\t" in line:
+            yield "table_row", line, 0
+        else:
+            in_table = False
+            yield "paragraph", line, 0
+
+
+def _read_lines(path: str) -> Iterator[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        yield from f
+
+
+def iter_page_dirs(crawl_dir: str) -> Iterator[Page]:
+    """Streams the page directories of a crawl output directory, in name order."""
+    for name in sorted(os.listdir(crawl_dir)):
+        page_dir = os.path.join(crawl_dir, name)
+        metadata_file = os.path.join(page_dir, "metadata.json")
+        content_file = os.path.join(page_dir, "content.txt")
+        if not (os.path.isfile(metadata_file) and os.path.isfile(content_file)):
+            continue
+        try:
+            with open(metadata_file, "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+        except (IOError, ValueError) as e:
+            logger.warning(f"Skipping page directory with unreadable metadata {page_dir}: {e}")
+            continue
+        yield Page(metadata["url"], metadata.get("title", ""), content_items(_read_lines(content_file)),
+                   metadata.get("crawl_date", ""))
+
+
+def iter_shard(path: str) -> Iterator[Page]:
+    """Streams the page records of a JSONL corpus shard, skipping its footer lines."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # partial last line of an interrupted crawl
+            if "url" not in record:
+                continue  # footer: URL index and trailer
+            items = ((block["kind"], block.get("text", ""), block.get("level", 0)) for block in record["blocks"])
+            yield Page(record["url"], record.get("title", ""), items, record.get("crawl_date", ""))
+
+
+def iter_pages(paths: Iterable[str]) -> Iterator[Page]:
+    """
+    Streams pages from crawl output directories, shard directories or shard files.
+
+    Args:
+        paths: Any mix of crawled_data/ trees, shard directories and shard-NNNNN.jsonl files
+
+    Yields:
+        Pages
+    """
+    for path in paths:
+        if os.path.isfile(path):
+            yield from iter_shard(path)
+            continue
+        shards = sorted((name for name in os.listdir(path) if SHARD_PATTERN.match(name)), reverse=True)
+        if shards:
+            # A re-crawled page is in several shards: read the newest first and skip older copies
+            seen = set()
+            for name in shards:
+                for page in iter_shard(os.path.join(path, name)):
+                    if page.url not in seen:
+                        seen.add(page.url)
+                        yield page
+        else:
+            yield from iter_page_dirs(path)
+
+
+def chunk_page(page: Page, max_tokens: int = 200, overlap_tokens: int = 40) -> Iterator[Passage]:
+    """
+    Splits one page into passages.
+
+    Args:
+        page: Page to split
+        max_tokens: Maximum tokens of a passage (a single table row may exceed it)
+        overlap_tokens: Tokens of trailing sentences repeated at the start of the next text passage
+
+    Yields:
+        Passages in page order
+    """
+    headings: List[Tuple[int, str]] = []
+    sentences: List[Tuple[str, int]] = []  # (sentence, tokens) of the open text passage
+    sentence_tokens = 0
+    fresh = 0  # sentences of the open passage that were not already emitted as overlap
+    header: Optional[Tuple[str, int]] = None  # header row of the current table
+    rows: List[str] = []
+    row_tokens = 0
+    table_passages = 0  # passages already emitted for the current table
+    position = 0
+
+    def make(text: str, tokens: int, kind: str) -> Passage:
+        nonlocal position
+        passage = Passage(page.url, page.title, tuple(text for _, text in headings), text, tokens, kind, position,
+                          page.crawl_date)
+        position += 1
+        return passage
+
+    # Helpers return the passage they complete (or None) instead of being generators:
+    # add_sentence runs once per sentence, and a generator per call would dominate the run time
+    def flush_text(keep_overlap: bool) -> Optional[Passage]:
+        nonlocal sentences, sentence_tokens, fresh
+        passage = None
+        if fresh:
+            passage = make(" ".join(sentence for sentence, _ in sentences), sentence_tokens, "text")
+        if not keep_overlap:
+            sentences, sentence_tokens, fresh = [], 0, 0
+            return passage
+        # Carry the trailing sentences that fit in the overlap budget
+        carried: List[Tuple[str, int]] = []
+        carried_tokens = 0
+        for sentence, tokens in reversed(sentences):
+            if carried_tokens + tokens > overlap_tokens:
+                break
+            carried.append((sentence, tokens))
+            carried_tokens += tokens
+        carried.reverse()
+        sentences, sentence_tokens, fresh = carried, carried_tokens, 0
+        return passage
+
+    def flush_rows() -> Passage:
+        nonlocal rows, row_tokens, table_passages
+        passage = make("\n".join(rows), row_tokens, "table")
+        table_passages += 1
+        # The next passage of the table starts with its header again
+        rows, row_tokens = [header[0]], header[1]
+        return passage
+
+    def end_table() -> Optional[Passage]:
+        nonlocal header, rows, row_tokens, table_passages
+        passage = None
+        if len(rows) > 1 or (rows and not table_passages):
+            passage = make("\n".join(rows), row_tokens, "table")
+        header, rows, row_tokens, table_passages = None, [], 0, 0
+        return passage
+
+    def add_sentence(sentence: str, tokens: int) -> Optional[Passage]:
+        nonlocal sentence_tokens, fresh
+        passage = None
+        if sentence_tokens + tokens > max_tokens and fresh:
+            passage = flush_text(keep_overlap=True)
+            # Drop overlap that would not leave room for the new sentence
+            while sentences and sentence_tokens + tokens > max_tokens:
+                sentence_tokens -= sentences.pop(0)[1]
+        sentences.append((sentence, tokens))
+        sentence_tokens += tokens
+        fresh += 1
+        return passage
+
+    for kind, text, level in page.items:
+        if kind == "paragraph":
+            if header is not None:
+                passage = end_table()
+                if passage:
+                    yield passage
+            for sentence in split_sentences(text):
+                tokens = len(sentence.split())
+                if tokens > max_tokens:
+                    for window, window_tokens in _split_long(sentence, max_tokens):
+                        passage = add_sentence(window, window_tokens)
+                        if passage:
+                            yield passage
+                else:
+                    passage = add_sentence(sentence, tokens)
+                    if passage:
+                        yield passage
+        elif kind == "table_row":
+            if header is None:
+                passage = flush_text(keep_overlap=False)
+                if passage:
+                    yield passage
+                header = (text, len(text.split()))
+                rows, row_tokens = [text], header[1]
+                continue
+            tokens = len(text.split())
+            if row_tokens + tokens > max_tokens and len(rows) > 1:
+                yield flush_rows()
+            rows.append(text)
+            row_tokens += tokens
+        elif kind in ("table", "heading"):
+            passage = end_table()
+            if passage:
+                yield passage
+            if kind == "table":
+                continue
+            passage = flush_text(keep_overlap=False)
+            if passage:
+                yield passage
+            level = level or 2
+            while headings and headings[-1][0] >= level:
+                headings.pop()
+            headings.append((level, text))
+
+    for passage in (end_table(), flush_text(keep_overlap=False)):
+        if passage:
+            yield passage
+
+
+def chunk_pages(pages: Iterable[Page], max_tokens: int = 200, overlap_tokens: int = 40) -> Iterator[Passage]:
+    """Streams the passages of a stream of pages."""
+    for page in pages:
+        yield from chunk_page(page, max_tokens, overlap_tokens)
+
+
+def is_passage_file(path: str) -> bool:
+    """Tells a passages JSONL file written by this module from a corpus shard."""
+    return os.path.isfile(path) and path.endswith(".jsonl") and not SHARD_PATTERN.match(os.path.basename(path))
+
+
+def iter_passages(paths: Iterable[str], max_tokens: int = 200, overlap_tokens: int = 40) -> Iterator[Dict]:
+    """
+    Streams passage dicts from passages.jsonl files or straight from crawler output.
+
+    Args:
+        paths: passages.jsonl files, crawled_data/ directories, shard directories or shard files
+        max_tokens: Maximum tokens per passage when chunking crawler output
+        overlap_tokens: Overlap between passages when chunking crawler output
+
+    Yields:
+        Passages as written by ``Passage.to_dict``
+    """
+    for path in paths:
+        if is_passage_file(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    yield json.loads(line)
+        else:
+            for passage in chunk_pages(iter_pages([path]), max_tokens, overlap_tokens):
+                yield passage.to_dict()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split crawled pages into overlapping passages.")
+    parser.add_argument("inputs", nargs="+", help="crawled_data/ directories, shard directories or shard files")
+    parser.add_argument("-o", "--output", default="passages.jsonl", help="Output JSONL file (default: passages.jsonl)")
+    parser.add_argument("--max-tokens", type=int, default=200, help="Maximum tokens per passage (default: 200)")
+    parser.add_argument("--overlap", type=int, default=40, help="Overlap between passages in tokens (default: 40)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    page_count = passage_count = 0
+
+    def counted(pages: Iterable[Page]) -> Iterator[Page]:
+        nonlocal page_count
+        for page in pages:
+            page_count += 1
+            yield page
+
+    tmp_file = f"{args.output}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        for passage in chunk_pages(counted(iter_pages(args.inputs)), args.max_tokens, args.overlap):
+            f.write(json.dumps(passage.to_dict(), ensure_ascii=False))
+            f.write("\n")
+            passage_count += 1
+    os.replace(tmp_file, args.output)
+
+    elapsed = time.perf_counter() - start
+    stats = f"{page_count / elapsed if elapsed else 0:.0f} pages/s"
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux but in bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        stats += f", peak RSS {peak / (1024 * 1024 if sys.platform == 'darwin' else 1024):.0f} MB"
+    logger.info(f"Wrote {passage_count} passages from {page_count} pages to {args.output} in {elapsed:.2f}s ({stats})")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    sys.exit(main())
@@ -0,0 +1,465 @@
+"""
+Offline dense retrieval: TF-IDF + truncated SVD (LSA) vectors trained on our own corpus.
+
+BM25 only matches the words of a question. Questions that paraphrase a
+passage ("tiền học" for "học phí") need vectors in which co-occurring terms
+are close. This module learns them from the crawled corpus alone, with no
+model download and no network:
+
+1. every passage becomes a sparse TF-IDF vector over syllables and syllable
+   bigrams (Vietnamese words are mostly two syllables), with sublinear tf
+   and L2 normalization;
+2. a randomized truncated SVD (Halko et al.) of the passage × term matrix
+   gives ``dims`` latent dimensions, computed with blocked sparse products
+   in NumPy (no SciPy needed);
+3. the passage vectors are L2-normalized and stored as one contiguous
+   float32 matrix (``vectors.f32``), which is memory-mapped at load time.
+
+A batch of questions is projected the same way and scored against all
+passages with one matrix multiply per block of questions. The top-k of each
+row is found with ``argpartition``, with no Python loop over passages.
+
+The index can share a directory with a BM25 index built from the same
+inputs (they write the same passages.jsonl), which hybrid retrieval expects.
+
+Usage:
+    python dense.py build ../data_crawling/crawled_data -o index --dims 256
+    python dense.py query index "tiền học một năm là bao nhiêu" -k 5
+    python dense.py bench index --queries 1000
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from chunker import iter_passages
+from passage_store import PassageStore, PassageWriter
+from tokenizer import tokenize
+
+logger = logging.getLogger("dense")
+
+INDEX_VERSION = 1
+META_FILE = "dense.json"
+VECTORS_FILE = "vectors.f32"
+COMPONENTS_FILE = "components.f32"
+IDF_FILE = "dense_idf.f32"
+VOCAB_FILE = "dense.vocab"
+MODEL_FILES = (VOCAB_FILE, IDF_FILE, COMPONENTS_FILE)
+NNZ_BLOCK = 4096  # non-zeros per block in the sparse products: the gathered rows stay in cache
+
+
+def features(tokens: List[str]) -> List[str]:
+    """Syllables plus adjacent syllable pairs ("học_phí")."""
+    return tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def passage_text(passage: Dict) -> str:
+    """The text of a passage that is embedded: title, heading path and body."""
+    return " ".join([passage.get("title", ""), *passage.get("heading_path", []), passage["text"]])
+
+
+class CSRMatrix:
+    """Minimal compressed sparse row matrix: just the products the SVD needs."""
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray, n_cols: int):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.shape = (len(indptr) - 1, n_cols)
+
+    def dot(self, dense: np.ndarray) -> np.ndarray:
+        """Returns self @ dense, computed in blocks of about NNZ_BLOCK non-zeros."""
+        n_rows = self.shape[0]
+        out = np.zeros((n_rows, dense.shape[1]), dtype=np.float32)
+        start = 0
+        while start < n_rows:
+            # At least one row per block, however many non-zeros it has
+            end = int(np.searchsorted(self.indptr, self.indptr[start] + NNZ_BLOCK, side="right")) - 1
+            end = min(max(end, start + 1), n_rows)
+            lo, hi = self.indptr[start], self.indptr[end]
+            if lo == hi:
+                start = end
+                continue
+            products = self.data[lo:hi, None] * dense[self.indices[lo:hi]]
+            # reduceat needs the start of every non-empty row, relative to the block
+            starts = self.indptr[start:end] - lo
+            nonempty = np.flatnonzero(np.diff(self.indptr[start:end + 1]))
+            out[start + nonempty] = np.add.reduceat(products, starts[nonempty], axis=0)
+            start = end
+        return out
+
+    def transpose(self) -> "CSRMatrix":
+        """Returns the transpose (i.e. the CSC form of this matrix)."""
+        order = np.argsort(self.indices, kind="stable")
+        rows = np.repeat(np.arange(self.shape[0], dtype=np.int64), np.diff(self.indptr))
+        counts = np.bincount(self.indices, minlength=self.shape[1])
+        indptr = np.concatenate(([0], np.cumsum(counts)))
+        return CSRMatrix(indptr, rows[order], self.data[order], self.shape[0])
+
+
+def tfidf_rows(docs: Sequence[Sequence[int]], tfs: Sequence[Sequence[float]], idf: np.ndarray,
+               n_cols: int) -> CSRMatrix:
+    """Builds L2-normalized sublinear TF-IDF rows from per-document term ids and counts."""
+    lengths = np.array([len(doc) for doc in docs], dtype=np.int64)
+    indptr = np.concatenate(([0], np.cumsum(lengths)))
+    if indptr[-1]:
+        indices = np.concatenate([np.asarray(doc, dtype=np.int64) for doc in docs])
+        counts = np.concatenate([np.asarray(tf, dtype=np.float32) for tf in tfs])
+    else:
+        indices, counts = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    data = (1 + np.log(counts)) * idf[indices]
+    # Row norms via reduceat on the non-empty rows
+    norms = np.zeros(len(docs), dtype=np.float32)
+    nonempty = np.flatnonzero(lengths)
+    if len(nonempty):
+        norms[nonempty] = np.sqrt(np.add.reduceat(data * data, indptr[:-1][nonempty]))
+    data /= np.repeat(np.where(norms > 0, norms, 1), lengths)
+    return CSRMatrix(indptr, indices, data.astype(np.float32), n_cols)
+
+
+def randomized_svd(matrix: CSRMatrix, dims: int, oversample: int = 10, power_iterations: int = 2,
+                   seed: int = 0) -> np.ndarray:
+    """
+    Computes the top right singular vectors of a sparse matrix.
+
+    Args:
+        matrix: Passage × term matrix
+        dims: Number of singular vectors
+        oversample: Extra random directions for accuracy
+        power_iterations: Subspace iterations (sharpen the spectrum of slowly decaying data)
+        seed: Random seed
+
+    Returns:
+        Components, float32[terms, dims]
+    """
+    transposed = matrix.transpose()
+    rng = np.random.default_rng(seed)
+    width = min(dims + oversample, min(matrix.shape))
+    sketch = matrix.dot(rng.standard_normal((matrix.shape[1], width)).astype(np.float32))
+    for _ in range(power_iterations):
+        sketch, _ = np.linalg.qr(sketch)
+        projected, _ = np.linalg.qr(transposed.dot(sketch))
+        sketch = matrix.dot(projected)
+    basis, _ = np.linalg.qr(sketch)
+    small = transposed.dot(basis).T  # width × terms
+    _, _, vt = np.linalg.svd(small, full_matrices=False)
+    return np.ascontiguousarray(vt[:dims].T, dtype=np.float32)
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def build_index(passages: Iterable[Dict], directory: str, dims: int = 256, min_df: int = 2,
+                max_features: int = 200000, power_iterations: int = 2, seed: int = 0,
+                store_passages: bool = True) -> Dict:
+    """
+    Trains the LSA model on the passages and writes the dense index.
+
+    Args:
+        passages: Passage dicts (see chunker.iter_passages)
+        directory: Index directory
+        dims: Vector dimensions
+        min_df: Terms in fewer passages are dropped
+        max_features: Keep at most this many terms (the most frequent ones)
+        power_iterations: SVD subspace iterations (each costs two passes over the matrix)
+        seed: Random seed of the SVD
+        store_passages: Write passages.jsonl (False when the directory already has it, e.g. from a BM25 build)
+
+    Returns:
+        The index metadata (also written to dense.json)
+    """
+    start = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    store = PassageWriter(directory) if store_passages else None
+
+    vocab: Dict[str, int] = {}
+    df = array("I")
+    docs: List[array] = []
+    tfs: List[array] = []
+    for passage in passages:
+        if store is not None:
+            store.add(passage)
+        counts: Dict[int, int] = {}
+        for feature in features(tokenize(passage_text(passage))):
+            term = vocab.get(feature)
+            if term is None:
+                term = vocab[feature] = len(df)
+                df.append(0)
+            counts[term] = counts.get(term, 0) + 1
+        for term in counts:
+            df[term] += 1
+        docs.append(array("I", counts.keys()))
+        tfs.append(array("H", (min(tf, 65535) for tf in counts.values())))
+    if store is not None:
+        store.close()
+    n_docs = len(docs)
+    read_seconds = time.perf_counter() - start
+
+    # Keep the terms that occur in at least min_df passages, the most frequent first
+    df_array = np.frombuffer(df, dtype=np.uint32) if len(df) else np.zeros(0, dtype=np.uint32)
+    candidates = np.flatnonzero(df_array >= min_df)
+    kept = candidates[np.argsort(-df_array[candidates], kind="stable")[:max_features]]
+    remap = np.full(len(df_array), -1, dtype=np.int64)
+    remap[kept] = np.arange(len(kept))
+    terms = list(vocab)
+    kept_terms = [terms[term] for term in kept]
+    if n_docs < 2 or len(kept_terms) < 2:
+        # The SVD needs at least two passages and two terms; an empty vectors.f32 could not be opened
+        raise ValueError(f"Too little text for a dense index: {n_docs} passages and {len(kept_terms)} terms "
+                         f"in at least {min_df} passages (at least 2 of each are needed; lower min_df or "
+                         f"add passages)")
+    idf =(np.log((1 + n_docs) / (1 + df_array[kept].astype(np.float32))) + 1).astype(np.float32)
+
+    kept_docs, kept_tfs = [], []
+    for doc, tf in zip(docs, tfs):
+        ids = remap[np.frombuffer(doc, dtype=np.uint32)] if len(doc) else np.zeros(0, dtype=np.int64)
+        mask = ids >= 0
+        kept_docs.append(ids[mask])
+        kept_tfs.append(np.frombuffer(tf, dtype=np.uint16)[mask] if len(tf) else np.zeros(0, dtype=np.uint16))
+    del docs, tfs
+    matrix = tfidf_rows(kept_docs, kept_tfs, idf, len(kept_terms))
+    del kept_docs, kept_tfs
+
+    dims = max(1, min(dims, n_docs - 1, len(kept_terms) - 1))
+    svd_start = time.perf_counter()
+    components = randomized_svd(matrix, dims, power_iterations=power_iterations, seed=seed)
+    vectors = _normalize_rows(matrix.dot(components)).astype(np.float32)
+    svd_seconds = time.perf_counter() - svd_start
+
+    vectors.tofile(os.path.join(directory, VECTORS_FILE))
+    components.tofile(os.path.join(directory, COMPONENTS_FILE))
+    idf.tofile(os.path.join(directory, IDF_FILE))
+    with open(os.path.join(directory, VOCAB_FILE), "w", encoding="utf-8") as f:
+        f.write("\n".join(kept_terms))
+
+    meta = {
+        "version": INDEX_VERSION,
+        "documents": n_docs,
+        "dims": dims,
+        "terms": len(kept_terms),
+        "nonzeros": int(matrix.indptr[-1]),
+        "build_seconds": round(time.perf_counter() - start, 3),
+        "read_seconds": round(read_seconds, 3),
+        "svd_seconds": round(svd_seconds, 3),
+    }
+    with open(os.path.join(directory, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def write_vectors(model: "DenseModel", passages: Iterable[Dict], directory: str, batch_size: int = 1024) -> Dict:
+    """
+    Embeds passages with an existing model and writes them as a dense index without model files.
+
+    Used for the delta segments of an incremental index (see segments.py):
+    new passages are projected into the space of the model trained on the
+    full corpus instead of training a new one. Open the result with
+    ``DenseIndex(directory, model_dir=...)``.
+
+    Args:
+        model: Trained model
+        passages: Passage dicts, in the order of the directory's passages.jsonl
+        directory: Output directory
+        batch_size: Passages embedded per sparse product
+
+    Returns:
+        The index metadata (also written to dense.json)
+    """
+    os.makedirs(directory, exist_ok=True)
+    documents = 0
+    batch: List[str] = []
+    with open(os.path.join(directory, VECTORS_FILE), "wb") as f:
+        for passage in passages:
+            batch.append(passage_text(passage))
+            if len(batch) == batch_size:
+                model.embed(batch).astype(np.float32).tofile(f)
+                documents += len(batch)
+                batch = []
+        if batch:
+            model.embed(batch).astype(np.float32).tofile(f)
+            documents += len(batch)
+    meta = {"version": INDEX_VERSION, "documents": documents, "dims": model.dims, "external_model": True}
+    with open(os.path.join(directory, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+class DenseModel:
+    """The LSA projection of an index: vocabulary, idf weights and SVD components."""
+
+    def __init__(self, directory: str, dims: int):
+        self.dims = dims
+        with open(os.path.join(directory, VOCAB_FILE), "r", encoding="utf-8") as f:
+            self.vocab = {term: term_id for term_id, term in enumerate(f.read().split("\n")) if term}
+        self.idf = np.fromfile(os.path.join(directory, IDF_FILE), dtype=np.float32)
+        self.components = np.fromfile(os.path.join(directory, COMPONENTS_FILE), dtype=np.float32).reshape(-1, dims)
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """Projects texts into the passage vector space (float32[len(texts), dims])."""
+        docs, tfs = [], []
+        for text in texts:
+            counts: Dict[int, int] = {}
+            for feature in features(tokenize(text)):
+                term = self.vocab.get(feature)
+                if term is not None:
+                    counts[term] = counts.get(term, 0) + 1
+            docs.append(list(counts))
+            tfs.append(list(counts.values()))
+        matrix = tfidf_rows(docs, tfs, self.idf, len(self.idf))
+        return _normalize_rows(matrix.dot(self.components))
+
+
+class DenseIndex:
+    """Read side of a dense index: memory-mapped passage vectors and the LSA projection."""
+
+    def __init__(self, directory: str, model_dir: Optional[str] = None):
+        """
+        Args:
+            directory: Index directory
+            model_dir: Directory of the model files, if not the index directory (see write_vectors)
+        """
+        with open(os.path.join(directory, META_FILE), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported dense index version {self.meta.get('version')} in {directory}")
+        self.directory = directory
+        self.documents = self.meta["documents"]
+        self.dims = self.meta["dims"]
+        self.model = DenseModel(model_dir or directory, self.dims)
+        self.vectors = np.memmap(os.path.join(directory, VECTORS_FILE), dtype=np.float32, mode="r",
+                                 shape=(self.documents, self.dims)) if self.documents else \
+            np.zeros((0, self.dims), dtype=np.float32)
+        self.passages = PassageStore(directory)
+
+    def embed(self, questions: Sequence[str]) -> np.ndarray:
+        """Projects questions into the passage vector space (float32[len(questions), dims])."""
+        return self.model.embed(questions)
+
+    def scores(self, questions: Sequence[str]) -> np.ndarray:
+        """Returns the cosine similarity of every question to every passage (float32[questions, passages])."""
+        return self.embed(questions) @ self.vectors.T
+
+    def search_batch(self, questions: Sequence[str], k: int = 10,
+                     batch_size: int = 256) -> List[List[Tuple[int, float]]]:
+        """
+        Finds the top-k passages of many questions at once.
+
+        Args:
+            questions: Questions
+            k: Passages per question
+            batch_size: Questions scored per matrix multiply (bounds the score matrix memory)
+
+        Returns:
+            For every question, (passage number, cosine) pairs, best first
+        """
+        k = min(k, self.documents)
+        if k == 0:
+            return [[] for _ in questions]
+        query_vectors = self.embed(questions)
+        results = []
+        for start in range(0, len(questions), batch_size):
+            scores = query_vectors[start:start + batch_size] @ self.vectors.T
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+            results.extend(
+                list(zip(row.tolist(), row_scores.tolist())) for row, row_scores in zip(top, top_scores)
+            )
+        return results
+
+    def search(self, question: str, k: int = 10) -> List[Tuple[float, Dict]]:
+        """Returns the top-k (cosine, passage) pairs of one question."""
+        return [(score, self.passages[doc]) for doc, score in self.search_batch([question], k)[0]]
+
+    def close(self) -> None:
+        self.passages.close()
+
+
+def sample_queries(passages: PassageStore, count: int, seed: int = 0) -> List[str]:
+    """Picks short word windows from random passages as benchmark questions."""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        tokens = passages[rng.randrange(len(passages))]["text"].split()
+        start = rng.randrange(max(len(tokens) - 6, 1))
+        queries.append(" ".join(tokens[start:start + 6]))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline dense (LSA) retrieval over the crawled corpus.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Train the LSA model and build the index")
+    build.add_argument("inputs", nargs="+", help="crawled_data/ directories, shard directories or passages.jsonl")
+    build.add_argument("-o", "--output", default="dense_index", help="Index directory (default: dense_index)")
+    build.add_argument("--dims", type=int, default=256, help="Vector dimensions (default: 256)")
+    build.add_argument("--min-df", type=int, default=2, help="Minimum passages per term (default: 2)")
+    build.add_argument("--max-features", type=int, default=200000, help="Maximum terms (default: 200000)")
+    build.add_argument("--power-iterations", type=int, default=2,
+                        help="SVD subspace iterations: more is slower but more accurate (default: 2)")
+    build.add_argument("--max-tokens", type=int, default=200, help="Maximum tokens per passage (default: 200)")
+    build.add_argument("--overlap", type=int, default=40, help="Overlap between passages in tokens (default: 40)")
+
+    query = commands.add_parser("query", help="Search the index")
+    query.add_argument("index")
+    query.add_argument("query")
+    query.add_argument("-k", type=int, default=10, help="Number of passages (default: 10)")
+
+    bench = commands.add_parser("bench", help="Time a batch of questions")
+    bench.add_argument("index")
+    bench.add_argument("--queries-file", default=None, help="File with one question per line")
+    bench.add_argument("--queries", type=int, default=1000, help="Sampled questions if no file is given")
+    bench.add_argument("-k", type=int, default=10)
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        passages = iter_passages(args.inputs, args.max_tokens, args.overlap)
+        meta = build_index(passages, args.output, args.dims, args.min_df, args.max_features,
+                           args.power_iterations)
+        size = os.path.getsize(os.path.join(args.output, VECTORS_FILE))
+        logger.info(f"Indexed {meta['documents']} passages ({meta['terms']} terms, {meta['nonzeros']} non-zeros) "
+                    f"in {meta['build_seconds']:.1f}s (reading {meta['read_seconds']:.1f}s, "
+                    f"SVD {meta['svd_seconds']:.1f}s); vectors {meta['dims']}-d, {size / 1024 / 1024:.1f} MB")
+    elif args.command == "query":
+        index = DenseIndex(args.index)
+        start = time.perf_counter()
+        hits = index.search(args.query, args.k)
+        elapsed = (time.perf_counter() - start) * 1000
+        for rank, (score, passage) in enumerate(hits, 1):
+            text = passage["text"].replace("\n", " | ")
+            print(f"{rank:2d}. {score:6.3f}  {passage['url']}")
+            print(f"      {text[:300]}{'…' if len(text) > 300 else ''}")
+        print(f"{len(hits)} results in {elapsed:.1f} ms")
+        index.close()
+    elif args.command == "bench":
+        index = DenseIndex(args.index)
+        if args.queries_file:
+            with open(args.queries_file, "r", encoding="utf-8") as f:
+                questions = [line.strip() for line in f if line.strip()]
+        else:
+            questions = sample_queries(index.passages, args.queries)
+        start = time.perf_counter()
+        index.search_batch(questions, args.k)
+        elapsed = time.perf_counter() - start
+        print(f"{len(questions)} questions × {index.documents} passages in {elapsed * 1000:.0f} ms "
+              f"({elapsed / max(len(questions), 1) * 1000:.2f} ms per question)")
+        index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    sys.exit(main())
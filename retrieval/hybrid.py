@@ -0,0 +1,408 @@
+"""
+Hybrid retrieval: BM25 and dense (LSA) results merged with reciprocal rank fusion.
+
+``HybridSearcher.search(question, k)`` is the single search API over the
+crawl output. Both retrievers run at the same time (NumPy releases the GIL
+in the heavy parts of both), each returns its top ``candidates`` passages,
+and the two rankings are fused with RRF::
+
+    score(p) = sum over retrievers of 1 / (rrf_k + rank(p))
+
+which needs no score calibration between BM25 and cosine similarity.
+Results can be filtered on the page metadata carried by every passage
+(url, title, crawl_date); when a filter leaves fewer than k passages, the
+candidate depth is doubled and the search repeated.
+
+Student questions repeat a lot, so results are kept in a bounded LRU cache
+keyed on the normalized question (its tokens, which is all the retrievers
+see), k, the filter and the corpus version. The version is a fingerprint of
+the index files and, optionally, of the crawl output (page metadata.json
+files, shards, validators.json); it is re-checked at most every
+``check_interval`` seconds, and a change empties the cache. A rebuilt index
+is also reopened.
+
+Usage:
+    python hybrid.py query index "học phí một năm là bao nhiêu" -k 5
+    python hybrid.py query index "lịch thi" --url-prefix https://hus.vnu.edu.vn/tin-tuc --since 2024-01-01
+    python hybrid.py bench index --corpus ../data_crawling/crawled_data --queries 200 --distinct 40
+"""
+import argparse
+import hashlib
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from bm25 import BM25Index, print_hits
+from dense import META_FILE as DENSE_META_FILE
+from dense import DenseIndex, sample_queries
+from passage_store import OFFSETS_FILE
+from segments import MANIFEST_FILE, SegmentedIndex
+from tokenizer import tokenize
+
+logger = logging.getLogger("hybrid")
+
+RRF_K = 60
+INDEX_FILES = ("meta.json", DENSE_META_FILE, OFFSETS_FILE, MANIFEST_FILE)
+
+
+class MetadataFilter(NamedTuple):
+    """Restricts results to pages matching all given conditions (None = no condition)."""
+
+    url_prefix: Optional[str] = None
+    title_contains: Optional[str] = None  # case-insensitive
+    since: Optional[str] = None  # ISO date or datetime, inclusive
+    until: Optional[str] = None  # ISO date or datetime, inclusive (a date covers the whole day)
+
+    def matches(self, passage: Dict) -> bool:
+        if self.url_prefix and not passage["url"].startswith(self.url_prefix):
+            return False
+        if self.title_contains and _normalize(self.title_contains) not in _normalize(passage.get("title", "")):
+            return False
+        if self.since or self.until:
+            crawl_date = passage.get("crawl_date", "")
+            if not crawl_date:
+                return False
+            if self.since and crawl_date < self.since:
+                return False
+            if self.until and crawl_date[:len(self.until)] > self.until:
+                return False
+        return True
+
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize("NFC", text).lower()
+
+
+def normalize_question(question: str) -> str:
+    """Cache key form of a question: its tokens, so "Học phí?" and "học  phí" share an entry."""
+    return " ".join(tokenize(question))
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[int]], rrf_k: int = RRF_K) -> List[Tuple[int, float]]:
+    """
+    Fuses rankings of passage numbers.
+
+    Args:
+        rankings: Passage numbers of each retriever, best first
+        rrf_k: Rank offset; larger values flatten the weight of the top ranks
+
+    Returns:
+        (passage number, fused score) pairs, best first
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, 1):
+            fused[doc] = fused.get(doc, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(fused.items(), key=lambda item: -item[1])
+
+
+def _stat_entry(digest, path: str) -> None:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return
+    digest.update(f"{path}\0{stat.st_mtime_ns}\0{stat.st_size}\n".encode("utf-8", "surrogateescape"))
+
+
+def fingerprint(index_dir: str, corpus_paths: Sequence[str] = ()) -> Tuple[str, str]:
+    """
+    Fingerprints the index files and the crawl output.
+
+    Page files are rewritten in place, so a page directory is represented by
+    its metadata.json (whose crawl_date changes on every save); shard files
+    and top-level files such as validators.json are stat'ed directly.
+
+    Args:
+        index_dir: Index directory
+        corpus_paths: crawled_data/ trees, shard directories or shard files
+
+    Returns:
+        (index fingerprint, corpus fingerprint) hex digests
+    """
+    index_digest = hashlib.blake2b(digest_size=8)
+    for name in INDEX_FILES:
+        _stat_entry(index_digest, os.path.join(index_dir, name))
+
+    corpus_digest = hashlib.blake2b(digest_size=8)
+    for path in corpus_paths:
+        if not os.path.isdir(path):
+            _stat_entry(corpus_digest, path)
+            continue
+        with os.scandir(path) as entries:
+            for entry in sorted(entries, key=lambda entry: entry.name):
+                if entry.is_dir():
+                    _stat_entry(corpus_digest, os.path.join(entry.path, "metadata.json"))
+                else:
+                    _stat_entry(corpus_digest, entry.path)
+    return index_digest.hexdigest(), corpus_digest.hexdigest()
+
+
+class HybridSearcher:
+    """BM25 + dense search over one index directory, with RRF fusion and an LRU result cache."""
+
+    def __init__(self, index_dir: str, corpus_paths: Sequence[str] = (), cache_size: int = 1024,
+                 candidates: int = 50, rrf_k: int = RRF_K, check_interval: float = 5.0):
+        """
+        Args:
+            index_dir: Directory holding a BM25 index, a dense index or both, built from the same inputs
+            corpus_paths: Crawl output the indexes were built from; changes to it invalidate the cache
+            cache_size: Maximum cached results (0 disables the cache)
+            candidates: Passages taken from each retriever before fusion
+            rrf_k: RRF rank offset
+            check_interval: Minimum seconds between two corpus version checks
+        """
+        self.index_dir = index_dir
+        self.corpus_paths = list(corpus_paths)
+        self.cache_size = cache_size
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._cache: "OrderedDict[Tuple, List[Tuple[float, Dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="hybrid")
+        self.bm25: Optional[BM25Index] = None
+        self.dense: Optional[DenseIndex] = None
+        self._index_version, self._corpus_version = fingerprint(index_dir, self.corpus_paths)
+        self._checked_at = time.monotonic()
+        self._open_indexes()
+
+    @property
+    def version(self) -> str:
+        """Corpus version: changes whenever the indexes are rebuilt or the crawl output changes."""
+        return f"{self._index_version}-{self._corpus_version}"
+
+    @property
+    def documents(self) -> int:
+        return (self.bm25 or self.dense).documents
+
+    def _open_indexes(self) -> None:
+        if os.path.exists(os.path.join(self.index_dir, MANIFEST_FILE)):
+            # A segmented index (segments.py) serves both sides
+            bm25 = SegmentedIndex(self.index_dir)
+            dense = bm25 if bm25.has_dense else None
+        else:
+            bm25 = BM25Index(self.index_dir) if os.path.exists(os.path.join(self.index_dir, "meta.json")) else None
+            dense = DenseIndex(self.index_dir) if os.path.exists(os.path.join(self.index_dir, DENSE_META_FILE)) \
+                else None
+        if bm25 is None and dense is None:
+            raise FileNotFoundError(f"No BM25 or dense index in {self.index_dir}")
+        if bm25 is not None and dense is not None and bm25.documents != dense.documents:
+            raise ValueError(f"BM25 ({bm25.documents}) and dense ({dense.documents}) indexes in "
+                             f"{self.index_dir} were built from different passages")
+        old = {id(index): index for index in (self.bm25, self.dense) if index is not None}
+        self.bm25, self.dense = bm25, dense
+        for index in old.values():
+            index.close()
+
+    def _check_version(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        index_version, corpus_version = fingerprint(self.index_dir, self.corpus_paths)
+        if (index_version, corpus_version) == (self._index_version, self._corpus_version):
+            return
+        if index_version != self._index_version:
+            try:
+                self._open_indexes()
+            except (OSError, ValueError) as e:
+                # Probably a rebuild in progress: keep serving the old index and retry at the next check
+                logger.warning(f"Could not reopen the indexes in {self.index_dir}: {e}")
+                return
+            logger.info(f"Reopened the indexes in {self.index_dir}")
+        self._index_version, self._corpus_version = index_version, corpus_version
+        with self._lock:
+            self._cache.clear()
+            self.invalidations += 1
+        logger.info(f"Corpus version changed to {self.version}: result cache cleared")
+
+    def _rankings(self, questions: Sequence[str], depth: int) -> List[List[List[int]]]:
+        # BM25 scores one question at a time; the dense index scores the whole batch in one matrix multiply
+        futures = []
+        if self.bm25 is not None:
+            futures.append(self._executor.submit(
+                lambda: [[doc for doc, _ in self.bm25.top(question, depth)] for question in questions]))
+        if self.dense is not None:
+            futures.append(self._executor.submit(
+                lambda: [[doc for doc, _ in hits] for hits in self.dense.search_batch(questions, depth)]))
+        per_retriever = [future.result() for future in futures]
+        return [list(rankings) for rankings in zip(*per_retriever)]
+
+    def _fuse(self, rankings: List[List[int]], k: int, filters: Optional[MetadataFilter]
+              ) -> List[Tuple[float, Dict]]:
+        passages = (self.bm25 or self.dense).passages
+        hits = []
+        for doc, score in reciprocal_rank_fusion(rankings, self.rrf_k):
+            passage = passages[doc]
+            if filters is None or filters.matches(passage):
+                hits.append((score, passage))
+                if len(hits) == k:
+                    break
+        return hits
+
+    def _search_many(self, questions: Sequence[str], k: int, filters: Optional[MetadataFilter]
+                     ) -> List[List[Tuple[float, Dict]]]:
+        depth = max(self.candidates, k)
+        results = [self._fuse(rankings, k, filters) for rankings in self._rankings(questions, depth)]
+        for i, hits in enumerate(results):
+            # A filter left too few passages: search deeper for this question only
+            depth_i = depth
+            while filters is not None and len(hits) < k and depth_i < self.documents:
+                depth_i = min(depth_i * 2, self.documents)
+                hits = self._fuse(self._rankings([questions[i]], depth_i)[0], k, filters)
+            results[i] = hits
+        return results
+
+    def search_batch(self, questions: Sequence[str], k: int = 10, filters: Optional[MetadataFilter] = None
+                     ) -> List[List[Tuple[float, Dict]]]:
+        """
+        Searches many questions at once; cache misses share one dense scoring call.
+
+        Args:
+            questions: Questions
+            k: Passages per question
+            filters: Page metadata conditions applied to every question (None = all pages)
+
+        Returns:
+            For every question, (fused score, passage) pairs, best first
+        """
+        self._check_version()
+        version = self.version
+        results: List[Optional[List[Tuple[float, Dict]]]] = [None] * len(questions)
+        missing: "OrderedDict[Tuple, List[int]]" = OrderedDict()  # identical questions are searched once
+        with self._lock:
+            for i, question in enumerate(questions):
+                key = (normalize_question(question), k, filters, version)
+                hits = self._cache.get(key) if self.cache_size else None
+                if hits is not None:
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                    results[i] = list(hits)
+                elif key in missing:
+                    self.hits += 1
+                    missing[key].append(i)
+                else:
+                    self.misses += 1
+                    missing[key] = [i]
+
+        if missing:
+            found = self._search_many([questions[indexes[0]] for indexes in missing.values()], k, filters)
+            with self._lock:
+                for (key, indexes), hits in zip(missing.items(), found):
+                    for i in indexes:
+                        results[i] = list(hits)
+                    if self.cache_size:
+                        self._cache[key] = hits
+                        self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return results
+
+    def search(self, question: str, k: int = 10, filters: Optional[MetadataFilter] = None
+               ) -> List[Tuple[float, Dict]]:
+        """
+        Returns the top-k passages of a question.
+
+        Args:
+            question: Question or keywords
+            k: Number of passages
+            filters: Page metadata conditions (None = all pages)
+
+        Returns:
+            (fused score, passage) pairs, best first
+        """
+        return self.search_batch([question], k, filters)[0]
+
+    def cache_info(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._cache),
+                "max_size": self.cache_size,
+                "invalidations": self.invalidations,
+                "version": self.version,
+            }
+
+    def close(self) -> None:
+        self._executor.shutdown()
+        for index in (self.bm25, self.dense):
+            if index is not None:
+                index.close()
+
+
+def _add_searcher_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("index", help="Directory with the BM25 and/or dense index")
+    parser.add_argument("-k", type=int, default=10, help="Number of passages (default: 10)")
+    parser.add_argument("--corpus", nargs="*", default=[], help="Crawl output watched for changes")
+    parser.add_argument("--candidates", type=int, default=50, help="Passages per retriever (default: 50)")
+    parser.add_argument("--cache-size", type=int, default=1024, help="Cached results (default: 1024)")
+    parser.add_argument("--url-prefix", default=None, help="Only pages whose URL starts with this")
+    parser.add_argument("--title", default=None, help="Only pages whose title contains this")
+    parser.add_argument("--since", default=None, help="Only pages crawled on or after this ISO date")
+    parser.add_argument("--until", default=None, help="Only pages crawled on or before this ISO date")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hybrid (BM25 + dense) search over the crawled corpus.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    query = commands.add_parser("query", help="Search the index")
+    _add_searcher_arguments(query)
+    query.add_argument("query")
+
+    bench = commands.add_parser("bench", help="Measure latency and cache hit rate on repeated questions")
+    _add_searcher_arguments(bench)
+    bench.add_argument("--queries", type=int, default=200, help="Questions asked (default: 200)")
+    bench.add_argument("--distinct", type=int, default=40, help="Distinct questions among them (default: 40)")
+
+    args = parser.parse_args()
+    filters = MetadataFilter(args.url_prefix, args.title, args.since, args.until)
+    if filters == MetadataFilter():
+        filters = None
+    searcher = HybridSearcher(args.index, args.corpus, args.cache_size, args.candidates)
+
+    if args.command == "query":
+        start = time.perf_counter()
+        hits = searcher.search(args.query, args.k, filters)
+        elapsed = (time.perf_counter() - start) * 1000
+        print_hits(hits)
+        print(f"{len(hits)} results in {elapsed:.1f} ms")
+    elif args.command == "bench":
+        # Repetitive traffic: a few distinct questions asked many times, in random order
+        pool = sample_queries(searcher.bm25.passages if searcher.bm25 else searcher.dense.passages, args.distinct)
+        rng = random.Random(0)
+        questions = [rng.choice(pool) for _ in range(args.queries)]
+        cold, warm = [], []
+        for question in questions:
+            misses = searcher.misses
+            start = time.perf_counter()
+            searcher.search(question, args.k, filters)
+            (cold if searcher.misses > misses else warm).append((time.perf_counter() - start) * 1000)
+        info = searcher.cache_info()
+        print(f"{len(questions)} questions ({args.distinct} distinct) over {searcher.documents} passages: "
+              f"hit rate {info['hit_rate']:.0%}")
+        for name, latencies in (("miss", cold), ("hit", warm)):
+            if latencies:
+                latencies.sort()
+                print(f"  {name}: {len(latencies)} × mean {sum(latencies) / len(latencies):.2f} ms, "
+                      f"p50 {latencies[len(latencies) // 2]:.2f} ms")
+    searcher.close()
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""
+Load generator for qa_server.py.
+
+Opens ``--concurrency`` keep-alive connections, each sending questions one
+after the other, and reports latency percentiles and throughput. Questions
+come from a file or are sampled from the passages of an index (short word
+windows, see dense.sample_queries); ``--distinct`` limits how many different
+questions are asked, to measure the server with a warm result cache.
+
+Usage:
+    python load_test.py --index index --requests 2000 --concurrency 32
+    python load_test.py --questions-file questions.txt --url http://127.0.0.1:8000/ask
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from dense import sample_queries
+from passage_store import PassageStore
+from segments import MANIFEST_FILE, read_manifest
+
+logger = logging.getLogger("load_test")
+
+
+async def _http(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str, method: str,
+                path: str, body: bytes = b"") -> Tuple[int, bytes]:
+    writer.write((f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+async def run(url: str, questions: List[str], concurrency: int, k: int) -> Dict:
+    """
+    Sends every question once, over ``concurrency`` connections.
+
+    Returns:
+        Latency percentiles (ms), throughput and error count, plus the server's /stats
+    """
+    parts = urlsplit(url)
+    host, port, path = parts.hostname, parts.port or 80, parts.path or "/ask"
+    pending = iter(questions)
+    latencies: List[float] = []
+    errors = 0
+
+    async def client() -> None:
+        nonlocal errors
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for question in pending:
+                body = json.dumps({"question": question, "k": k}, ensure_ascii=False).encode("utf-8")
+                start = time.perf_counter()
+                status, _ = await _http(reader, writer, host, "POST", path, body)
+                latencies.append((time.perf_counter() - start) * 1000)
+                if status != 200:
+                    errors += 1
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(min(concurrency, len(questions)))))
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(host, port)
+    _, body = await _http(reader, writer, host, "GET", "/stats")
+    writer.close()
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": elapsed,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "mean_ms": sum(latencies) / len(latencies) if latencies else 0.0,
+        "p50_ms": percentile(latencies, 0.50) if latencies else 0.0,
+        "p99_ms": percentile(latencies, 0.99) if latencies else 0.0,
+        "server": json.loads(body),
+    }
+
+
+def load_questions(questions_file: Optional[str], index_dir: Optional[str], count: int) -> List[str]:
+    if questions_file:
+        with open(questions_file, "r", encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    if os.path.exists(os.path.join(index_dir, MANIFEST_FILE)):
+        index_dir = os.path.join(index_dir, read_manifest(index_dir)["segments"][0]["name"])
+    passages = PassageStore(index_dir)
+    try:
+        return sample_queries(passages, count)
+    finally:
+        passages.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the QA service.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/ask")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--questions-file", help="File with one question per line")
+    source.add_argument("--index", help="Index directory to sample questions from")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests sent (default: 2000)")
+    parser.add_argument("--distinct", type=int, default=0,
+                        help="Different questions among the requests (default: all different)")
+    parser.add_argument("--concurrency", type=int, default=32, help="Parallel connections (default: 32)")
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    pool = load_questions(args.questions_file, args.index, args.distinct or args.requests)
+    rng = random.Random(0)
+    questions = [rng.choice(pool) for _ in range(args.requests)] if args.distinct else pool[:args.requests]
+
+    result = asyncio.run(run(args.url, questions, args.concurrency, args.k))
+    server = result["server"]
+    print(f"{result['requests']} requests, {args.concurrency} connections: {result['rps']:.0f} req/s, "
+          f"p50 {result['p50_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms, mean {result['mean_ms']:.1f} ms, "
+          f"{result['errors']} errors")
+    print(f"Server: {server['batches']} batches (mean {server['mean_batch']:.1f}, largest {server['largest_batch']}), "
+          f"cache hit rate {server['cache']['hit_rate']:.0%}")
+    return 1 if result["errors"] else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    sys.exit(main())
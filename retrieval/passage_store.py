@@ -0,0 +1,68 @@
+"""
+Passage storage shared by the retrieval indexes.
+
+Indexes refer to passages by their number (0..N-1). The passages themselves
+are kept once, in ``passages.jsonl`` next to the index, with an array of
+line offsets (``passages.offsets``, uint64). A lookup memory-maps the file
+and decodes only the line asked for.
+"""
+import json
+import mmap
+import os
+from array import array
+from typing import Dict, Iterator
+
+PASSAGES_FILE = "passages.jsonl"
+OFFSETS_FILE = "passages.offsets"
+
+
+class PassageWriter:
+    """Appends passages in index order and records their offsets."""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._file = open(os.path.join(directory, PASSAGES_FILE), "wb")
+        self._offsets = array("Q")
+
+    def add(self, passage: Dict) -> int:
+        """Stores a passage and returns its number."""
+        self._offsets.append(self._file.tell())
+        self._file.write(json.dumps(passage, ensure_ascii=False).encode("utf-8") + b"\n")
+        return len(self._offsets) - 1
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def close(self) -> None:
+        end = array("Q", [self._file.tell()])
+        self._file.close()
+        with open(os.path.join(self.directory, OFFSETS_FILE), "wb") as f:
+            self._offsets.tofile(f)
+            end.tofile(f)
+
+
+class PassageStore:
+    """Random access to stored passages by number."""
+
+    def __init__(self, directory: str):
+        self.offsets = array("Q")
+        with open(os.path.join(directory, OFFSETS_FILE), "rb") as f:
+            self.offsets.frombytes(f.read())
+        self._file = open(os.path.join(directory, PASSAGES_FILE), "rb")
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b""
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, number: int) -> Dict:
+        return json.loads(self._data[self.offsets[number]:self.offsets[number + 1]])
+
+    def __iter__(self) -> Iterator[Dict]:
+        for number in range(len(self)):
+            yield self[number]
+
+    def close(self) -> None:
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
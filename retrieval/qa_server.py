@@ -0,0 +1,368 @@
+"""
+Local question-answering HTTP service over the crawled corpus.
+
+The service loads a hybrid index (see hybrid.py) once at startup and serves:
+
+- ``POST /ask`` with ``{"question": "...", "k": 5, "filters": {...}}``:
+  ranked passages, an extractive answer (the best matching sentence of the
+  top passages) and its source URL. ``filters`` takes the MetadataFilter
+  fields (url_prefix, title_contains, since, until).
+- ``GET /stats``: request, batch and cache counters.
+
+It is a plain asyncio server with no dependency beyond the index modules and
+no outside service. Concurrent requests are micro-batched: a request waits at
+most ``max_wait_ms`` for others, then the whole batch is scored with one
+``HybridSearcher.search_batch`` call (one dense matrix multiply for all its
+questions) on a worker thread, so the event loop keeps accepting connections
+while a batch is scored and the next batch forms in the meantime.
+
+Usage:
+    python qa_server.py index --corpus ../data_crawling/crawled_data --port 8000
+    curl -s localhost:8000/ask -d '{"question": "học phí một năm là bao nhiêu", "k": 3}'
+    python load_test.py --index index --requests 2000 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from chunker import split_sentences
+from hybrid import HybridSearcher, MetadataFilter
+from tokenizer import fold_tokens, tokenize
+
+logger = logging.getLogger("qa_server")
+
+MAX_BODY_BYTES = 64 * 1024
+MAX_K = 50
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class BadRequest(ValueError):
+    """A request the service cannot answer."""
+
+    status = 400
+
+
+class PayloadTooLarge(BadRequest):
+    status = 413
+
+
+def _candidate_spans(passage: Dict) -> List[str]:
+    if passage.get("kind") == "table":
+        return [line for line in passage["text"].split("\n") if line.strip()]
+    return split_sentences(passage["text"])
+
+
+def extract_answer(question: str, hits: List[Tuple[float, Dict]], max_passages: int = 3) -> Optional[Dict]:
+    """
+    Picks the sentence (or table row) of the top passages that best matches the question.
+
+    Sentences are scored on the folded question syllables they contain,
+    weighted by how rare each syllable is among the candidate sentences,
+    plus a bonus per matching syllable pair; a passage's rank breaks ties.
+
+    Args:
+        question: The question
+        hits: (score, passage) pairs, best first
+        max_passages: Passages searched for the answer
+
+    Returns:
+        {"text", "url", "title", "passage_id", "start", "end"} with character offsets
+        of the span in the passage text (-1 if it was reflowed), or None if nothing matches
+    """
+    query = fold_tokens(tokenize(question))
+    query_terms = set(query)
+    query_pairs = set(zip(query, query[1:]))
+    candidates = []
+    for rank, (_, passage) in enumerate(hits[:max_passages]):
+        for span in _candidate_spans(passage):
+            tokens = fold_tokens(tokenize(span))
+            candidates.append((rank, passage, span, set(tokens), set(zip(tokens, tokens[1:]))))
+    if not candidates or not query_terms:
+        return None
+
+    frequency = {term: sum(1 for candidate in candidates if term in candidate[3]) for term in query_terms}
+    weight = {term: math.log(1 + len(candidates) / (1 + count)) for term, count in frequency.items()}
+    best, best_score = None, 0.0
+    for rank, passage, span, terms, pairs in candidates:
+        score = sum(weight[term] for term in query_terms & terms) + 0.5 * len(query_pairs & pairs) - 0.01 * rank
+        if score > best_score:
+            best, best_score = (passage, span), score
+    if best is None:
+        return None
+
+    passage, span = best
+    start = passage["text"].find(span)
+    return {
+        "text": span,
+        "url": passage["url"],
+        "title": passage.get("title", ""),
+        "passage_id": passage.get("id"),
+        "start": start,
+        "end": start + len(span) if start >= 0 else -1,
+    }
+
+
+def parse_filters(value) -> Optional[MetadataFilter]:
+    if not value:
+        return None
+    if not isinstance(value, dict):
+        raise BadRequest("filters must be an object")
+    unknown = set(value) - set(MetadataFilter._fields)
+    if unknown:
+        raise BadRequest(f"unknown filters: {', '.join(sorted(unknown))}")
+    if not all(isinstance(field, str) for field in value.values()):
+        raise BadRequest("filter values must be strings")
+    return MetadataFilter(**value)
+
+
+class QAService:
+    """Micro-batches questions into HybridSearcher.search_batch calls."""
+
+    def __init__(self, searcher: HybridSearcher, max_batch: int = 64, max_wait_ms: float = 2.0,
+                 answer_passages: int = 3):
+        self.searcher = searcher
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.answer_passages = answer_passages
+        self.requests = 0
+        self.batches = 0
+        self.batched_questions = 0
+        self.largest_batch = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._batcher: Optional[asyncio.Task] = None
+        # One scoring thread: batches run one after the other while the next one fills up
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="qa-batch")
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.create_task(self._batch_loop())
+
+    async def ask(self, question: str, k: int, filters: Optional[MetadataFilter]) -> Dict:
+        future = asyncio.get_running_loop().create_future()
+        self.requests += 1
+        await self._queue.put((question, k, filters, future))
+        return await future
+
+    async def _batch_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            if self.max_wait and self._queue.empty():
+                await asyncio.sleep(self.max_wait)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            self.batches += 1
+            self.batched_questions += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+
+            # search_batch takes one k and filter for all its questions: group the batch by them
+            groups: Dict[Tuple, List[Tuple[str, asyncio.Future]]] = {}
+            for question, k, filters, future in batch:
+                groups.setdefault((k, filters), []).append((question, future))
+            for (k, filters), items in groups.items():
+                try:
+                    answers = await loop.run_in_executor(
+                        self._executor, self._answer_batch, [question for question, _ in items], k, filters)
+                except Exception as e:
+                    logger.exception(f"Batch of {len(items)} questions failed")
+                    for _, future in items:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                for (_, future), answer in zip(items, answers):
+                    if not future.done():  # the client may have gone away
+                        future.set_result(answer)
+
+    def _answer_batch(self, questions: List[str], k: int, filters: Optional[MetadataFilter]) -> List[Dict]:
+        results = []
+        for question, hits in zip(questions, self.searcher.search_batch(questions, k, filters)):
+            results.append({
+                "question": question,
+                "answer": extract_answer(question, hits, self.answer_passages),
+                "passages": [
+                    {
+                        "rank": rank,
+                        "score": round(score, 6),
+                        "id": passage.get("id"),
+                        "url": passage["url"],
+                        "title": passage.get("title", ""),
+                        "heading_path": passage.get("heading_path", []),
+                        "text": passage["text"],
+                    }
+                    for rank, (score, passage) in enumerate(hits, 1)
+                ],
+            })
+        return results
+
+    def stats(self) -> Dict:
+        return {
+            "documents": self.searcher.documents,
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch": self.batched_questions / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "cache": self.searcher.cache_info(),
+        }
+
+    async def close(self) -> None:
+        if self._batcher is not None:
+            self._batcher.cancel()
+            try:
+                await self._batcher
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown()
+
+
+async def _read_line(reader: asyncio.StreamReader) -> bytes:
+    try:
+        return await reader.readline()
+    except ValueError:
+        # readline turns a line longer than the stream limit (LimitOverrunError) into ValueError
+        raise BadRequest("request line or header too long")
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+    request_line = await _read_line(reader)
+    if not request_line:
+        return None
+    parts = request_line.decode("latin-1").split()
+    if len(parts) != 3:
+        raise BadRequest("malformed request line")
+    method, target, version = parts
+    headers = {}
+    while True:
+        line = await _read_line(reader)
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    headers[":version"] = version
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise BadRequest("invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise PayloadTooLarge(f"body larger than {MAX_BODY_BYTES} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return method, target, headers, body
+
+
+def _response(status: int, payload: Dict, keep_alive: bool) -> bytes:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = (f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode("latin-1") + body
+
+
+async def _route(service: QAService, method: str, path: str, body: bytes) -> Tuple[int, Dict]:
+    if path == "/stats":
+        return (200, service.stats()) if method == "GET" else (405, {"error": "use GET"})
+    if path != "/ask":
+        return 404, {"error": f"no route {path}"}
+    if method != "POST":
+        return 405, {"error": "use POST"}
+
+    try:
+        request = json.loads(body or b"{}")
+    except ValueError:
+        raise BadRequest("body is not JSON")
+    if not isinstance(request, dict):
+        raise BadRequest("body must be a JSON object")
+    question = request.get("question")
+    if not isinstance(question, str) or not question.strip():
+        raise BadRequest("question is required")
+    k = request.get("k", 5)
+    if not isinstance(k, int) or isinstance(k, bool) or not 1 <= k <= MAX_K:
+        raise BadRequest(f"k must be an integer between 1 and {MAX_K}")
+    filters = parse_filters(request.get("filters"))
+
+    start = time.perf_counter()
+    result = await service.ask(question.strip(), k, filters)
+    return 200, dict(result, took_ms=round((time.perf_counter() - start) * 1000, 3))
+
+
+async def handle_connection(service: QAService, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> None:
+    """Serves the requests of one (keep-alive) connection."""
+    try:
+        while True:
+            try:
+                request = await _read_request(reader)
+            except BadRequest as e:
+                writer.write(_response(e.status, {"error": str(e)}, keep_alive=False))
+                await writer.drain()
+                break
+            if request is None:
+                break
+            method, target, headers, body = request
+            keep_alive = (headers.get("connection", "").lower() != "close"
+                          and headers[":version"] == "HTTP/1.1")
+            try:
+                status, payload = await _route(service, method, target.split("?", 1)[0], body)
+            except BadRequest as e:
+                status, payload = 400, {"error": str(e)}
+            except Exception as e:
+                logger.exception(f"Error answering {method} {target}")
+                status, payload = 500, {"error": str(e)}
+            writer.write(_response(status, payload, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(searcher: HybridSearcher, host: str, port: int, max_batch: int, max_wait_ms: float) -> None:
+    service = QAService(searcher, max_batch, max_wait_ms)
+    service.start()
+    server = await asyncio.start_server(lambda r, w: handle_connection(service, r, w), host, port, backlog=1024)
+    logger.info(f"Serving {searcher.documents} passages on http://{host}:{port} "
+                f"(batches of up to {max_batch}, waiting {max_wait_ms} ms)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Question-answering HTTP service over the crawled corpus.")
+    parser.add_argument("index", help="Directory with the BM25 and/or dense index")
+    parser.add_argument("--corpus", nargs="*", default=[], help="Crawl output watched for changes (cache invalidation)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch", type=int, default=64, help="Questions per scoring call (default: 64)")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0,
+                        help="Time a request waits for others to batch with (default: 2)")
+    parser.add_argument("--cache-size", type=int, default=1024, help="Cached results (default: 1024)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    searcher = HybridSearcher(args.index, args.corpus, args.cache_size)
+    logger.info(f"Loaded {args.index} in {time.perf_counter() - start:.2f}s")
+    try:
+        asyncio.run(serve(searcher, args.host, args.port, args.max_batch, args.max_wait_ms))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        searcher.close()
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    sys.exit(main())
@@ -0,0 +1,701 @@
+"""
+Segmented search index, updated incrementally from re-crawls.
+
+Rebuilding the BM25 and dense indexes after every crawl is wasteful when a
+few news pages changed. A segmented index is a set of immutable segments,
+each a BM25 index plus dense vectors over the passages of some pages, and a
+manifest that says which segments are live:
+
+    index/
+        segments.json               manifest (generation, segments, tombstones)
+        dense.vocab, dense_idf.f32,
+        components.f32              the LSA model, trained at the full build
+        seg-000001/                 meta.json, <field>.*, passages.*  (bm25.py)
+                                    vectors.f32, dense.json           (dense.py)
+                                    pages.json  {url: [first passage, passages, content sha256]}
+
+``update`` compares the ``content_sha256`` of every page's metadata.json
+(written by the crawler; hashed from content.txt for older crawls) with the
+hashes recorded in the live segments. Added and changed pages are chunked
+into one small delta segment, embedded with the existing LSA model, and the
+old copies of changed and removed pages become tombstones: URLs listed under
+their segment in the manifest, whose passages queries skip. The manifest is
+replaced atomically, so readers (``SegmentedIndex``, which HybridSearcher
+opens when it finds a manifest and reopens when it changes) see either the
+old or the new generation.
+
+Small segments are merged in the background with a tiered policy: when
+``merge_factor`` segments have live sizes of the same order of magnitude
+(in base ``merge_factor``), they are rewritten as one segment without their
+deleted passages, and so is any segment that is mostly tombstones. Merges
+copy passages and vectors; only the BM25 postings of the merged pages are
+rebuilt. Tombstones added to a segment while it was being merged are carried
+over to the merged segment when the merge commits.
+
+BM25 scores use collection statistics summed over all segments (document
+count and document frequency, counting deleted passages as Lucene does);
+length normalization uses each segment's own average length. The dense
+model is not retrained by updates; run a full build from time to time.
+
+Usage:
+    python segments.py build ../data_crawling/crawled_data -o index --fold
+    python segments.py update index ../data_crawling/crawled_data
+    python segments.py watch index ../data_crawling/crawled_data --interval 5
+    python segments.py status index
+"""
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import shutil
+import sys
+import threading
+import time
+from bisect import bisect_right
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import bm25
+import dense
+from bm25 import FIELD_WEIGHTS, BM25Index
+from chunker import SHARD_PATTERN, chunk_pages, iter_pages
+from dense import DenseModel
+from passage_store import PassageStore
+
+logger = logging.getLogger("segments")
+
+MANIFEST_VERSION = 1
+MANIFEST_FILE = "segments.json"
+PAGES_FILE = "pages.json"
+EXPUNGE_RATIO = 0.5  # a segment with this fraction of deleted passages is rewritten on its own
+
+
+def read_manifest(directory: str) -> Dict:
+    with open(os.path.join(directory, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported segment manifest version {manifest.get('version')} in {directory}")
+    return manifest
+
+
+def write_manifest(directory: str, manifest: Dict) -> None:
+    """Replaces the manifest atomically (temp file + rename)."""
+    tmp_path = os.path.join(directory, f"{MANIFEST_FILE}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST_FILE))
+
+
+def read_pages(segment_dir: str) -> Dict[str, List]:
+    with open(os.path.join(segment_dir, PAGES_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _file_sha256(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _shard_hashes(path: str, hashes: Dict[str, str]) -> None:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # partial last line of an interrupted crawl
+            if "url" in record and record["url"] not in hashes:
+                blocks = json.dumps(record["blocks"], ensure_ascii=False, sort_keys=True)
+                hashes[record["url"]] = hashlib.sha256(blocks.encode("utf-8")).hexdigest()
+
+
+def page_hashes(paths: Iterable[str]) -> Dict[str, str]:
+    """
+    Returns the content hash of every page of the crawl output, by URL.
+
+    Page directories use the ``content_sha256`` of their metadata.json, or
+    hash content.txt when the crawler predates it. Shard records hash their
+    blocks; the newest shard wins, as in chunker.iter_pages.
+
+    Args:
+        paths: crawled_data/ trees, shard directories or shard files
+
+    Returns:
+        URL → hex SHA-256
+    """
+    hashes: Dict[str, str] = {}
+    for path in paths:
+        if os.path.isfile(path):
+            _shard_hashes(path, hashes)
+            continue
+        shards = sorted((name for name in os.listdir(path) if SHARD_PATTERN.match(name)), reverse=True)
+        if shards:
+            for name in shards:
+                _shard_hashes(os.path.join(path, name), hashes)
+            continue
+        for name in sorted(os.listdir(path)):
+            metadata_file = os.path.join(path, name, "metadata.json")
+            content_file = os.path.join(path, name, "content.txt")
+            if not (os.path.isfile(metadata_file) and os.path.isfile(content_file)):
+                continue
+            try:
+                with open(metadata_file, "r", encoding="utf-8") as f:
+                    metadata = json.load(f)
+            except (IOError, ValueError) as e:
+                logger.warning(f"Skipping page directory with unreadable metadata {name}: {e}")
+                continue
+            hashes.setdefault(metadata["url"], metadata.get("content_sha256") or _file_sha256(content_file))
+    return hashes
+
+
+def _recording_pages(passages: Iterable[Dict], pages: Dict[str, List]) -> Iterator[Dict]:
+    """Passes passages through, recording the [first, count] passage range of every page in pages."""
+    number = 0
+    for passage in passages:
+        entry = pages.setdefault(passage["url"], [number, 0, ""])
+        if entry[1] == 0:
+            entry[0] = number
+        entry[1] += 1
+        number += 1
+        yield passage
+
+
+def write_segment(directory: str, passages: Iterable[Dict], hashes: Dict[str, str], fold: bool,
+                  model: Optional[DenseModel], vectors: Optional[Iterable[np.ndarray]] = None) -> Dict:
+    """
+    Writes one segment: BM25 index, dense vectors and the page table.
+
+    Args:
+        directory: Segment directory
+        passages: Passages, grouped by page
+        hashes: Content hash of every page of the segment (pages without passages included)
+        fold: Index the diacritic-folded BM25 field
+        model: Dense model the passages are embedded with (None = no dense vectors)
+        vectors: Precomputed vectors of the passages, as float32 row blocks in passage order
+            (merges copy them instead of embedding again)
+
+    Returns:
+        Segment entry of the manifest
+    """
+    pages: Dict[str, List] = {url: [0, 0, sha] for url, sha in hashes.items()}
+    meta = bm25.build_index(_recording_pages(passages, pages), directory, fold)
+    if model is not None:
+        if vectors is None:
+            store = PassageStore(directory)
+            try:
+                dense.write_vectors(model, iter(store), directory)
+            finally:
+                store.close()
+        else:
+            with open(os.path.join(directory, dense.VECTORS_FILE), "wb") as f:
+                for block in vectors:
+                    block.astype(np.float32).tofile(f)
+            with open(os.path.join(directory, dense.META_FILE), "w", encoding="utf-8") as f:
+                json.dump({"version": dense.INDEX_VERSION, "documents": meta["documents"], "dims": model.dims,
+                           "external_model": True}, f, indent=2)
+    for url, entry in pages.items():
+        entry[2] = hashes.get(url, "")
+    with open(os.path.join(directory, PAGES_FILE), "w", encoding="utf-8") as f:
+        json.dump(pages, f, ensure_ascii=False)
+    return {"name": os.path.basename(directory), "documents": meta["documents"], "pages": len(pages),
+            "deleted": [], "deleted_documents": 0}
+
+
+class _Segment:
+    def __init__(self, directory: str, info: Dict, base: int, dims: Optional[int], term_cache_mb: float):
+        self.name = info["name"]
+        self.base = base
+        self.index = BM25Index(directory, term_cache_mb)
+        self.documents = self.index.documents
+        self.vectors = None
+        if dims is not None:
+            self.vectors = np.memmap(os.path.join(directory, dense.VECTORS_FILE), dtype=np.float32, mode="r",
+                                     shape=(self.documents, dims)) if self.documents else \
+                np.zeros((0, dims), dtype=np.float32)
+
+
+class _SegmentPassages:
+    """Passage lookup by global passage number across segments."""
+
+    def __init__(self, segments: List[_Segment]):
+        self._segments = segments
+        self._bases = [segment.base for segment in segments]
+
+    def __len__(self) -> int:
+        return sum(segment.documents for segment in self._segments)
+
+    def __getitem__(self, number: int) -> Dict:
+        segment = self._segments[bisect_right(self._bases, number) - 1]
+        return segment.index.passages[number - segment.base]
+
+    def __iter__(self) -> Iterator[Dict]:
+        for segment in self._segments:
+            yield from segment.index.passages
+
+
+class SegmentedIndex:
+    """
+    Read side of a segmented index.
+
+    Offers the interfaces HybridSearcher uses from BM25Index (``top``) and
+    DenseIndex (``search_batch``) over global passage numbers: segment
+    passages are numbered one after the other, and tombstoned passages are
+    never returned.
+    """
+
+    def __init__(self, directory: str, term_cache_mb: float = 64):
+        self.directory = directory
+        self.manifest = read_manifest(directory)
+        self.generation = self.manifest["generation"]
+        dims = self.manifest["dense"]["dims"] if self.manifest.get("dense") else None
+        self.model = DenseModel(directory, dims) if dims is not None else None
+        self.segments: List[_Segment] = []
+        tombstones: List[Tuple[int, int]] = []
+        base = 0
+        try:
+            for info in self.manifest["segments"]:
+                segment_dir = os.path.join(directory, info["name"])
+                segment = _Segment(segment_dir, info, base, dims, term_cache_mb)
+                self.segments.append(segment)
+                if info["deleted"]:
+                    pages = read_pages(segment_dir)
+                    for url in info["deleted"]:
+                        first, count, _ = pages[url]
+                        tombstones.append((base + first, base + first + count))
+                base += segment.documents
+        except Exception:
+            self.close()
+            raise
+        self.documents = base
+        self.alive = np.ones(self.documents, dtype=bool)
+        for start, end in tombstones:
+            self.alive[start:end] = False
+        self.live_documents = int(self.alive.sum())
+        self.passages = _SegmentPassages(self.segments)
+        self._closed = False
+
+    @property
+    def has_dense(self) -> bool:
+        return self.model is not None
+
+    def _bm25_scores(self, query: str) -> np.ndarray:
+        runs = []
+        df: Dict[Tuple[str, str], int] = {}
+        for segment in self.segments:
+            for name, term, field, start, end in segment.index.query_runs(query):
+                docs, tf_parts = segment.index.term_postings(field, start, end)
+                runs.append((segment.base, name, term, docs, tf_parts))
+                df[name, term] = df.get((name, term), 0) + len(docs)
+        scores = np.zeros(self.documents)
+        for base, name, term, docs, tf_parts in runs:
+            scores[base + docs] += bm25.idf(self.documents, df[name, term], FIELD_WEIGHTS[name]) * tf_parts
+        scores[~self.alive] = 0
+        return scores
+
+    def top(self, query: str, k: int = 10) -> List[Tuple[int, float]]:
+        """Returns the (passage number, BM25 score) pairs of the top-k live passages, best first."""
+        scores = self._bm25_scores(query)
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(doc), float(scores[doc])) for doc in top]
+
+    def search_batch(self, questions: Sequence[str], k: int = 10,
+                     batch_size: int = 256) -> List[List[Tuple[int, float]]]:
+        """Dense top-k of many questions (see DenseIndex.search_batch), over the live passages."""
+        k = min(k, self.live_documents)
+        if k == 0 or self.model is None:
+            return [[] for _ in questions]
+        query_vectors = self.model.embed(questions)
+        results = []
+        for start in range(0, len(questions), batch_size):
+            batch = query_vectors[start:start + batch_size]
+            scores = np.concatenate([batch @ segment.vectors.T for segment in self.segments], axis=1)
+            scores[:, ~self.alive] = -np.inf
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+            results.extend(
+                list(zip(row.tolist(), row_scores.tolist())) for row, row_scores in zip(top, top_scores)
+            )
+        return results
+
+    def close(self) -> None:
+        # HybridSearcher holds this object as both its BM25 and its dense index
+        if getattr(self, "_closed", False):
+            return
+        self._closed = True
+        for segment in self.segments:
+            segment.index.close()
+
+
+def _tier(documents: int, merge_factor: int) -> int:
+    return int(math.log(max(documents, 1), merge_factor))
+
+
+class SegmentWriter:
+    """
+    Builds, updates and merges a segmented index.
+
+    One writer per index directory: updates and merges of this object are
+    serialized on their own, and the manifest is only changed under a lock,
+    so a background merge can run while an update is written.
+    """
+
+    def __init__(self, directory: str, merge_factor: int = 4):
+        self.directory = directory
+        self.merge_factor = merge_factor
+        self._lock = threading.Lock()  # manifest read-modify-write
+        self._update_lock = threading.Lock()
+        self._merge_lock = threading.Lock()
+        self._merge_thread: Optional[threading.Thread] = None
+        self._pages: Dict[str, Dict[str, List]] = {}  # segment name → page table (segments are immutable)
+
+    def _segment_pages(self, name: str) -> Dict[str, List]:
+        pages = self._pages.get(name)
+        if pages is None:
+            pages = self._pages[name] = read_pages(os.path.join(self.directory, name))
+        return pages
+
+    def _live_pages(self, manifest: Dict) -> Dict[str, Tuple[str, str]]:
+        """URL → (segment name, content hash) of the live copy of every indexed page."""
+        live = {}
+        for info in manifest["segments"]:
+            deleted = set(info["deleted"])
+            for url, (_, _, sha) in self._segment_pages(info["name"]).items():
+                if url not in deleted:
+                    live[url] = (info["name"], sha)
+        return live
+
+    def _new_segment_dir(self, manifest: Dict) -> str:
+        name = f"seg-{manifest['next_segment']:06d}"
+        manifest["next_segment"] += 1
+        return os.path.join(self.directory, name)
+
+    def _model(self, manifest: Dict) -> Optional[DenseModel]:
+        return DenseModel(self.directory, manifest["dense"]["dims"]) if manifest.get("dense") else None
+
+    def _remove_segments(self, names: Iterable[str]) -> None:
+        # Readers that still have the files memory-mapped keep them until they reopen
+        for name in names:
+            self._pages.pop(name, None)
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def build(self, paths: Sequence[str], fold: bool = False, dims: Optional[int] = 256,
+              max_tokens: int = 200, overlap_tokens: int = 40) -> Dict:
+        """
+        Builds the index from scratch as a single segment, replacing any existing one.
+
+        Args:
+            paths: crawled_data/ trees, shard directories or shard files
+            fold: Index the diacritic-folded BM25 field
+            dims: Dense vector dimensions (None = BM25 only)
+            max_tokens: Maximum tokens per passage
+            overlap_tokens: Overlap between passages
+
+        Returns:
+            The new manifest
+        """
+        start = time.perf_counter()
+        os.makedirs(self.directory, exist_ok=True)
+        with self._update_lock, self._merge_lock:
+            try:
+                old = read_manifest(self.directory)
+            except FileNotFoundError:
+                old = None
+            manifest = {
+                "version": MANIFEST_VERSION,
+                "generation": old["generation"] + 1 if old else 1,
+                "next_segment": old["next_segment"] if old else 1,
+                "fold": fold,
+                "dense": None,
+                "max_tokens": max_tokens,
+                "overlap_tokens": overlap_tokens,
+                "segments": [],
+            }
+            segment_dir = self._new_segment_dir(manifest)
+            hashes = page_hashes(paths)
+            passages = (passage.to_dict() for passage in chunk_pages(iter_pages(paths), max_tokens, overlap_tokens))
+            info = write_segment(segment_dir, passages, hashes, fold, None)
+            if dims:
+                store = PassageStore(segment_dir)
+                try:
+                    meta = dense.build_index(iter(store), segment_dir, dims, store_passages=False)
+                finally:
+                    store.close()
+                # The model belongs to the whole index: delta segments are embedded with it
+                for name in dense.MODEL_FILES:
+                    os.replace(os.path.join(segment_dir, name), os.path.join(self.directory, name))
+                manifest["dense"] = {"dims": meta["dims"], "terms": meta["terms"]}
+            manifest["segments"].append(info)
+            with self._lock:
+                write_manifest(self.directory, manifest)
+            if old:
+                self._remove_segments(segment["name"] for segment in old["segments"])
+        logger.info(f"Built {info['name']}: {info['documents']} passages from {info['pages']} pages "
+                    f"in {time.perf_counter() - start:.1f}s")
+        return manifest
+
+    def update(self, paths: Sequence[str]) -> Dict:
+        """
+        Indexes the pages added or changed since the last update, and tombstones changed and removed pages.
+
+        Args:
+            paths: The full crawl output (pages missing from it are removed from the index)
+
+        Returns:
+            Statistics: added, changed, removed, passages, segment (None if nothing changed), seconds
+        """
+        start = time.perf_counter()
+        with self._update_lock:
+            with self._lock:
+                manifest = read_manifest(self.directory)
+                live = self._live_pages(manifest)
+            hashes = page_hashes(paths)
+            added = [url for url in hashes if url not in live]
+            changed = [url for url, sha in hashes.items() if url in live and live[url][1] != sha]
+            removed = [url for url in live if url not in hashes]
+            stats = {"added": len(added), "changed": len(changed), "removed": len(removed),
+                     "passages": 0, "segment": None}
+            if not (added or changed or removed):
+                stats["seconds"] = time.perf_counter() - start
+                return stats
+
+            info = None
+            if added or changed:
+                wanted = set(added) | set(changed)
+                with self._lock:
+                    # Reserve the segment number now; a concurrent merge commit re-reads the manifest
+                    manifest = read_manifest(self.directory)
+                    segment_dir = self._new_segment_dir(manifest)
+                    write_manifest(self.directory, manifest)
+                pages = (page for page in iter_pages(paths) if page.url in wanted)
+                passages = (passage.to_dict() for passage in
+                            chunk_pages(pages, manifest["max_tokens"], manifest["overlap_tokens"]))
+                info = write_segment(segment_dir, passages, {url: hashes[url] for url in wanted},
+                                     manifest["fold"], self._model(manifest))
+                stats["passages"] = info["documents"]
+                stats["segment"] = info["name"]
+
+            with self._lock:
+                # Tombstones go to wherever the old copies live now (a merge may have moved them)
+                manifest = read_manifest(self.directory)
+                current = self._live_pages(manifest)
+                self._add_tombstones(manifest, {url: current[url][0] for url in changed + removed if url in current})
+                if info is not None:
+                    manifest["segments"].append(info)
+                manifest["generation"] += 1
+                write_manifest(self.directory, manifest)
+        stats["seconds"] = time.perf_counter() - start
+        logger.info(f"Update: {stats['added']} added, {stats['changed']} changed, {stats['removed']} removed pages; "
+                    f"{stats['passages']} passages in {stats['segment'] or 'no new segment'} "
+                    f"({stats['seconds']:.2f}s)")
+        return stats
+
+    def _add_tombstones(self, manifest: Dict, locations: Dict[str, str]) -> None:
+        by_name = {info["name"]: info for info in manifest["segments"]}
+        for url, name in locations.items():
+            info = by_name[name]
+            info["deleted"].append(url)
+            info["deleted_documents"] += self._segment_pages(name)[url][1]
+
+    def merge_candidates(self, manifest: Dict) -> List[str]:
+        """Names of the segments the merge policy would merge next (empty if none)."""
+        tiers: Dict[int, List[Dict]] = {}
+        for info in manifest["segments"]:
+            live = info["documents"] - info["deleted_documents"]
+            tiers.setdefault(_tier(live, self.merge_factor), []).append(info)
+        for tier in sorted(tiers):
+            if len(tiers[tier]) >= self.merge_factor:
+                return [info["name"] for info in tiers[tier]]
+        return [info["name"] for info in manifest["segments"]
+                if info["documents"] and info["deleted_documents"] >= EXPUNGE_RATIO * info["documents"]]
+
+    def merge(self) -> Optional[Dict]:
+        """
+        Runs one merge of the policy, if any is due.
+
+        Returns:
+            The manifest entry of the merged segment, or None if nothing was merged
+        """
+        with self._merge_lock:
+            start = time.perf_counter()
+            with self._lock:
+                manifest = read_manifest(self.directory)
+                names = self.merge_candidates(manifest)
+                if not names:
+                    return None
+                snapshot = {info["name"]: set(info["deleted"]) for info in manifest["segments"]
+                            if info["name"] in names}
+                segment_dir = self._new_segment_dir(manifest)
+                write_manifest(self.directory, manifest)
+            model = self._model(manifest)
+
+            hashes: Dict[str, str] = {}
+            stores: List[Tuple[PassageStore, List[Tuple[int, int]], Optional[np.ndarray]]] = []
+            for name in names:
+                source_dir = os.path.join(self.directory, name)
+                ranges = []
+                for url, (first, count, sha) in sorted(self._segment_pages(name).items(), key=lambda item: item[1][0]):
+                    if url not in snapshot[name]:
+                        hashes[url] = sha
+                        ranges.append((first, count))
+                store = PassageStore(source_dir)
+                vectors = None
+                if model is not None and len(store):
+                    vectors = np.memmap(os.path.join(source_dir, dense.VECTORS_FILE), dtype=np.float32, mode="r",
+                                        shape=(len(store), model.dims))
+                stores.append((store, ranges, vectors))
+
+            def passages() -> Iterator[Dict]:
+                for store, ranges, _ in stores:
+                    for first, count in ranges:
+                        for number in range(first, first + count):
+                            yield store[number]
+
+            def vector_blocks() -> Iterator[np.ndarray]:
+                for _, ranges, vectors in stores:
+                    for first, count in ranges:
+                        if count:
+                            yield vectors[first:first + count]
+
+            try:
+                info = write_segment(segment_dir, passages(), hashes, manifest["fold"], model,
+                                     vector_blocks() if model is not None else None)
+            finally:
+                for store, _, _ in stores:
+                    store.close()
+
+            with self._lock:
+                manifest = read_manifest(self.directory)
+                merged = [segment for segment in manifest["segments"] if segment["name"] in names]
+                # Pages tombstoned in the sources while the merge ran are tombstoned in the result
+                late = {url for segment in merged for url in segment["deleted"]
+                        if url not in snapshot[segment["name"]]}
+                # The merged segment takes the place of the first source
+                position = manifest["segments"].index(merged[0])
+                segments = [segment for segment in manifest["segments"] if segment["name"] not in names]
+                segments.insert(sum(1 for segment in manifest["segments"][:position] if segment["name"] not in names),
+                                info)
+                manifest["segments"] = segments
+                self._pages[info["name"]] = read_pages(segment_dir)
+                self._add_tombstones(manifest, {url: info["name"] for url in late if url in hashes})
+                manifest["generation"] += 1
+                write_manifest(self.directory, manifest)
+            self._remove_segments(names)
+        logger.info(f"Merged {len(names)} segments ({', '.join(names)}) into {info['name']}: "
+                    f"{info['documents']} passages in {time.perf_counter() - start:.2f}s")
+        return info
+
+    def merge_in_background(self) -> None:
+        """Starts a thread that merges until the policy has nothing left to merge (if none is running)."""
+        if self._merge_thread is not None and self._merge_thread.is_alive():
+            return
+
+        def run() -> None:
+            try:
+                while self.merge():
+                    pass
+            except Exception:
+                logger.exception(f"Background merge of {self.directory} failed")
+
+        self._merge_thread = threading.Thread(target=run, name="segment-merge", daemon=True)
+        self._merge_thread.start()
+
+    def wait_for_merges(self) -> None:
+        if self._merge_thread is not None:
+            self._merge_thread.join()
+
+
+def watch(writer: SegmentWriter, paths: Sequence[str], interval: float) -> None:
+    """Updates the index whenever the crawl output changes, merging in the background."""
+    from hybrid import fingerprint  # hybrid imports this module
+
+    last = None
+    while True:
+        _, current = fingerprint(writer.directory, paths)
+        if current != last:
+            if last is not None:
+                stats = writer.update(paths)
+                if stats["segment"] or stats["removed"]:
+                    writer.merge_in_background()
+            last = current
+        time.sleep(interval)
+
+
+def print_status(directory: str) -> None:
+    manifest = read_manifest(directory)
+    print(f"Generation {manifest['generation']}, {len(manifest['segments'])} segments"
+          + (f", dense model {manifest['dense']['dims']}-d" if manifest.get("dense") else ""))
+    for info in manifest["segments"]:
+        print(f"  {info['name']}: {info['documents']:7d} passages, {info['pages']:6d} pages, "
+              f"{info['deleted_documents']} passages of {len(info['deleted'])} pages deleted")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Segmented, incrementally updated search index.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Build the index from scratch")
+    build.add_argument("inputs", nargs="+", help="crawled_data/ directories, shard directories or shard files")
+    build.add_argument("-o", "--output", default="index", help="Index directory (default: index)")
+    build.add_argument("--fold", action="store_true", help="Also index a diacritic-folded BM25 field")
+    build.add_argument("--dims", type=int, default=256, help="Dense vector dimensions, 0 for none (default: 256)")
+    build.add_argument("--max-tokens", type=int, default=200, help="Maximum tokens per passage (default: 200)")
+    build.add_argument("--overlap", type=int, default=40, help="Overlap between passages in tokens (default: 40)")
+
+    for name, help_text in (("update", "Index the changes of a re-crawl"),
+                            ("watch", "Update whenever the crawl output changes")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("index")
+        command.add_argument("inputs", nargs="+", help="The crawl output the index was built from")
+        command.add_argument("--merge-factor", type=int, default=4,
+                             help="Segments of one size tier that are merged together (default: 4)")
+        if name == "update":
+            command.add_argument("--no-merge", action="store_true", help="Do not run due merges")
+        else:
+            command.add_argument("--interval", type=float, default=5.0, help="Seconds between checks (default: 5)")
+
+    merge = commands.add_parser("merge", help="Run the merges the policy asks for")
+    merge.add_argument("index")
+    merge.add_argument("--merge-factor", type=int, default=4)
+
+    status = commands.add_parser("status", help="Show the segments")
+    status.add_argument("index")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        SegmentWriter(args.output).build(args.inputs, args.fold, args.dims or None, args.max_tokens, args.overlap)
+    elif args.command == "update":
+        writer = SegmentWriter(args.index, args.merge_factor)
+        writer.update(args.inputs)
+        if not args.no_merge:
+            while writer.merge():
+                pass
+    elif args.command == "watch":
+        try:
+            watch(SegmentWriter(args.index, args.merge_factor), args.inputs, args.interval)
+        except KeyboardInterrupt:
+            pass
+    elif args.command == "merge":
+        writer = SegmentWriter(args.index, args.merge_factor)
+        while writer.merge():
+            pass
+    if args.command != "watch":
+        print_status(args.index if args.command != "build" else args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    sys.exit(main())
@@ -0,0 +1,9 @@
+"""
+The retrieval scripts import each other as top-level modules (they are run
+from retrieval/), so the tests put that directory on sys.path.
+"""
+import sys
+from pathlib import Path
+
+RETRIEVAL = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RETRIEVAL))
@@ -0,0 +1,96 @@
+import random
+
+import pytest
+
+import bm25
+from bm25 import BM25Index, build_index, decode_postings, decode_postings_numpy, encode_varint
+from passage_store import PassageStore, PassageWriter
+
+PASSAGES = [
+    {"url": "https://hus.vnu.edu.vn/hoc-phi.html", "title": "Học phí", "heading_path": [],
+     "text": "Học phí ngành Toán học năm 2024 là 15 triệu đồng."},
+    {"url": "https://hus.vnu.edu.vn/tuyen-sinh.html", "title": "Tuyển sinh", "heading_path": ["Ngành Toán"],
+     "text": "Chỉ tiêu tuyển sinh ngành Toán học và ngành Vật lý."},
+    {"url": "https://hus.vnu.edu.vn/ktx.html", "title": "Ký túc xá", "heading_path": [],
+     "text": "Sinh viên đăng ký ký túc xá trước ngày 15."},
+]
+
+
+def encode_run(postings):
+    run = bytearray()
+    last = 0
+    for doc, tf in postings:
+        encode_varint(doc - last, run)
+        encode_varint(tf, run)
+        last = doc
+    return bytes(run)
+
+
+def test_varint_encoding():
+    for value, encoded in [(0, b"\x00"), (127, b"\x7f"), (128, b"\x80\x01"), (300, b"\xac\x02")]:
+        out = bytearray()
+        encode_varint(value, out)
+        assert bytes(out) == encoded
+
+
+def test_postings_round_trip():
+    rng = random.Random(0)
+    docs = sorted(rng.sample(range(10 ** 7), 500))
+    postings = [(doc, rng.choice([1, 2, 127, 128, 70000])) for doc in docs]
+    # A run in the middle of a blob, as in a .postings file
+    blob = b"\xff\x81" + encode_run(postings) + b"\x05"
+    end = len(blob) - 1
+
+    assert decode_postings(blob, 2, end) == postings
+    doc_ids, tfs = decode_postings_numpy(blob, 2, end)
+    assert list(zip(doc_ids.tolist(), tfs.tolist())) == postings
+
+
+def test_passage_store(tmp_path):
+    writer = PassageWriter(str(tmp_path))
+    assert [writer.add(passage) for passage in PASSAGES] == [0, 1, 2]
+    writer.close()
+    # The end offset written by close() is not a passage
+    assert len(writer) == 3
+
+    store = PassageStore(str(tmp_path))
+    assert len(store) == 3
+    assert store[1] == PASSAGES[1]
+    assert list(store) == PASSAGES
+    store.close()
+
+
+@pytest.fixture(params=[True, False], ids=["numpy", "python"])
+def index(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(bm25, "HAS_NUMPY", request.param)
+    meta = build_index(PASSAGES, str(tmp_path), fold=True)
+    assert meta["documents"] == 3
+    index = BM25Index(str(tmp_path))
+    yield index
+    index.close()
+
+
+def test_scores_match_bm25(index):
+    field = index.fields["text"]
+    k1, b, avgdl = index.k1, index.meta["b"], index.meta["fields"]["text"]["avgdl"]
+    lengths = [len(bm25.passage_tokens(passage)) for passage in PASSAGES]
+    expected = {}
+    for doc, passage in enumerate(PASSAGES):
+        tf = bm25.passage_tokens(passage).count("vật")
+        if tf:
+            norm = k1 * (1 - b + b * lengths[doc] / avgdl)
+            expected[doc] = bm25.idf(3, 1) * tf * (k1 + 1) / (tf + norm)
+    scores = index.scores("Vật")
+    # The folded field ("vat") adds its own, lower-weighted contribution
+    assert scores.keys() == expected.keys() == {1}
+    assert scores[1] == pytest.approx(expected[1] * (1 + bm25.FIELD_WEIGHTS["folded"]))
+    assert field.run("không-có") is None
+
+
+def test_search_ranks_and_folds(index):
+    hits = index.search("học phí ngành toán", k=2)
+    assert [passage["url"] for _, passage in hits] == [PASSAGES[0]["url"], PASSAGES[1]["url"]]
+    assert hits[0][0] > hits[1][0]
+    # Without diacritics only the folded field matches
+    assert [passage["url"] for _, passage in index.search("ky tuc xa", k=5)] == [PASSAGES[2]["url"]]
+    assert index.search("không tồn tại xyz", k=5) == []
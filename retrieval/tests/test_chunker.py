@@ -0,0 +1,53 @@
+import json
+import sys
+
+import chunker
+from chunker import Page, chunk_page, split_sentences
+
+
+def test_split_sentences_keeps_abbreviations():
+    assert split_sentences("PGS.TS. Nguyễn Văn A phát biểu. Hội nghị kết thúc!") == [
+        "PGS.TS. Nguyễn Văn A phát biểu.", "Hội nghị kết thúc!"]
+    assert split_sentences("   ") == []
+
+
+def test_passages_are_bounded_and_overlap():
+    sentences = [f"Câu số {i} có năm từ." for i in range(40)]
+    page = Page("https://hus.vnu.edu.vn/a.html", "A", [("heading", "Giới thiệu", 2)]
+                + [("paragraph", sentence, 0) for sentence in sentences])
+    passages = list(chunk_page(page, max_tokens=30, overlap_tokens=10))
+
+    assert len(passages) > 1
+    assert all(passage.tokens <= 30 for passage in passages)
+    assert all(passage.heading_path == ("Giới thiệu",) for passage in passages)
+    assert [passage.position for passage in passages] == list(range(len(passages)))
+    # The last sentences of a passage start the next one
+    for previous, passage in zip(passages, passages[1:]):
+        assert split_sentences(passage.text)[0] in split_sentences(previous.text)
+
+
+def test_table_passages_repeat_the_header_row():
+    rows = [("table_row", f"Môn {i}\t{i} tín chỉ", 0) for i in range(30)]
+    page = Page("https://hus.vnu.edu.vn/ctdt.html", "CTĐT",
+                [("table", "", 0), ("table_row", "Môn học\tSố tín chỉ", 0)] + rows)
+    passages = list(chunk_page(page, max_tokens=20, overlap_tokens=5))
+
+    assert len(passages) > 1
+    assert all(passage.kind == "table" for passage in passages)
+    assert all(passage.text.startswith("Môn học\tSố tín chỉ\n") for passage in passages)
+
+
+def test_main_without_resource_module(tmp_path, monkeypatch):
+    page_dir = tmp_path / "crawl" / "a"
+    page_dir.mkdir(parents=True)
+    (page_dir / "metadata.json").write_text(json.dumps({"url": "https://hus.vnu.edu.vn/a.html", "title": "A"}),
+                                            encoding="utf-8")
+    (page_dir / "content.txt").write_text("Tiêu đề: A\nNội dung trang.\n", encoding="utf-8")
+    output = tmp_path / "passages.jsonl"
+    # resource is Unix only: the peak memory report is left out on Windows
+    monkeypatch.setattr(chunker, "resource", None)
+    monkeypatch.setattr(sys, "argv", ["chunker.py", str(tmp_path / "crawl"), "-o", str(output)])
+
+    assert chunker.main() == 0
+    passages = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert [(p["heading_path"], p["text"]) for p in passages] == [(["A"], "Nội dung trang.")]
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from dense import DenseIndex, DenseModel, build_index, write_vectors
+from passage_store import PassageWriter
+
+PASSAGES = [
+    {"url": "https://hus.vnu.edu.vn/hoc-phi.html", "title": "Học phí", "heading_path": [],
+     "text": "Học phí ngành Toán học năm 2024 là 15 triệu đồng một năm."},
+    {"url": "https://hus.vnu.edu.vn/hoc-phi-2.html", "title": "Học phí", "heading_path": ["Miễn giảm"],
+     "text": "Sinh viên được miễn giảm học phí theo quy định, mức học phí mỗi năm."},
+    {"url": "https://hus.vnu.edu.vn/ktx.html", "title": "Ký túc xá", "heading_path": [],
+     "text": "Sinh viên đăng ký ký túc xá trước ngày 15, phòng ký túc xá có điều hòa."},
+    {"url": "https://hus.vnu.edu.vn/ktx-2.html", "title": "Ký túc xá", "heading_path": ["Phòng ở"],
+     "text": "Phòng ký túc xá cho sinh viên năm nhất, đăng ký phòng trực tuyến."},
+    {"url": "https://hus.vnu.edu.vn/tuyen-sinh.html", "title": "Tuyển sinh", "heading_path": [],
+     "text": "Chỉ tiêu tuyển sinh ngành Toán học và ngành Vật lý, xét tuyển theo điểm thi."},
+    {"url": "https://hus.vnu.edu.vn/tuyen-sinh-2.html", "title": "Tuyển sinh", "heading_path": ["Xét tuyển"],
+     "text": "Điểm chuẩn xét tuyển ngành Vật lý và chỉ tiêu tuyển sinh năm nay."},
+]
+
+
+@pytest.fixture
+def index_dir(tmp_path):
+    directory = str(tmp_path / "index")
+    meta = build_index(PASSAGES, directory, dims=4)
+    assert meta["documents"] == len(PASSAGES) and meta["dims"] == 4
+    return directory
+
+
+def test_build_and_query(index_dir):
+    index = DenseIndex(index_dir)
+    try:
+        assert index.documents == len(PASSAGES)
+        assert index.vectors.shape == (len(PASSAGES), index.dims)
+        assert np.allclose(np.linalg.norm(index.vectors, axis=1), 1, atol=1e-5)
+        for question, topic in [("mức học phí một năm", "hoc-phi"), ("đăng ký phòng ký túc xá", "ktx"),
+                                ("điểm xét tuyển ngành Vật lý", "tuyen-sinh")]:
+            _, best = index.search(question, k=1)[0]
+            assert topic in best["url"], question
+        # One matrix multiply per batch gives the same ranking as one question at a time
+        questions = ["học phí", "ký túc xá"]
+        for question, batched in zip(questions, index.search_batch(questions, k=3)):
+            single = index.search_batch([question], k=3)[0]
+            assert [doc for doc, _ in batched] == [doc for doc, _ in single]
+            assert [score for _, score in batched] == pytest.approx([score for _, score in single], abs=1e-5)
+    finally:
+        index.close()
+
+
+def test_write_vectors_round_trip(index_dir, tmp_path):
+    model = DenseModel(index_dir, 4)
+    delta_dir = str(tmp_path / "delta")
+    writer = PassageWriter(delta_dir)
+    for passage in PASSAGES:
+        writer.add(passage)
+    writer.close()
+    meta = write_vectors(model, PASSAGES, delta_dir, batch_size=4)
+    assert meta["documents"] == len(PASSAGES) and meta["external_model"]
+
+    full, delta = DenseIndex(index_dir), DenseIndex(delta_dir, model_dir=index_dir)
+    try:
+        # Passages embedded with the trained model land where the build put them
+        assert np.allclose(delta.vectors, full.vectors, atol=1e-4)
+    finally:
+        full.close()
+        delta.close()
+
+
+@pytest.mark.parametrize("passages", [PASSAGES[:1], PASSAGES[:0]], ids=["one passage", "no passages"])
+def test_tiny_corpus_is_rejected(passages, tmp_path):
+    with pytest.raises(ValueError, match="Too little text"):
+        build_index(passages, str(tmp_path / "index"))
+
+
+def test_no_shared_terms_is_rejected(tmp_path):
+    passages = [{"url": "a", "title": "", "text": "alpha beta"}, {"url": "b", "title": "", "text": "gamma delta"}]
+    with pytest.raises(ValueError, match="0 terms"):
+        build_index(passages, str(tmp_path / "index"), min_df=2)
@@ -0,0 +1,75 @@
+import pytest
+
+from bm25 import build_index
+from hybrid import HybridSearcher, MetadataFilter, normalize_question, reciprocal_rank_fusion
+
+
+def test_rrf_scores():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1]], rrf_k=60)
+    assert [doc for doc, _ in fused] == [1, 3, 2]
+    scores = dict(fused)
+    assert scores[1] == pytest.approx(1 / 61 + 1 / 62)
+    assert scores[3] == pytest.approx(1 / 63 + 1 / 61)
+    assert scores[2] == pytest.approx(1 / 62)
+
+
+def test_rrf_rewards_agreement():
+    # Second in both rankings beats first in only one
+    fused = reciprocal_rank_fusion([[7, 5], [8, 5]])
+    assert fused[0][0] == 5
+    assert reciprocal_rank_fusion([]) == []
+
+
+def test_metadata_filter():
+    passage = {"url": "https://hus.vnu.edu.vn/tin-tuc/a.html", "title": "Lịch THI học kỳ I",
+               "crawl_date": "2024-03-05T10:00:00"}
+    assert MetadataFilter().matches(passage)
+    assert MetadataFilter(url_prefix="https://hus.vnu.edu.vn/tin-tuc").matches(passage)
+    assert not MetadataFilter(url_prefix="https://hus.vnu.edu.vn/dao-tao").matches(passage)
+    assert MetadataFilter(title_contains="lịch thi").matches(passage)
+    # A date bound covers the whole day
+    assert MetadataFilter(since="2024-03-05", until="2024-03-05").matches(passage)
+    assert not MetadataFilter(since="2024-03-06").matches(passage)
+    assert not MetadataFilter(until="2024-03-04").matches(passage)
+    assert not MetadataFilter(since="2024-01-01").matches({**passage, "crawl_date": ""})
+
+
+def test_normalize_question():
+    assert normalize_question("Học  PHÍ?") == normalize_question("học phí") == "học phí"
+
+
+def passages(prefix, count):
+    return [{"url": f"https://hus.vnu.edu.vn/{prefix}/{i}.html", "title": f"Trang {i}", "heading_path": [],
+             "crawl_date": "2024-01-01", "text": f"Học phí ngành {i} " + "thông tin " * i} for i in range(count)]
+
+
+def test_searcher_cache_and_filters(tmp_path):
+    build_index(passages("dao-tao", 30) + passages("tin-tuc", 2), str(tmp_path))
+    searcher = HybridSearcher(str(tmp_path), candidates=4, check_interval=3600)
+    try:
+        hits = searcher.search("học phí", k=3)
+        assert len(hits) == 3
+        assert searcher.search("Học phí?", k=3) == hits
+        assert searcher.cache_info()["hits"] == 1
+
+        # Only two pages match the filter, below the candidate depth: the search goes deeper
+        news = searcher.search("học phí", k=3, filters=MetadataFilter(url_prefix="https://hus.vnu.edu.vn/tin-tuc"))
+        assert sorted(passage["url"] for _, passage in news) == [
+            "https://hus.vnu.edu.vn/tin-tuc/0.html", "https://hus.vnu.edu.vn/tin-tuc/1.html"]
+    finally:
+        searcher.close()
+
+
+def test_searcher_reopens_rebuilt_index(tmp_path):
+    build_index(passages("dao-tao", 3), str(tmp_path))
+    searcher = HybridSearcher(str(tmp_path), check_interval=0)
+    try:
+        assert searcher.documents == 3
+        searcher.search("học phí", k=2)
+        build_index(passages("dao-tao", 5), str(tmp_path))
+        searcher.search("học phí", k=2)
+        info = searcher.cache_info()
+        assert searcher.documents == 5
+        assert info["invalidations"] == 1 and info["misses"] == 2
+    finally:
+        searcher.close()
@@ -0,0 +1,100 @@
+import asyncio
+import json
+
+import pytest
+
+from bm25 import build_index
+from hybrid import HybridSearcher
+from qa_server import MAX_BODY_BYTES, QAService, extract_answer, handle_connection
+
+PASSAGES = [
+    {"id": "https://hus.vnu.edu.vn/hoc-phi.html#0", "url": "https://hus.vnu.edu.vn/hoc-phi.html", "title": "Học phí",
+     "heading_path": [], "kind": "text",
+     "text": "Trường công bố mức thu mới. Học phí ngành Toán học là 15 triệu đồng một năm."},
+    {"id": "https://hus.vnu.edu.vn/ktx.html#0", "url": "https://hus.vnu.edu.vn/ktx.html", "title": "Ký túc xá",
+     "heading_path": [], "kind": "text", "text": "Sinh viên đăng ký ký túc xá trước ngày 15."},
+]
+
+
+@pytest.fixture
+def searcher(tmp_path):
+    build_index(PASSAGES, str(tmp_path))
+    searcher = HybridSearcher(str(tmp_path))
+    yield searcher
+    searcher.close()
+
+
+def exchange(searcher, *raw_requests):
+    """Sends raw HTTP requests, each on its own connection; returns (status, JSON body) per request."""
+    async def run():
+        service = QAService(searcher, max_wait_ms=20)
+        service.start()
+        server = await asyncio.start_server(lambda r, w: handle_connection(service, r, w), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+
+        async def send(raw):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(raw)
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            head, _, body = response.partition(b"\r\n\r\n")
+            return int(head.split()[1]), json.loads(body)
+
+        try:
+            return await asyncio.gather(*(send(raw) for raw in raw_requests))
+        finally:
+            server.close()
+            await server.wait_closed()
+            await service.close()
+
+    return asyncio.run(run())
+
+
+def ask(payload, headers=b""):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    return (b"POST /ask HTTP/1.1\r\nConnection: close\r\n" + headers
+            + b"Content-Length: %d\r\n\r\n" % len(body) + body)
+
+
+def test_ask_batches_questions(searcher):
+    responses = exchange(searcher, *(ask({"question": "học phí ngành toán", "k": 1}) for _ in range(5)))
+    for status, payload in responses:
+        assert status == 200
+        assert payload["answer"]["text"] == "Học phí ngành Toán học là 15 triệu đồng một năm."
+        assert [passage["url"] for passage in payload["passages"]] == ["https://hus.vnu.edu.vn/hoc-phi.html"]
+
+    [(status, stats)] = exchange(searcher, b"GET /stats HTTP/1.1\r\nConnection: close\r\n\r\n")
+    assert status == 200 and stats["documents"] == 2
+
+
+@pytest.mark.parametrize("payload", [
+    {"question": "học phí", "k": True},
+    {"question": "học phí", "k": 0},
+    {"question": "học phí", "k": "5"},
+    {"question": "   "},
+    {"question": "học phí", "filters": {"author": "x"}},
+])
+def test_invalid_questions_are_rejected(searcher, payload):
+    [(status, response)] = exchange(searcher, ask(payload))
+    assert status == 400 and response["error"]
+
+
+@pytest.mark.parametrize("raw, expected", [
+    (b"POST /ask HTTP/1.1\r\nContent-Length: -5\r\n\r\n", 400),
+    (b"POST /ask HTTP/1.1\r\nContent-Length: abc\r\n\r\n", 400),
+    (b"POST /ask HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % (MAX_BODY_BYTES + 1), 413),
+    (b"GET /ask HTTP/1.1\r\nX-Long: " + b"a" * 100000 + b"\r\n\r\n", 400),
+    (b"GET /" + b"a" * 100000 + b" HTTP/1.1\r\n\r\n", 400),
+    (b"NONSENSE\r\n\r\n", 400),
+], ids=["negative-length", "invalid-length", "body-too-large", "long-header", "long-request-line", "bad-request-line"])
+def test_malformed_requests_get_an_error_response(searcher, raw, expected):
+    [(status, response)] = exchange(searcher, raw)
+    assert status == expected and response["error"]
+
+
+def test_extract_answer_offsets():
+    answer = extract_answer("học phí ngành toán bao nhiêu", [(1.0, PASSAGES[0])])
+    start, end = answer["start"], answer["end"]
+    assert PASSAGES[0]["text"][start:end] == answer["text"]
+    assert extract_answer("xyz", []) is None
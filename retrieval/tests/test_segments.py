@@ -0,0 +1,180 @@
+import json
+
+import pytest
+
+import segments
+from segments import SegmentedIndex, SegmentWriter, read_manifest
+
+TOPICS = ["học phí", "tuyển sinh", "ký túc xá", "học bổng", "lịch thi", "thư viện", "nghiên cứu", "hợp tác"]
+
+
+def write_page(crawl_dir, number, text):
+    page_dir = crawl_dir / f"page-{number:03d}"
+    page_dir.mkdir(parents=True, exist_ok=True)
+    (page_dir / "metadata.json").write_text(json.dumps({"url": url(number), "title": f"Trang {number}"}),
+                                            encoding="utf-8")
+    (page_dir / "content.txt").write_text(f"Tiêu đề: Trang {number}\n{text}\n", encoding="utf-8")
+
+
+def url(number):
+    return f"https://hus.vnu.edu.vn/trang-{number}.html"
+
+
+def page_text(number, version=1):
+    topic = TOPICS[number % len(TOPICS)]
+    return f"Thông tin {topic} của trường, phiên bản {version}, trang số {number}."
+
+
+@pytest.fixture
+def crawl_dir(tmp_path):
+    crawl_dir = tmp_path / "crawl"
+    for number in range(12):
+        write_page(crawl_dir, number, page_text(number))
+    return crawl_dir
+
+
+def live_urls(index):
+    return {index.passages[doc]["url"] for doc in range(index.documents) if index.alive[doc]}
+
+
+def urls_found(index, query):
+    return [index.passages[doc]["url"] for doc, _ in index.top(query, k=50)]
+
+
+def test_update_adds_changes_and_removes_pages(tmp_path, crawl_dir):
+    directory = str(tmp_path / "index")
+    writer = SegmentWriter(directory)
+    writer.build([str(crawl_dir)], dims=None)
+    assert writer.update([str(crawl_dir)])["segment"] is None
+
+    write_page(crawl_dir, 3, "Lịch bảo vệ luận văn thạc sĩ đã được cập nhật.")
+    write_page(crawl_dir, 20, "Thông báo tuyển dụng giảng viên.")
+    for name in ("metadata.json", "content.txt"):
+        (crawl_dir / "page-005" / name).unlink()
+    stats = writer.update([str(crawl_dir)])
+    assert (stats["added"], stats["changed"], stats["removed"]) == (1, 1, 1)
+
+    manifest = read_manifest(directory)
+    assert [len(info["deleted"]) for info in manifest["segments"]] == [2, 0]
+    index = SegmentedIndex(directory)
+    try:
+        assert live_urls(index) == {url(number) for number in [*range(12), 20] if number != 5}
+        assert urls_found(index, "luận văn thạc sĩ") == [url(3)]
+        # Old copies of changed and removed pages are never returned
+        assert url(3) not in urls_found(index, TOPICS[3])
+        assert url(5) not in urls_found(index, TOPICS[5])
+    finally:
+        index.close()
+
+
+def test_merge_drops_deleted_passages(tmp_path, crawl_dir):
+    directory = str(tmp_path / "index")
+    writer = SegmentWriter(directory, merge_factor=3)
+    writer.build([str(crawl_dir)], dims=None)
+    # Three small delta segments of the same tier
+    for version in (2, 3, 4):
+        write_page(crawl_dir, version, page_text(version, version))
+        writer.update([str(crawl_dir)])
+    manifest = read_manifest(directory)
+    assert len(manifest["segments"]) == 4
+    names = writer.merge_candidates(manifest)
+    assert names == [info["name"] for info in manifest["segments"][1:]]
+
+    before = SegmentedIndex(directory)
+    # Collection statistics count deleted passages until they are merged away, so compare result sets
+    expected = {query: set(urls_found(before, query)) for query in TOPICS}
+    before.close()
+
+    info = writer.merge()
+    assert info["documents"] == 3 and info["deleted"] == []
+    assert writer.merge() is None
+    manifest = read_manifest(directory)
+    assert [segment["name"] for segment in manifest["segments"]] == ["seg-000001", info["name"]]
+    for name in names:
+        assert not (tmp_path / "index" / name).exists()
+
+    after = SegmentedIndex(directory)
+    try:
+        assert {query: set(urls_found(after, query)) for query in TOPICS} == expected
+    finally:
+        after.close()
+
+
+def test_mostly_deleted_segment_is_expunged(tmp_path, crawl_dir):
+    directory = str(tmp_path / "index")
+    writer = SegmentWriter(directory, merge_factor=10)
+    writer.build([str(crawl_dir)], dims=None)
+    for number in range(7):
+        write_page(crawl_dir, number, page_text(number, 2))
+    writer.update([str(crawl_dir)])
+
+    manifest = read_manifest(directory)
+    assert writer.merge_candidates(manifest) == ["seg-000001"]
+    info = writer.merge()
+    assert info["documents"] == 5
+    index = SegmentedIndex(directory)
+    try:
+        assert index.documents == index.live_documents == 12
+    finally:
+        index.close()
+
+
+def test_tombstones_added_during_a_merge_are_kept(tmp_path, crawl_dir, monkeypatch):
+    directory = str(tmp_path / "index")
+    writer = SegmentWriter(directory, merge_factor=3)
+    writer.build([str(crawl_dir)], dims=None)
+    for version in (2, 3, 4):
+        write_page(crawl_dir, version, page_text(version, version))
+        writer.update([str(crawl_dir)])
+
+    write_segment = segments.write_segment
+    updates = []
+
+    def write_segment_then_update(directory, passages, *args, **kwargs):
+        info = write_segment(directory, passages, *args, **kwargs)
+        if not updates:
+            # A re-crawl changes page 2 (now in a segment being merged) before the merge commits
+            updates.append(True)
+            write_page(crawl_dir, 2, "Nội dung mới nhất về học phí.")
+            writer.update([str(crawl_dir)])
+        return info
+
+    monkeypatch.setattr(segments, "write_segment", write_segment_then_update)
+    info = writer.merge()
+
+    manifest = read_manifest(directory)
+    merged = next(segment for segment in manifest["segments"] if segment["name"] == info["name"])
+    assert merged["deleted"] == [url(2)]
+    index = SegmentedIndex(directory)
+    try:
+        texts = [index.passages[doc]["text"] for doc in range(index.documents)
+                 if index.alive[doc] and index.passages[doc]["url"] == url(2)]
+        assert texts == ["Nội dung mới nhất về học phí."]
+    finally:
+        index.close()
+
+
+def test_merge_copies_dense_vectors(tmp_path, crawl_dir):
+    directory = str(tmp_path / "index")
+    writer = SegmentWriter(directory, merge_factor=3)
+    writer.build([str(crawl_dir)], dims=4)
+    for version in (2, 3, 4):
+        write_page(crawl_dir, version, page_text(version, version))
+        writer.update([str(crawl_dir)])
+
+    def dense_results(index):
+        return [[(index.passages[doc]["url"], round(score, 5)) for doc, score in hits]
+                for hits in index.search_batch(TOPICS, k=5)]
+
+    before = SegmentedIndex(directory)
+    expected = dense_results(before)
+    before.close()
+    writer.merge()
+
+    after = SegmentedIndex(directory)
+    try:
+        assert after.has_dense and len(read_manifest(directory)["segments"]) == 2
+        # The model is not retrained, so the copied vectors give the same scores
+        assert dense_results(after) == expected
+    finally:
+        after.close()
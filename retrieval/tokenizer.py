@@ -0,0 +1,40 @@
+"""
+Vietnamese-aware tokenization for the retrieval indexes.
+
+Vietnamese words are written as space-separated syllables, so tokens are the
+syllables of the NFC-normalized, lowercased text. The crawled pages mix
+composed and decomposed Unicode, and students often type without
+diacritics ("hoc phi" for "học phí"), so ``fold`` maps a token to its
+unaccented form (``đ`` → ``d``) for a second, diacritic-insensitive field.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+from typing import List
+
+TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits text into lowercase syllable tokens.
+
+    Args:
+        text: Any text (passage, title or query)
+
+    Returns:
+        Tokens in text order
+    """
+    return TOKEN.findall(unicodedata.normalize("NFC", text).lower())
+
+
+@lru_cache(maxsize=65536)
+def fold(token: str) -> str:
+    """Removes the diacritics of a token: "trường" → "truong", "đào" → "dao"."""
+    decomposed = unicodedata.normalize("NFD", token.replace("đ", "d").replace("Đ", "D"))
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def fold_tokens(tokens: List[str]) -> List[str]:
+    """Folds a list of tokens (see fold)."""
+    return [fold(token) for token in tokens]